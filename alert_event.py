@@ -0,0 +1,33 @@
+from datetime import datetime
+from src.models.user import db
+
+class AlertEvent(db.Model):
+    """Ausgelöster Alarm; jeder Worker schreibt seine Auslösungen hierher"""
+    __tablename__ = 'alert_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rule_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True, index=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    kind = db.Column(db.String(16), nullable=False)
+    direction = db.Column(db.String(8), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    pnl_percent = db.Column(db.Float, nullable=True)
+    triggered_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<AlertEvent {self.symbol} {self.direction} {self.threshold} @ {self.price}>'
+
+    def to_dict(self):
+        return {
+            'rule_id': self.rule_id,
+            'user_id': self.user_id,
+            'symbol': self.symbol,
+            'kind': self.kind,
+            'direction': self.direction,
+            'threshold': self.threshold,
+            'price': self.price,
+            'pnl_percent': self.pnl_percent,
+            'triggered_at': self.triggered_at.isoformat()
+        }
@@ -0,0 +1,39 @@
+from datetime import datetime
+from src.models.user import db
+
+class AlertRule(db.Model):
+    """Kursalarm eines Benutzers: Kurs- oder G/V-Schwelle je Symbol samt Auslösezustand"""
+    __tablename__ = 'alert_rule'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True, index=True)
+    symbol = db.Column(db.String(10), nullable=False, index=True)
+    kind = db.Column(db.String(16), nullable=False, default='price')  # price | pnl_percent
+    direction = db.Column(db.String(8), nullable=False)  # above | below
+    threshold = db.Column(db.Float, nullable=False)  # Kurs bzw. G/V in Prozent
+    hysteresis = db.Column(db.Float, nullable=False, default=1.0)  # Prozent Abstand bis zur Wiederscharfschaltung
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    armed = db.Column(db.Boolean, nullable=False, default=True)
+    trigger_count = db.Column(db.Integer, nullable=False, default=0)
+    last_price = db.Column(db.Float, nullable=True)
+    last_triggered_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AlertRule {self.symbol} {self.kind} {self.direction} {self.threshold}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'kind': self.kind,
+            'direction': self.direction,
+            'threshold': self.threshold,
+            'hysteresis': self.hysteresis,
+            'active': self.active,
+            'armed': self.armed,
+            'trigger_count': self.trigger_count,
+            'last_price': self.last_price,
+            'last_triggered_at': self.last_triggered_at.isoformat() if self.last_triggered_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,537 @@
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, select
+
+from src.models.user import db
+from src.models.alert_event import AlertEvent
+from src.models.alert_rule import AlertRule
+from src.models.cache_version import CacheVersion
+
+ABOVE = 'above'
+BELOW = 'below'
+DIRECTIONS = (ABOVE, BELOW)
+KINDS = ('price', 'pnl_percent')
+# Versionszähler (CacheVersion), über den Regeländerungen die anderen Worker erreichen
+ALERTS_SCOPE = 'alerts'
+
+# Spalten, aus denen eine Regel im Speicher aufgebaut wird (Reihenfolge wie CompiledRule.__init__)
+RULE_COLUMNS = ('id', 'user_id', 'symbol', 'kind', 'direction', 'threshold', 'hysteresis', 'armed',
+                'trigger_count', 'last_price', 'last_triggered_at')
+
+class CompiledRule:
+    """Regel im Speicher; `price` ist die Schwelle als Kurs (bei G/V-Regeln aus dem Einstand berechnet)"""
+    __slots__ = RULE_COLUMNS + ('cost', 'price', 'rearm')
+
+    def __init__(self, id, user_id, symbol, kind, direction, threshold, hysteresis, armed,
+                 trigger_count, last_price, last_triggered_at):
+        self.id = id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.kind = kind
+        self.direction = direction
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.armed = armed
+        self.trigger_count = trigger_count or 0
+        self.last_price = last_price
+        self.last_triggered_at = last_triggered_at
+        self.cost = None  # Einstand je Stück in Handelswährung (nur G/V-Regeln)
+        self.price = threshold if kind == 'price' else None
+        self.rearm = None
+        self._update_rearm()
+
+    @classmethod
+    def from_rule(cls, rule: AlertRule) -> 'CompiledRule':
+        return cls(*(getattr(rule, column) for column in RULE_COLUMNS))
+
+    def set_cost(self, cost: Optional[float]):
+        self.cost = cost
+        self.price = cost * (1 + self.threshold / 100) if cost else None
+        self._update_rearm()
+
+    def _update_rearm(self):
+        # Wiederscharfschaltung erst, wenn der Kurs um `hysteresis` Prozent zurückgelaufen ist
+        if self.price is None:
+            self.rearm = None
+        elif self.direction == ABOVE:
+            self.rearm = self.price * (1 - self.hysteresis / 100)
+        else:
+            self.rearm = self.price * (1 + self.hysteresis / 100)
+
+class SortedThresholds:
+    """Aufsteigend sortierte Schwellen mit den zugehörigen Regel-IDs"""
+    __slots__ = ('keys', 'ids')
+
+    def __init__(self):
+        self.keys: List[float] = []
+        self.ids: List[int] = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key: float, rule_id: int):
+        index = bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.ids.insert(index, rule_id)
+
+    def remove(self, key: float, rule_id: int) -> bool:
+        index = bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key:
+            if self.ids[index] == rule_id:
+                del self.keys[index]
+                del self.ids[index]
+                return True
+            index += 1
+        return False
+
+    def extend(self, pairs: List[tuple]):
+        """Fügt viele (Schwelle, Regel-ID)-Paare mit einer Sortierung ein"""
+        merged = sorted(list(zip(self.keys, self.ids)) + pairs)
+        self.keys = [key for key, _ in merged]
+        self.ids = [rule_id for _, rule_id in merged]
+
+    def take_prefix(self, index: int) -> List[int]:
+        taken = self.ids[:index]
+        del self.keys[:index]
+        del self.ids[:index]
+        return taken
+
+    def take_suffix(self, index: int) -> List[int]:
+        taken = self.ids[index:]
+        del self.keys[index:]
+        del self.ids[index:]
+        return taken
+
+class SymbolIndex:
+    """Schwellen eines Symbols: scharfe Regeln nach Auslösekurs, ausgelöste nach Wiederscharfschaltkurs
+
+    Ein Kurs prüft so per Binärsuche alle Regeln des Symbols auf einmal und
+    berührt nur die, deren Schwelle er überschritten hat.
+    """
+    __slots__ = ('armed_above', 'armed_below', 'rearm_above', 'rearm_below')
+
+    def __init__(self):
+        self.armed_above = SortedThresholds()
+        self.armed_below = SortedThresholds()
+        self.rearm_above = SortedThresholds()
+        self.rearm_below = SortedThresholds()
+
+    def __len__(self):
+        return len(self.armed_above) + len(self.armed_below) + len(self.rearm_above) + len(self.rearm_below)
+
+    def _slot(self, rule: CompiledRule):
+        if rule.direction == ABOVE:
+            return (self.armed_above, rule.price) if rule.armed else (self.rearm_above, rule.rearm)
+        return (self.armed_below, rule.price) if rule.armed else (self.rearm_below, rule.rearm)
+
+    def place(self, rule: CompiledRule):
+        thresholds, key = self._slot(rule)
+        thresholds.add(key, rule.id)
+
+    def unplace(self, rule: CompiledRule):
+        thresholds, key = self._slot(rule)
+        thresholds.remove(key, rule.id)
+
+    def place_many(self, rules: Iterable[CompiledRule]):
+        grouped = {}
+        for rule in rules:
+            thresholds, key = self._slot(rule)
+            grouped.setdefault(id(thresholds), (thresholds, []))[1].append((key, rule.id))
+        for thresholds, pairs in grouped.values():
+            thresholds.extend(pairs)
+
+    def evaluate(self, price: float, rules: Dict[int, CompiledRule]):
+        """(ausgelöste, wieder scharf geschaltete) Regel-IDs für einen neuen Kurs"""
+        rearmed = self.rearm_above.take_suffix(bisect_right(self.rearm_above.keys, price))
+        rearmed += self.rearm_below.take_prefix(bisect_left(self.rearm_below.keys, price))
+        for rule_id in rearmed:
+            rule = rules[rule_id]
+            rule.armed = True
+            self.place(rule)
+
+        fired = self.armed_above.take_prefix(bisect_right(self.armed_above.keys, price))
+        fired += self.armed_below.take_suffix(bisect_left(self.armed_below.keys, price))
+        for rule_id in fired:
+            rule = rules[rule_id]
+            rule.armed = False
+            self.place(rule)
+        return fired, rearmed
+
+class LogSink:
+    """Gibt Alarme auf der Konsole aus"""
+
+    def __call__(self, event: Dict):
+        print(f"Alarm: {event['symbol']} {event['direction']} {event['threshold']} "
+              f"({event['kind']}) bei {event['price']}")
+
+class JsonLinesSink:
+    """Hängt Alarme als JSON-Zeilen an eine Datei an (z.B. für einen lokalen Benachrichtigungsdienst)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Dict):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as handle:
+            handle.write(json.dumps(event) + '\n')
+
+class AlertEngine:
+    """Wertet eingehende Kurse gegen die Alarmregeln aller Benutzer aus
+
+    Regeln liegen je Symbol in sortierten Schwellen-Indizes (SymbolIndex), G/V-
+    Regeln werden über den Einstand in Kursschwellen übersetzt. Ausgelöste Regeln
+    werden erst nach dem Zurücklaufen um die Hysterese wieder scharf geschaltet,
+    damit ein um die Schwelle pendelnder Kurs nicht wiederholt alarmiert.
+    Auslösungen werden sofort per bedingtem UPDATE in alert_rule beansprucht
+    (nur ein Worker alarmiert) und in alert_event protokolliert; das
+    Wiederscharfschalten wird gesammelt und gebündelt geschrieben.
+
+    Jeder Worker hält die Regeln im Speicher; Änderungen erhöhen den Zähler
+    ALERTS_SCOPE, und die übrigen Worker laden neu, sobald sie ihn (höchstens
+    alle `sync_seconds`) höher vorfinden.
+    """
+
+    def __init__(self, sinks: Iterable[Callable] = (), sync_seconds: float = 1.0):
+        self.sinks: List[Callable] = list(sinks)
+        self.sync_seconds = sync_seconds
+        self.stats = {'prices': 0, 'checks': 0, 'fired': 0, 'claimed_elsewhere': 0, 'rearmed': 0, 'persisted': 0,
+                      'reloads': 0}
+        self._rules: Dict[int, CompiledRule] = {}
+        self._index: Dict[str, SymbolIndex] = {}
+        self._pending = set()
+        self._loaded = False
+        self._version = 0
+        self._checked = float('-inf')
+        self._app = None
+        self._lock = threading.RLock()
+
+    def add_sink(self, sink: Callable):
+        self.sinks.append(sink)
+
+    # Regeln laden und pflegen
+
+    def _cost_basis(self, user_id: Optional[int], symbols: Iterable[str]) -> Dict[str, float]:
+        """Einstand je Stück des offenen Bestands in Handelswährung, nach Verkäufen und Splits
+
+        Symbole ohne offenen Bestand fehlen im Ergebnis; ihre G/V-Regeln bleiben
+        damit ohne Kursschwelle und lösen nicht aus.
+        """
+        from src.services.fx_service import CurrencyConverter, quote_currencies
+        from src.services.tenant_service import owner_lots
+        from src.services.transaction_service import cost_basis_method, transaction_service
+
+        lots = owner_lots(user_id)
+        held = {lot.symbol for lot in lots} & set(symbols)
+        by_currency = {}
+        for symbol, currency in quote_currencies(held).items():
+            by_currency.setdefault(currency, []).append(symbol)
+
+        method = cost_basis_method(from_request=False)
+        costs = {}
+        for currency, group in by_currency.items():
+            try:
+                ledger = transaction_service.ledger(user_id, lots, CurrencyConverter(lots, currency), method)
+            except ValueError as e:
+                print(f"Fehler beim Einstand für G/V-Alarme: {str(e)}")
+                continue
+            for symbol in group:
+                book = ledger.books.get(symbol)
+                if book is not None and book.quantity > 1e-9:
+                    costs[symbol] = book.open_cost / book.quantity
+        return costs
+
+    def _place(self, rule: CompiledRule):
+        if rule.price is not None:
+            self._index.setdefault(rule.symbol, SymbolIndex()).place(rule)
+
+    def _unplace(self, rule: CompiledRule):
+        index = self._index.get(rule.symbol)
+        if index is not None and rule.price is not None:
+            index.unplace(rule)
+            if not len(index):
+                del self._index[rule.symbol]
+
+    def load(self):
+        """Liest alle aktiven Regeln und baut die Indizes neu auf"""
+        # Core-Select der benötigten Spalten statt ORM-Instanzen
+        statement = select(*(getattr(AlertRule, column) for column in RULE_COLUMNS)).where(AlertRule.active.is_(True))
+        rules = [CompiledRule(*row) for row in db.session.execute(statement)]
+        pnl_users = {}
+        for rule in rules:
+            if rule.kind == 'pnl_percent':
+                pnl_users.setdefault(rule.user_id, set()).add(rule.symbol)
+        costs = {user_id: self._cost_basis(user_id, symbols) for user_id, symbols in pnl_users.items()}
+
+        by_symbol = {}
+        for rule in rules:
+            if rule.kind == 'pnl_percent':
+                rule.set_cost(costs[rule.user_id].get(rule.symbol))
+            if rule.price is not None:
+                by_symbol.setdefault(rule.symbol, []).append(rule)
+        index = {}
+        for symbol, symbol_rules in by_symbol.items():
+            index[symbol] = SymbolIndex()
+            index[symbol].place_many(symbol_rules)
+
+        with self._lock:
+            self._rules = {rule.id: rule for rule in rules}
+            self._index = index
+            self._loaded = True
+        self.stats['reloads'] += 1
+
+    def sync(self):
+        """Lädt die Regeln, falls noch nicht geschehen oder seitdem in einem anderen Prozess geändert"""
+        self._checked = time.monotonic()
+        version = CacheVersion.current(ALERTS_SCOPE)
+        if self._loaded and version <= self._version:
+            return
+        # Noch nicht gespeicherte Auslösungen gingen beim Neuaufbau sonst verloren
+        self.persist()
+        self.load()
+        self._version = version
+
+    def _ensure_loaded(self) -> bool:
+        if self._loaded and time.monotonic() - self._checked < self.sync_seconds:
+            return True
+        from flask import has_app_context
+        if has_app_context():
+            self.sync()
+        elif self._app is not None:
+            with self._app.app_context():
+                self.sync()
+        return self._loaded
+
+    def _publish(self):
+        """Meldet eine Regeländerung an die anderen Worker"""
+        try:
+            CacheVersion.bump(ALERTS_SCOPE)
+        except Exception as e:
+            print(f"Fehler beim Melden geänderter Alarmregeln: {str(e)}")
+            return
+        # War es die einzige Änderung seit dem Laden, ist dieser Worker bereits aktuell
+        if self._loaded and CacheVersion.current(ALERTS_SCOPE) == self._version + 1:
+            self._version += 1
+
+    def upsert(self, rule: AlertRule):
+        """Übernimmt eine angelegte oder geänderte Regel (nach dem Commit aufrufen)
+
+        Offene Zustände werden vorher gespeichert, da die Regel aus ihrer Zeile
+        neu aufgebaut wird und sonst ein Wiederscharfschalten verlöre.
+        """
+        self.persist()
+        if self._loaded:
+            compiled = CompiledRule.from_rule(rule)
+            if compiled.kind == 'pnl_percent':
+                compiled.set_cost(self._cost_basis(compiled.user_id, [compiled.symbol]).get(compiled.symbol))
+            with self._lock:
+                self._remove(rule.id)
+                if rule.active:
+                    self._rules[compiled.id] = compiled
+                    self._place(compiled)
+        self._publish()
+
+    def _remove(self, rule_id: int):
+        rule = self._rules.pop(rule_id, None)
+        if rule is not None:
+            self._unplace(rule)
+        self._pending.discard(rule_id)
+
+    def remove(self, rule_id: int):
+        with self._lock:
+            self._remove(rule_id)
+        self._publish()
+
+    def remove_user(self, user_id: Optional[int]):
+        with self._lock:
+            for rule_id in [rule.id for rule in self._rules.values() if rule.user_id == user_id]:
+                self._remove(rule_id)
+        self._publish()
+
+    def currencies_changed(self, symbols: Iterable[str] = ()):
+        """Nachgeladene Handelswährungen: G/V-Schwellen in allen Workern neu berechnen"""
+        try:
+            CacheVersion.bump(ALERTS_SCOPE)
+        except Exception as e:
+            print(f"Fehler beim Melden geänderter Alarmregeln: {str(e)}")
+        # Eigene Version bleibt zurück, die nächste Auswertung lädt daher neu
+        self._checked = float('-inf')
+
+    def positions_changed(self, user_id: Optional[int]):
+        """Berechnet die Kursschwellen der G/V-Regeln eines Portfolios nach Buchungen und Löschungen neu"""
+        if not self._loaded:
+            self._publish()
+            return
+        with self._lock:
+            rules = [rule for rule in self._rules.values() if rule.kind == 'pnl_percent' and rule.user_id == user_id]
+        if not rules:
+            return
+        costs = self._cost_basis(user_id, {rule.symbol for rule in rules})
+        with self._lock:
+            for rule in rules:
+                if self._rules.get(rule.id) is not rule:
+                    continue
+                self._unplace(rule)
+                rule.set_cost(costs.get(rule.symbol))
+                self._place(rule)
+        self._publish()
+
+    # Auswertung
+
+    def _event(self, rule: CompiledRule, price: float) -> Dict:
+        return {
+            'rule_id': rule.id,
+            'user_id': rule.user_id,
+            'symbol': rule.symbol,
+            'kind': rule.kind,
+            'direction': rule.direction,
+            'threshold': rule.threshold,
+            'price': price,
+            'pnl_percent': (price / rule.cost - 1) * 100 if rule.cost else None,
+            'triggered_at': rule.last_triggered_at.isoformat()
+        }
+
+    def observe(self, prices: Dict[str, float]) -> List[Dict]:
+        """Prüft neue Kurse (Symbol -> Kurs) und stellt ausgelöste Alarme zu"""
+        if not prices or not self._ensure_loaded():
+            return []
+        crossings = []
+        now = datetime.utcnow()
+        with self._lock:
+            for symbol, price in prices.items():
+                index = self._index.get(symbol)
+                if index is None or not price:
+                    continue
+                self.stats['prices'] += 1
+                self.stats['checks'] += len(index)
+                fired, rearmed = index.evaluate(price, self._rules)
+                if rearmed:
+                    self.stats['rearmed'] += len(rearmed)
+                    self._pending.update(rearmed)
+                crossings.extend((self._rules[rule_id], price) for rule_id in fired)
+        if not crossings:
+            return []
+
+        events = self._claim(crossings, now)
+        for event in events:
+            for sink in self.sinks:
+                try:
+                    sink(event)
+                except Exception as e:
+                    print(f"Fehler beim Zustellen eines Alarms: {str(e)}")
+        return events
+
+    def _claim(self, crossings: List[tuple], now: datetime) -> List[Dict]:
+        """Beansprucht die Auslösungen in der Datenbank; Alarme nur für die gewonnenen
+
+        Sehen mehrere Worker dieselbe Kreuzung, setzt nur einer `armed` von wahr
+        auf falsch (bedingtes UPDATE); die übrigen übernehmen lediglich den
+        entschärften Zustand. Zähler und Ereignis schreibt der Gewinner in
+        derselben Transaktion.
+        """
+        from flask import has_app_context
+        if not has_app_context():
+            with self._app.app_context():
+                return self._claim(crossings, now)
+        # Wieder scharf geschaltete Regeln zuerst speichern, sonst scheitert ihr Anspruch
+        self.persist()
+        table = AlertRule.__table__
+        by_price: Dict[float, List[CompiledRule]] = {}
+        for rule, price in crossings:
+            by_price.setdefault(price, []).append(rule)
+        events = []
+        try:
+            with db.engine.begin() as connection:
+                for price, rules in by_price.items():
+                    claim = table.update().where(table.c.armed.is_(True)).values(
+                        armed=False, trigger_count=table.c.trigger_count + 1, last_price=price, last_triggered_at=now)
+                    if connection.dialect.update_returning:
+                        # Ein UPDATE je Kurs (also je Symbol) für alle gekreuzten Regeln
+                        claimed = set(connection.execute(
+                            claim.where(table.c.id.in_([rule.id for rule in rules])).returning(table.c.id)).scalars())
+                    else:
+                        claimed = {rule.id for rule in rules
+                                   if connection.execute(claim.where(table.c.id == rule.id)).rowcount}
+                    for rule in rules:
+                        if rule.id not in claimed:
+                            continue
+                        with self._lock:
+                            rule.trigger_count += 1
+                            rule.last_price = price
+                            rule.last_triggered_at = now
+                        events.append(self._event(rule, price))
+                if events:
+                    connection.execute(AlertEvent.__table__.insert(),
+                                       [dict(event, triggered_at=now) for event in events])
+        except Exception as e:
+            print(f"Fehler beim Speichern ausgelöster Alarme: {str(e)}")
+            return []
+        self.stats['fired'] += len(events)
+        self.stats['claimed_elsewhere'] += len(crossings) - len(events)
+        return events
+
+    def persist(self) -> int:
+        """Schreibt wieder scharf geschaltete Regeln gebündelt in einer eigenen Transaktion
+
+        Nur von entschärft auf scharf, damit eine zwischenzeitliche Auslösung
+        in einem anderen Worker nicht überschrieben wird.
+        """
+        with self._lock:
+            rows = [{'rule_id': rule_id} for rule_id in self._pending if rule_id in self._rules]
+            pending, self._pending = self._pending, set()
+        if not rows:
+            return 0
+
+        table = AlertRule.__table__
+        statement = table.update().where(table.c.id == bindparam('rule_id'), table.c.armed.is_(False)) \
+            .values(armed=True)
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(statement, rows)
+        except Exception as e:
+            with self._lock:
+                self._pending |= pending
+            print(f"Fehler beim Speichern der Alarmzustände: {str(e)}")
+            return 0
+        self.stats['persisted'] += len(rows)
+        return len(rows)
+
+    def recent_events(self, user_id: Optional[int], limit: int = 50) -> List[Dict]:
+        """Zuletzt ausgelöste Alarme eines Benutzers aus allen Workern"""
+        query = AlertEvent.query.filter(AlertEvent.user_id.is_(None) if user_id is None
+                                        else AlertEvent.user_id == user_id)
+        return [event.to_dict() for event in
+                query.order_by(AlertEvent.triggered_at.desc(), AlertEvent.id.desc()).limit(limit)]
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'rules': len(self._rules),
+                'indexed': sum(len(index) for index in self._index.values()),
+                'symbols': len(self._index),
+                'pending': len(self._pending),
+                'version': self._version,
+                **self.stats
+            }
+
+alert_engine = AlertEngine()
+
+def init_app(app):
+    """Konsolen-/Datei-Zustellung laut Konfiguration und gebündeltes Speichern am Anfrageende"""
+    alert_engine._app = app
+    alert_engine.sync_seconds = float(app.config.get('ALERT_SYNC_SECONDS', 1.0))
+    from src.services.profile_service import profile_cache
+    profile_cache.listeners.append(alert_engine.currencies_changed)
+    if app.config.get('ALERT_LOG'):
+        alert_engine.add_sink(LogSink())
+    if app.config.get('ALERT_LOG_FILE'):
+        alert_engine.add_sink(JsonLinesSink(app.config['ALERT_LOG_FILE']))
+
+    @app.teardown_request
+    def persist_alert_state(exception=None):
+        alert_engine.persist()
@@ -0,0 +1,153 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import db
+from src.models.alert_rule import AlertRule
+from src.services.alert_service import DIRECTIONS, KINDS, alert_engine
+from src.services.tenant_service import current_user_id
+
+alerts_bp = Blueprint('alerts', __name__)
+
+def _user_rules():
+    user_id = current_user_id()
+    return AlertRule.query.filter(AlertRule.user_id.is_(None) if user_id is None else AlertRule.user_id == user_id)
+
+def _apply(rule, data):
+    """Übernimmt die Felder aus dem Request; gibt eine Fehlermeldung oder None zurück"""
+    if 'symbol' in data:
+        rule.symbol = str(data['symbol']).strip().upper()
+    if 'kind' in data:
+        rule.kind = data['kind']
+    if 'direction' in data:
+        rule.direction = data['direction']
+    if 'threshold' in data:
+        rule.threshold = float(data['threshold'])
+    if 'hysteresis' in data:
+        rule.hysteresis = float(data['hysteresis'])
+    if 'active' in data:
+        rule.active = bool(data['active'])
+
+    if not rule.symbol:
+        return 'Symbol erforderlich'
+    if rule.kind not in KINDS:
+        return f"kind muss einer von {', '.join(KINDS)} sein"
+    if rule.direction not in DIRECTIONS:
+        return f"direction muss einer von {', '.join(DIRECTIONS)} sein"
+    if rule.threshold is None or (rule.kind == 'price' and rule.threshold <= 0):
+        return 'Schwelle muss ein positiver Kurs sein' if rule.kind == 'price' else 'Schwelle erforderlich'
+    if rule.kind == 'pnl_percent' and rule.threshold <= -100:
+        return 'G/V-Schwelle muss über -100 % liegen'
+    if not 0 <= rule.hysteresis < 100:
+        return 'hysteresis muss zwischen 0 und 100 Prozent liegen'
+    return None
+
+@alerts_bp.route('/alerts', methods=['GET'])
+def get_alerts():
+    """Gibt alle Alarmregeln des aktuellen Benutzers zurück"""
+    try:
+        rules = _user_rules().order_by(AlertRule.symbol, AlertRule.threshold).all()
+        return jsonify({
+            'success': True,
+            'data': [rule.to_dict() for rule in rules]
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@alerts_bp.route('/alerts', methods=['POST'])
+def create_alert():
+    """Legt eine Kurs- oder G/V-Alarmregel an"""
+    try:
+        data = request.json or {}
+        rule = AlertRule(user_id=current_user_id(), kind='price', hysteresis=1.0, active=True, armed=True,
+                         trigger_count=0)
+        error = _apply(rule, data)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        db.session.add(rule)
+        db.session.commit()
+        alert_engine.upsert(rule)
+
+        return jsonify({
+            'success': True,
+            'data': rule.to_dict()
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@alerts_bp.route('/alerts/<int:rule_id>', methods=['PUT'])
+def update_alert(rule_id):
+    """Ändert eine Alarmregel; sie wird dabei wieder scharf geschaltet"""
+    try:
+        rule = _user_rules().filter(AlertRule.id == rule_id).first_or_404()
+        error = _apply(rule, request.json or {})
+        if error:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        rule.armed = True
+        db.session.commit()
+        alert_engine.upsert(rule)
+
+        return jsonify({
+            'success': True,
+            'data': rule.to_dict()
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@alerts_bp.route('/alerts/<int:rule_id>', methods=['DELETE'])
+def delete_alert(rule_id):
+    """Löscht eine Alarmregel"""
+    try:
+        rule = _user_rules().filter(AlertRule.id == rule_id).first_or_404()
+        db.session.delete(rule)
+        db.session.commit()
+        alert_engine.remove(rule_id)
+
+        return jsonify({
+            'success': True,
+            'message': 'Alarm erfolgreich gelöscht'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@alerts_bp.route('/alerts/events', methods=['GET'])
+def get_alert_events():
+    """Gibt die zuletzt ausgelösten Alarme des aktuellen Benutzers zurück"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 1000)
+        return jsonify({
+            'success': True,
+            'data': alert_engine.recent_events(current_user_id(), limit),
+            'engine': alert_engine.status()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -0,0 +1,367 @@
+from flask import Blueprint, jsonify, request
+from src.services.service_registry import services
+from src.services.tenant_service import user_cached, user_lots
+from src.services.series_service import build_portfolio_series, forward_fill, history_to_arrays, trading_calendar
+from src.services.analytics_service import AnalyticsService
+from src.services.fx_service import converter_for
+from src.services.transaction_service import ledger_for
+from datetime import datetime, timedelta
+import numpy as np
+
+analytics_bp = Blueprint('analytics', __name__)
+market_service = services.lazy('finnhub')
+history_prefetcher = services.lazy('history_prefetcher')
+projection_service = services.lazy('projection')
+rebalance_service = services.lazy('rebalance')
+
+def _load_series(days, benchmark=None):
+    """Lädt Kursreihen (parallel) und baut die Portfolio-Tagesreihe"""
+    entries = user_lots()
+    if not entries:
+        return None, None
+
+    symbols = set(entry.symbol for entry in entries)
+    wanted = [(symbol, days) for symbol in symbols]
+    if benchmark:
+        wanted.append((benchmark, days))
+    prefetch = history_prefetcher.prefetch(wanted)
+
+    # Kurse und Einstände in der Berichtswährung (?currency=)
+    converter = converter_for(entries, [benchmark] if benchmark else [])
+    price_arrays = converter.price_arrays({
+        symbol: history_to_arrays(data) for symbol, data in prefetch.data.items() if symbol in symbols
+    })
+    oldest_date = min(entry.purchase_date for entry in entries)
+    start_date = max(oldest_date, (datetime.now() - timedelta(days=days)).date())
+    series = build_portfolio_series(ledger_for(entries, converter).series_lots(converter.lots()), price_arrays,
+                                    start_date=start_date)
+
+    benchmark_closes = None
+    if series is not None and benchmark and prefetch.data.get(benchmark):
+        benchmark_arrays = converter.price_arrays({benchmark: history_to_arrays(prefetch.data[benchmark])})
+        benchmark_closes = series.align(benchmark_arrays[benchmark])
+    return series, benchmark_closes
+
+def _analytics_service():
+    return AnalyticsService(
+        risk_free_rate=float(request.args.get('risk_free', 0.0)),
+        volatility_window=int(request.args.get('window', 21))
+    )
+
+def _benchmark_symbol(symbol):
+    """Prüft, ob die Benchmark einer der vorgeschlagenen ETFs ist"""
+    symbol = symbol.upper()
+    allowed = {etf['symbol'] for etf in market_service.get_etf_suggestions()}
+    return symbol if symbol in allowed else None
+
+def _no_data_response():
+    return jsonify({
+        'success': False,
+        'error': 'Keine Portfolio-Einträge oder Kursdaten vorhanden'
+    }), 404
+
+def _format_risk(risk, series):
+    """Wandelt die rollierende Volatilität in eine Zeitreihe für die Charts um"""
+    rolling = risk.pop('rolling_volatility')
+    dates = series.date_strings()[-len(rolling):] if len(rolling) else []
+    risk['rolling_volatility'] = [
+        {'date': date_str, 'volatility': float(value)} for date_str, value in zip(dates, rolling)
+    ]
+    return risk
+
+@analytics_bp.route('/analytics/summary', methods=['GET'])
+@user_cached
+def get_analytics_summary():
+    """Gibt alle Rendite- und Risikokennzahlen in einer Antwort zurück"""
+    try:
+        days = int(request.args.get('days', 365))
+        benchmark = _benchmark_symbol(request.args.get('benchmark', 'SPY'))
+        if not benchmark:
+            return jsonify({
+                'success': False,
+                'error': 'Benchmark muss einer der vorgeschlagenen ETFs sein'
+            }), 400
+
+        series, benchmark_closes = _load_series(days, benchmark)
+        if series is None:
+            return _no_data_response()
+
+        result = _analytics_service().compute_all(series, benchmark_closes)
+        result['risk'] = _format_risk(result['risk'], series)
+
+        return jsonify({
+            'success': True,
+            'data': result,
+            'benchmark': benchmark,
+            'start_date': series.date_strings()[0],
+            'end_date': series.date_strings()[-1]
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/analytics/returns', methods=['GET'])
+@user_cached
+def get_analytics_returns():
+    """Gibt zeit- und geldgewichtete Rendite zurück"""
+    try:
+        days = int(request.args.get('days', 365))
+        series, _ = _load_series(days)
+        if series is None:
+            return _no_data_response()
+
+        analytics_service = _analytics_service()
+        returns = analytics_service.daily_returns(series)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'time_weighted': analytics_service.time_weighted_return(returns),
+                'money_weighted': analytics_service.money_weighted_return(series)
+            }
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/analytics/risk', methods=['GET'])
+@user_cached
+def get_analytics_risk():
+    """Gibt Volatilität, Drawdown und Sharpe Ratio zurück"""
+    try:
+        days = int(request.args.get('days', 365))
+        series, _ = _load_series(days)
+        if series is None:
+            return _no_data_response()
+
+        result = _analytics_service().compute_all(series)
+
+        return jsonify({
+            'success': True,
+            'data': _format_risk(result['risk'], series)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/analytics/benchmark/<etf_symbol>', methods=['GET'])
+@user_cached
+def get_analytics_benchmark(etf_symbol):
+    """Gibt Beta und Korrelation gegenüber einem ETF zurück"""
+    try:
+        benchmark = _benchmark_symbol(etf_symbol)
+        if not benchmark:
+            return jsonify({
+                'success': False,
+                'error': 'Benchmark muss einer der vorgeschlagenen ETFs sein'
+            }), 400
+
+        days = int(request.args.get('days', 365))
+        series, benchmark_closes = _load_series(days, benchmark)
+        if series is None or benchmark_closes is None:
+            return _no_data_response()
+
+        analytics_service = _analytics_service()
+        returns = analytics_service.daily_returns(series)
+
+        return jsonify({
+            'success': True,
+            'data': analytics_service.benchmark_statistics(returns, benchmark_closes),
+            'benchmark': benchmark
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _holdings_matrix(days, extra_symbols=()):
+    """Gehaltene Stückzahlen und vorwärts gefüllte Schlusskurse (Tage x Symbole) in Berichtswährung
+
+    Symbole ohne Kursdaten gehen mit ihrem letzten Wert als konstanter Betrag ein.
+    Zusätzliche Symbole (z.B. ETFs für die Umschichtung) erscheinen mit Stückzahl 0.
+    """
+    entries = user_lots()
+    if not entries:
+        return None
+
+    # Offene Stückzahlen nach Verkäufen und Splits
+    converter = converter_for(entries, extra_symbols)
+    ledger = ledger_for(entries, converter)
+    quantities = ledger.open_quantities()
+    if not quantities:
+        return None
+    for symbol in extra_symbols:
+        quantities.setdefault(symbol, 0.0)
+    prefetch = history_prefetcher.prefetch([(symbol, days) for symbol in quantities])
+
+    price_arrays = converter.price_arrays({
+        symbol: history_to_arrays(data) for symbol, data in prefetch.data.items() if symbol in quantities and data
+    })
+    symbols = sorted(price_arrays)
+    unpriced = [entry for entry in entries if entry.symbol not in price_arrays]
+    cash = 0.0
+    if unpriced:
+        cost_fractions, quantity_factors = ledger.lot_factors(unpriced)
+        current = converter.current(unpriced) * quantity_factors
+        cash = float(np.where(np.isnan(current), converter.invested(unpriced) * cost_fractions, current).sum())
+    if not symbols:
+        return None
+
+    calendar = trading_calendar(
+        [price_arrays[symbol] for symbol in symbols], start_date=(datetime.now() - timedelta(days=days)).date()
+    )
+    closes = np.full((len(calendar), len(symbols)), np.nan)
+    for column, symbol in enumerate(symbols):
+        dates, values = price_arrays[symbol]
+        positions = np.searchsorted(dates, calendar, side='right') - 1
+        valid = positions >= 0
+        closes[valid, column] = values[positions[valid]]
+    closes = forward_fill(closes)
+    # Erst ab dem Tag, an dem alle Symbole einen Kurs haben
+    closes = closes[~np.isnan(closes).any(axis=1)]
+
+    return {
+        'symbols': symbols,
+        'quantities': np.array([quantities[symbol] for symbol in symbols]),
+        'closes': closes,
+        'cash': cash,
+        'currency': converter.target
+    }
+
+@analytics_bp.route('/analytics/projection', methods=['GET'])
+@user_cached
+def get_analytics_projection():
+    """Monte-Carlo-Projektion des Portfoliowerts mit Perzentilbändern und VaR/CVaR"""
+    try:
+        days = int(request.args.get('days', 365))
+        horizon = int(request.args.get('horizon', 252))
+        paths = int(request.args.get('paths', 10000))
+        confidence = float(request.args.get('confidence', 0.95))
+        seed = request.args.get('seed', type=int)
+        if not 1 <= horizon <= 1260 or not 100 <= paths <= 100000 or not 0.5 <= confidence < 1:
+            return jsonify({
+                'success': False,
+                'error': 'horizon muss 1-1260, paths 100-100000 und confidence 0.5-0.99 sein'
+            }), 400
+
+        holdings = _holdings_matrix(days)
+        if holdings is None or len(holdings['closes']) < 3:
+            return _no_data_response()
+
+        # Gleiche Bestände und Parameter liefern dieselbe Projektion, auch über Benutzer hinweg
+        key = (
+            tuple(zip(holdings['symbols'], holdings['quantities'].round(8).tolist())),
+            round(holdings['cash'], 2), holdings['currency'], datetime.now().date(),
+            horizon, paths, days, confidence, seed
+        )
+        result = projection_service.cache.get(key)
+        cached = result is not None
+        if not cached:
+            result = projection_service.project(
+                holdings['closes'], holdings['quantities'], horizon, paths,
+                confidence=confidence, seed=seed, cash=holdings['cash']
+            )
+            result['currency'] = holdings['currency']
+            result['symbols'] = holdings['symbols']
+            result['estimation_days'] = len(holdings['closes'])
+            projection_service.cache.put(key, result)
+
+        return jsonify({
+            'success': True,
+            'data': result,
+            'cached': cached
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/analytics/rebalance', methods=['POST'])
+def rebalance_portfolio():
+    """Zielgewichte (Minimum-Varianz, maximale Sharpe-Ratio oder vorgegeben) und Orders dorthin"""
+    try:
+        data = request.json or {}
+        strategy = data.get('strategy', 'min_variance')
+        days = int(data.get('days', 365))
+        cash = float(data.get('cash', 0.0))
+        max_weight = float(data.get('max_weight', 1.0))
+        risk_free = float(data.get('risk_free', 0.0))
+        min_trade_value = float(data.get('min_trade_value', 0.0))
+        fractional = bool(data.get('fractional', False))
+        targets = {str(symbol).upper(): float(weight) for symbol, weight in (data.get('targets') or {}).items()}
+
+        if strategy not in ('min_variance', 'max_sharpe', 'target'):
+            error = 'strategy muss min_variance, max_sharpe oder target sein'
+        elif strategy == 'target' and not targets:
+            error = 'targets (Symbol -> Gewicht) erforderlich'
+        elif any(weight < 0 for weight in targets.values()) or sum(targets.values()) > 1 + 1e-9:
+            error = 'Zielgewichte müssen nicht negativ sein und zusammen höchstens 1 ergeben'
+        elif not 0 < max_weight <= 1 or cash < 0 or min_trade_value < 0 or not 30 <= days <= 3650:
+            error = 'max_weight muss in (0, 1], cash und min_trade_value >= 0 und days 30-3650 sein'
+        else:
+            error = None
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        # Vorgeschlagene ETFs (alle mit etfs=true) als zusätzliche Kandidaten
+        suggested = [etf['symbol'] for etf in market_service.get_etf_suggestions()]
+        etfs = data.get('etfs') or []
+        if isinstance(etfs, str):
+            etfs = etfs.split(',')
+        etfs = suggested if etfs is True else [symbol for symbol in (_benchmark_symbol(str(s)) for s in etfs) if symbol]
+        extra = sorted(set(etfs) | set(targets))
+
+        holdings = _holdings_matrix(days, extra)
+        if holdings is None or len(holdings['closes']) < 3:
+            return _no_data_response()
+        symbols = holdings['symbols']
+        missing = sorted(set(targets) - set(symbols))
+        if missing:
+            return jsonify({
+                'success': False,
+                'error': f"Keine Kursdaten für {', '.join(missing)}"
+            }), 400
+
+        # Schätzungen je Symbolmenge, Währung, Zeitraum und Tag wiederverwenden
+        key = (tuple(symbols), holdings['currency'], days, len(holdings['closes']), datetime.now().date())
+        weights = np.array([targets.get(symbol, 0.0) for symbol in symbols]) if strategy == 'target' else None
+        try:
+            result = rebalance_service.rebalance(
+                key, symbols, holdings['closes'], holdings['quantities'], strategy, targets=weights, cash=cash,
+                max_weight=max_weight, risk_free=risk_free, fractional=fractional, min_trade_value=min_trade_value
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        result['currency'] = holdings['currency']
+        # Positionen ohne Kursdaten werden nicht umgeschichtet
+        result['unpriced_value'] = holdings['cash']
+
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -0,0 +1,127 @@
+import numpy as np
+from typing import Dict, Optional
+
+from src.services.series_service import PortfolioSeries
+
+TRADING_DAYS = 252
+
+class AnalyticsService:
+    """Rendite- und Risikokennzahlen über einer array-basierten Portfolio-Reihe"""
+
+    def __init__(self, risk_free_rate: float = 0.0, volatility_window: int = 21):
+        self.risk_free_rate = risk_free_rate
+        self.volatility_window = volatility_window
+
+    def daily_returns(self, series: PortfolioSeries) -> np.ndarray:
+        """Zeitgewichtete Tagesrenditen, bereinigt um an diesem Tag zugeflossenes Kapital"""
+        values = series.values
+        previous = values[:-1]
+        returns = np.zeros(len(values) - 1)
+        np.divide(values[1:] - series.cash_flows[1:], previous, out=returns, where=previous > 0)
+        returns[previous > 0] -= 1
+        return returns
+
+    def time_weighted_return(self, returns: np.ndarray) -> Dict:
+        total = float(np.prod(1 + returns) - 1) if len(returns) else 0.0
+        years = len(returns) / TRADING_DAYS
+        annualized = (1 + total) ** (1 / years) - 1 if years > 0 and total > -1 else None
+        return {'total': total, 'annualized': annualized}
+
+    def money_weighted_return(self, series: PortfolioSeries) -> Optional[float]:
+        """Annualisierter interner Zinsfuß (XIRR) über Anfangswert, Zuflüsse und Endwert"""
+        flows = -series.cash_flows.copy()
+        flows[0] = -series.values[0]
+        flows[-1] += series.values[-1]
+        mask = flows != 0
+        if mask.sum() < 2:
+            return None
+
+        flows = flows[mask]
+        years = (series.dates[mask] - series.dates[0]).astype(np.float64) / 365.0
+        rate = 0.1
+        # Newton-Verfahren auf dem Kapitalwert
+        for _ in range(50):
+            discount = (1 + rate) ** -years
+            npv = np.dot(flows, discount)
+            derivative = np.dot(-years * flows, discount / (1 + rate))
+            if derivative == 0:
+                return None
+            step = npv / derivative
+            rate = max(rate - step, -0.9999)
+            if abs(step) < 1e-10:
+                return float(rate)
+        return None
+
+    def rolling_volatility(self, returns: np.ndarray, window: int = None) -> np.ndarray:
+        """Annualisierte rollierende Volatilität über kumulierte Summen"""
+        window = window or self.volatility_window
+        if len(returns) < window:
+            return np.array([])
+        sums = np.concatenate(([0.0], np.cumsum(returns)))
+        squares = np.concatenate(([0.0], np.cumsum(returns * returns)))
+        window_sum = sums[window:] - sums[:-window]
+        window_squares = squares[window:] - squares[:-window]
+        variance = (window_squares - window_sum * window_sum / window) / (window - 1)
+        return np.sqrt(np.clip(variance, 0, None) * TRADING_DAYS)
+
+    def max_drawdown(self, returns: np.ndarray, series: PortfolioSeries) -> Dict:
+        wealth = np.concatenate(([1.0], np.cumprod(1 + returns)))
+        peaks = np.maximum.accumulate(wealth)
+        drawdowns = wealth / peaks - 1
+        trough = int(np.argmin(drawdowns))
+        peak = int(np.argmax(wealth[:trough + 1]))
+        dates = series.date_strings()
+        return {
+            'max_drawdown': float(drawdowns[trough]),
+            'peak_date': dates[peak],
+            'trough_date': dates[trough]
+        }
+
+    def sharpe_ratio(self, returns: np.ndarray) -> Optional[float]:
+        if len(returns) < 2:
+            return None
+        excess = returns - self.risk_free_rate / TRADING_DAYS
+        deviation = excess.std(ddof=1)
+        if deviation == 0:
+            return None
+        return float(excess.mean() / deviation * np.sqrt(TRADING_DAYS))
+
+    def benchmark_statistics(self, returns: np.ndarray, benchmark_closes: np.ndarray) -> Dict:
+        """Beta und Korrelation gegenüber einer auf den Index ausgerichteten Benchmark"""
+        previous = benchmark_closes[:-1]
+        benchmark_returns = benchmark_closes[1:] / previous - 1
+        valid = ~np.isnan(benchmark_returns) & (previous > 0)
+        if valid.sum() < 2:
+            return {'beta': None, 'correlation': None}
+
+        portfolio = returns[valid]
+        benchmark = benchmark_returns[valid]
+        covariance = np.cov(portfolio, benchmark)
+        beta = covariance[0, 1] / covariance[1, 1] if covariance[1, 1] > 0 else None
+        denominator = np.sqrt(covariance[0, 0] * covariance[1, 1])
+        correlation = covariance[0, 1] / denominator if denominator > 0 else None
+        return {
+            'beta': float(beta) if beta is not None else None,
+            'correlation': float(correlation) if correlation is not None else None
+        }
+
+    def compute_all(self, series: PortfolioSeries, benchmark_closes: np.ndarray = None) -> Dict:
+        """Berechnet alle Kennzahlen in einem Durchlauf über die Tagesrenditen"""
+        returns = self.daily_returns(series)
+        rolling = self.rolling_volatility(returns)
+        result = {
+            'returns': {
+                'time_weighted': self.time_weighted_return(returns),
+                'money_weighted': self.money_weighted_return(series)
+            },
+            'risk': {
+                'volatility': float(returns.std(ddof=1) * np.sqrt(TRADING_DAYS)) if len(returns) > 1 else None,
+                'rolling_volatility': rolling,
+                'rolling_window': self.volatility_window,
+                'sharpe_ratio': self.sharpe_ratio(returns),
+                **self.max_drawdown(returns, series)
+            }
+        }
+        if benchmark_closes is not None:
+            result['benchmark'] = self.benchmark_statistics(returns, benchmark_closes)
+        return result
@@ -0,0 +1,10 @@
+"""ASGI-Einstiegspunkt, z.B. für uvicorn src.asgi:asgi_app --workers 4
+
+Die App bleibt eine Flask-(WSGI-)Anwendung; WsgiToAsgi führt jede Anfrage in
+einem Thread-Pool aus. Mit ASYNC_MODE=1 laufen die Upstream-Aufrufe der
+async-Views dort als Coroutinen statt blockierend.
+"""
+from asgiref.wsgi import WsgiToAsgi
+from src.main import app
+
+asgi_app = WsgiToAsgi(app)
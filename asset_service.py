@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from src.services.response_service import COMPRESSIBLE_MIMETYPES, brotli
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+MAX_INLINE_BYTES = 2 * 1024 * 1024
+MIN_COMPRESS_BYTES = 1024
+
+# src="app.js", href="/style.css" usw. in HTML-Seiten
+ASSET_REFERENCE = re.compile(r'(?P<attr>src|href)="/?(?P<name>[^"#?:]+)"')
+
+class Asset:
+    __slots__ = ('name', 'path', 'hashed_name', 'digest', 'mimetype', 'variants')
+
+    def __init__(self, name: str, path: str, mimetype: str):
+        self.name = name
+        self.path = path
+        self.mimetype = mimetype
+        self.hashed_name = None
+        self.digest = None
+        self.variants: Dict[str, bytes] = {}  # Encoding ('' = unkomprimiert) -> Inhalt
+
+    def load(self, data: bytes):
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, extension = os.path.splitext(self.name)
+        self.hashed_name = f'{stem}.{self.digest}{extension}'
+        self.variants = {'': data}
+        if self.mimetype not in COMPRESSIBLE_MIMETYPES or len(data) < MIN_COMPRESS_BYTES:
+            return
+        # Vorkomprimiert mit maximaler Stufe, da nur einmal beim Start
+        candidates = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(data, quality=11)
+        for encoding, compressed in candidates.items():
+            if len(compressed) < len(data):
+                self.variants[encoding] = compressed
+
+    @property
+    def is_html(self) -> bool:
+        return self.mimetype == 'text/html'
+
+class AssetManifest:
+    """Einmal beim Start erstelltes Verzeichnis aller statischen Dateien
+
+    Jede Datei erhält einen Namen mit Inhalts-Hash (app.3f2a9c1b7d0e.js), der
+    unbegrenzt gecacht werden darf; HTML-Seiten verweisen auf diese Namen und
+    werden per ETag revalidiert. Anfragen kommen ohne Dateisystemzugriff aus.
+    """
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self.assets: Dict[str, Asset] = {}
+        self.hashed: Dict[str, Asset] = {}
+
+    def build(self):
+        assets = {}
+        for root, _, files in os.walk(self.static_folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                assets[name] = Asset(name, path, mimetype)
+
+        # Zuerst die referenzierten Dateien, danach HTML mit umgeschriebenen Verweisen
+        for asset in sorted(assets.values(), key=lambda item: item.is_html):
+            if os.path.getsize(asset.path) > MAX_INLINE_BYTES:
+                with open(asset.path, 'rb') as handle:
+                    asset.digest = hashlib.file_digest(handle, 'sha256').hexdigest()[:12]
+                asset.hashed_name = asset.name  # große Dateien nur per ETag, aus dem Dateisystem
+                continue
+            with open(asset.path, 'rb') as handle:
+                data = handle.read()
+            if asset.is_html:
+                data = self._rewrite_references(data.decode('utf-8'), assets).encode('utf-8')
+            asset.load(data)
+
+        self.assets = assets
+        self.hashed = {asset.hashed_name: asset for asset in assets.values() if not asset.is_html}
+        return self
+
+    def _rewrite_references(self, html: str, assets: Dict[str, Asset]) -> str:
+        def replace(match):
+            asset = assets.get(match.group('name'))
+            if asset is None or asset.is_html or asset.hashed_name is None:
+                return match.group(0)
+            return f'{match.group("attr")}="/{asset.hashed_name}"'
+        return ASSET_REFERENCE.sub(replace, html)
+
+    def lookup(self, path: str):
+        """(Asset, unveränderlich?) zu einem Anfragepfad; unbekannte Pfade liefern index.html"""
+        asset = self.hashed.get(path)
+        if asset is not None and asset.hashed_name != asset.name:
+            return asset, True
+        asset = self.assets.get(path) or self.assets.get('index.html')
+        return asset, False
+
+    def response_for(self, path: str, request, response_class):
+        asset, immutable = self.lookup(path)
+        if asset is None:
+            return 'index.html not found', 404
+
+        if not asset.variants:
+            from flask import send_file
+            response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.digest, conditional=True)
+            response.headers['Cache-Control'] = REVALIDATE_CACHE
+            return response
+
+        encoding = choose_variant(asset, request.accept_encodings)
+        response = response_class(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+        # Eigenes ETag je Kodierung, da sich die Bytes unterscheiden
+        response.set_etag(f'{asset.digest}-{encoding}' if encoding else asset.digest)
+        return response.make_conditional(request)
+
+def choose_variant(asset: Asset, accept_encodings) -> str:
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and accept_encodings[encoding]:
+            return encoding
+    return ''
+
+asset_manifest: Optional[AssetManifest] = None
+
+def init_app(app):
+    """Erstellt das Manifest, falls STATIC_MANIFEST aktiv ist und der Static-Ordner existiert"""
+    global asset_manifest
+    if not app.config.get('STATIC_MANIFEST') or not app.static_folder or not os.path.isdir(app.static_folder):
+        return
+    asset_manifest = AssetManifest(app.static_folder).build()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.services.market_data_service import FINNHUB_RATE_LIMITER, candle_params, parse_candles
+from src.services.metrics_service import bind_context, record_upstream, sampled_thread
+
+# ASYNC_MODE=1: Upstream-Aufrufe laufen nicht-blockierend über httpx und asyncio
+ASYNC_MODE = os.environ.get('ASYNC_MODE', '0') == '1'
+
+async def offload(func, *args):
+    """Blockierender Aufruf: im Async-Modus in einem Hilfs-Thread, sonst direkt
+
+    Ohne ASYNC_MODE suspendiert die aufrufende Coroutine dadurch nie (siehe async_view).
+    """
+    if ASYNC_MODE:
+        return await asyncio.to_thread(bind_context(func), *args)
+    return func(*args)
+
+def async_view(view):
+    """Registriert eine async-View nur im Async-Modus als Coroutine
+
+    Ohne ASYNC_MODE wartet die View nur auf Coroutinen, die nie suspendieren
+    (offload, prefetch_async); sie wird dann synchron in einem Schritt
+    ausgeführt, ohne Event-Loop je Anfrage und ohne flask[async].
+    """
+    if ASYNC_MODE:
+        @wraps(view)
+        async def coroutine(*args, **kwargs):
+            # Die Event-Loop läuft in einem eigenen Thread; der Profiler soll ihn mit erfassen
+            with sampled_thread():
+                return await view(*args, **kwargs)
+        return coroutine
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        coroutine = view(*args, **kwargs)
+        try:
+            coroutine.send(None)
+        except StopIteration as finished:
+            return finished.value
+        coroutine.close()
+        raise RuntimeError(f'{view.__name__} hat ohne ASYNC_MODE auf eine Event-Loop gewartet')
+    return wrapper
+
+class AsyncMarketDataService:
+    """Asynchrones Gegenstück zu MarketDataService für parallele Finnhub-Abrufe
+
+    Teilt das Rate Limit mit dem synchronen Dienst; Wartezeiten blockieren
+    nur die jeweilige Coroutine, nicht den Worker-Thread.
+    """
+
+    def __init__(self, api_key: str = None, max_connections: int = 20):
+        self.finnhub_api_key = api_key or os.environ.get('FINNHUB_API_KEY', "demo")
+        self.finnhub_base_url = os.environ.get('FINNHUB_BASE_URL', "https://finnhub.io/api/v1")
+        self.rate_limiter = FINNHUB_RATE_LIMITER
+        self.max_connections = max_connections
+
+    def _client(self):
+        # httpx wird nur im Async-Modus benötigt
+        import httpx
+        limits = httpx.Limits(max_connections=self.max_connections)
+        return httpx.AsyncClient(timeout=10, limits=limits)
+
+    async def _make_request(self, client, url: str, params: Dict) -> Optional[Dict]:
+        """Macht eine API-Anfrage mit (asynchronem) Rate Limiting"""
+        sleep_seconds = 0.0
+        started = time.perf_counter()
+        try:
+            sleep_seconds = await self.rate_limiter.acquire_async()
+
+            params['token'] = self.finnhub_api_key
+            started = time.perf_counter()
+            response = await client.get(url, params=params)
+            record_upstream('finnhub', time.perf_counter() - started, sleep_seconds, str(response.status_code))
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"API Error: {response.status_code} - {response.text}")
+                return None
+
+        except Exception as e:
+            record_upstream('finnhub', time.perf_counter() - started, sleep_seconds, 'error')
+            print(f"Request error: {str(e)}")
+            return None
+
+    async def _current_price(self, client, symbol: str) -> Optional[float]:
+        data = await self._make_request(client, f"{self.finnhub_base_url}/quote", {'symbol': symbol})
+        if data and 'c' in data:
+            return float(data['c'])
+        return None
+
+    async def _historical_data(self, client, symbol: str, days: int) -> Tuple[str, int, Optional[List[Dict]], float]:
+        started = time.perf_counter()
+        data = await self._make_request(client, f"{self.finnhub_base_url}/stock/candle", candle_params(symbol, days))
+        return symbol, days, parse_candles(data), time.perf_counter() - started
+
+    async def get_current_price(self, symbol: str) -> Optional[float]:
+        """Holt den aktuellen Kurs für ein Symbol"""
+        async with self._client() as client:
+            return await self._current_price(client, symbol)
+
+    async def get_multiple_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Holt aktuelle Kurse für mehrere Symbole gleichzeitig"""
+        async with self._client() as client:
+            prices = await asyncio.gather(*(self._current_price(client, symbol) for symbol in symbols))
+        return {symbol: price for symbol, price in zip(symbols, prices) if price}
+
+    async def get_many_historical(self, requests: Iterable[Tuple[str, int]]) -> List[Tuple[str, int, Optional[List[Dict]], float]]:
+        """Holt mehrere Kursreihen gleichzeitig; liefert (Symbol, Tage, Daten, Sekunden)"""
+        async with self._client() as client:
+            return await asyncio.gather(*(self._historical_data(client, symbol, days) for symbol, days in requests))
+
+# Nur im Async-Modus instanziiert; sonst laufen die Routen über den synchronen Dienst
+async_market_service = AsyncMarketDataService() if ASYNC_MODE else None
@@ -0,0 +1,109 @@
+"""Benchmark: Alarm-Auswertung über sortierte Schwellen gegen die Prüfung jeder Regel
+
+Legt in einer temporären SQLite-Datenbank viele Kursalarme (über- und unter-
+schreitend, mit Hysterese) auf wenige Symbole an, lädt sie in die AlertEngine
+und spielt Random-Walk-Kurse ein. Gemessen werden Kurse pro Sekunde, die damit
+abgedeckten Regelprüfungen pro Sekunde, ausgelöste Alarme und die Dauer des
+gebündelten Speicherns. Zum Vergleich prüft eine einfache Schleife jede Regel
+eines Symbols bei jedem Kurs.
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_alerts --rules 200000 --symbols 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import symbol_names
+
+def naive_checks(rules_by_symbol, ticks):
+    """Referenz: jede Regel des Symbols bei jedem Kurs vergleichen (ohne Zustand)"""
+    fired = 0
+    for symbol, price in ticks:
+        for direction, threshold in rules_by_symbol[symbol]:
+            if (price >= threshold) if direction == 'above' else (price <= threshold):
+                fired += 1
+    return fired
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=200000)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--ticks', type=int, default=200000, help='eingespielte Kurse')
+    parser.add_argument('--batch', type=int, default=50, help='Kurse je observe()-Aufruf')
+    parser.add_argument('--volatility', type=float, default=0.001, help='Standardabweichung je Tick')
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    # Umgebung muss vor dem Import der App gesetzt sein
+    os.environ['DATABASE_URL'] = f'sqlite:///{database.name}'
+    from src.main import app
+    from src.models.user import db
+    from src.models.alert_rule import AlertRule
+    from src.services.alert_service import AlertEngine
+
+    rng = random.Random(7)
+    names = symbol_names(args.symbols)
+    start = {symbol: rng.uniform(20, 500) for symbol in names}
+    try:
+        with app.app_context():
+            rows = []
+            for i in range(args.rules):
+                symbol = names[i % len(names)]
+                direction = rng.choice(('above', 'below'))
+                offset = rng.uniform(0.01, 0.3)
+                rows.append({
+                    'symbol': symbol, 'kind': 'price', 'direction': direction,
+                    'threshold': start[symbol] * (1 + offset if direction == 'above' else 1 - offset),
+                    'hysteresis': 1.0, 'active': True, 'armed': True, 'trigger_count': 0
+                })
+            db.session.execute(db.insert(AlertRule), rows)
+            db.session.commit()
+
+            engine = AlertEngine()
+            started = time.perf_counter()
+            engine.load()
+            load_seconds = time.perf_counter() - started
+
+            # Random Walk je Tick; bei --volatility 0.01 werden Schwellen ständig gekreuzt
+            prices = dict(start)
+            ticks = []
+            for i in range(args.ticks):
+                symbol = names[i % len(names)]
+                prices[symbol] *= 1 + rng.gauss(0, args.volatility)
+                ticks.append((symbol, prices[symbol]))
+            batches = [dict(ticks[i:i + args.batch]) for i in range(0, len(ticks), args.batch)]
+
+            started = time.perf_counter()
+            events = sum(len(engine.observe(batch)) for batch in batches)
+            observe_seconds = time.perf_counter() - started
+            status = engine.status()
+
+            started = time.perf_counter()
+            persisted = engine.persist()
+            persist_seconds = time.perf_counter() - started
+
+        rules_by_symbol = {symbol: [] for symbol in names}
+        for row in rows:
+            rules_by_symbol[row['symbol']].append((row['direction'], row['threshold']))
+        sample = ticks[:max(1, min(len(ticks), 2_000_000 // max(1, args.rules // args.symbols)))]
+        started = time.perf_counter()
+        naive_checks(rules_by_symbol, sample)
+        naive_seconds = time.perf_counter() - started
+        naive_rate = len(sample) * (args.rules / args.symbols) / naive_seconds
+
+        print(f"{args.rules} Regeln auf {args.symbols} Symbolen, {status['prices']} Kurse in Stapeln zu {args.batch}")
+        print(f"Laden: {load_seconds * 1000:.0f} ms")
+        print(f"Index: {status['prices'] / observe_seconds:,.0f} Kurse/s, "
+              f"{status['checks'] / observe_seconds:,.0f} Regelprüfungen/s")
+        print(f"Naiv:  {naive_rate / (args.rules / args.symbols):,.0f} Kurse/s, {naive_rate:,.0f} Regelprüfungen/s")
+        print(f"Faktor: {status['checks'] / observe_seconds / naive_rate:.0f}x")
+        print(f"Alarme: {events}, wieder scharf: {status['rearmed']}, "
+              f"gespeichert: {persisted} Regeln in {persist_seconds * 1000:.0f} ms")
+    finally:
+        os.unlink(database.name)
+
+if __name__ == '__main__':
+    main()
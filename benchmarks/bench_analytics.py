@@ -0,0 +1,66 @@
+"""Benchmark: Portfolio-Reihe und Kennzahlen für 10 Jahre x 200 Symbole
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_analytics
+"""
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.services.analytics_service import AnalyticsService
+from src.services.series_service import build_portfolio_series
+
+YEARS = 10
+SYMBOLS = 200
+LOTS_PER_SYMBOL = 5
+TARGET_MS = 100
+
+class Lot:
+    __slots__ = ('symbol', 'purchase_date', 'quantity', 'total_value')
+
+    def __init__(self, symbol, purchase_date, quantity, total_value):
+        self.symbol = symbol
+        self.purchase_date = purchase_date
+        self.quantity = quantity
+        self.total_value = total_value
+
+def synthetic_data(rng):
+    start = np.datetime64(date.today() - timedelta(days=365 * YEARS), 'D')
+    calendar = np.arange(start, np.datetime64(date.today(), 'D'))
+    calendar = calendar[np.is_busday(calendar)]
+
+    price_arrays = {}
+    lots = []
+    for i in range(SYMBOLS):
+        symbol = f'SYM{i:03d}'
+        returns = rng.normal(0.0003, 0.015, len(calendar))
+        closes = 100 * np.exp(np.cumsum(returns))
+        # Einzelne fehlende Handelstage wie bei echten Daten
+        keep = rng.random(len(calendar)) > 0.01
+        price_arrays[symbol] = (calendar[keep], closes[keep])
+
+        for day in rng.integers(0, len(calendar), LOTS_PER_SYMBOL):
+            quantity = float(rng.integers(1, 50))
+            purchase_date = calendar[day].astype(object)
+            lots.append(Lot(symbol, purchase_date, quantity, quantity * closes[day]))
+    return lots, price_arrays, price_arrays['SYM000']
+
+def main(repeats=20):
+    rng = np.random.default_rng(42)
+    lots, price_arrays, benchmark = synthetic_data(rng)
+    analytics_service = AnalyticsService()
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        series = build_portfolio_series(lots, price_arrays)
+        analytics_service.compute_all(series, series.align(benchmark))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    median = float(np.median(timings))
+    print(f'{len(series)} Handelstage x {SYMBOLS} Symbole, {len(lots)} Lots')
+    print(f'Median: {median:.1f} ms, Min: {min(timings):.1f} ms (Ziel < {TARGET_MS} ms)')
+    return median < TARGET_MS
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
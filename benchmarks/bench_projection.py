@@ -0,0 +1,62 @@
+"""Benchmark: Monte-Carlo-Projektion im Prozess gegen den Prozess-Pool
+
+Erzeugt korrelierte Random-Walk-Kurse für ein Portfolio, schätzt daraus
+Renditen und Kovarianz wie GET /api/analytics/projection und misst die
+simulierten Pfade pro Sekunde einmal im Prozess und einmal verteilt auf
+den spawn-Pool von ProjectionService (ohne Pool-Start, der einmalig anfällt).
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_projection --symbols 20 --paths 100000
+"""
+import argparse
+import os
+import statistics
+
+import numpy as np
+
+def synthetic_closes(symbols, days, seed=1):
+    """Korrelierte Log-Renditen über einen gemeinsamen Marktfaktor"""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.01, (days, 1))
+    returns = market * rng.uniform(0.5, 1.5, symbols) + rng.normal(0.0002, 0.012, (days, symbols))
+    return 100 * np.exp(np.cumsum(returns, axis=0))
+
+def measure(service, closes, quantities, args):
+    seconds = []
+    for run in range(args.runs):
+        result = service.project(closes, quantities, args.horizon, args.paths, seed=run)
+        seconds.append(result['simulation_seconds'])
+    return statistics.median(seconds), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--horizon', type=int, default=252)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    from src.services.projection_service import ProjectionService
+
+    closes = synthetic_closes(args.symbols, 365)
+    quantities = np.full(args.symbols, 10.0)
+    inline = ProjectionService(max_workers=1)
+    pooled = ProjectionService(max_workers=args.workers, inline_work=0)
+    try:
+        # Worker starten und NumPy laden, bevor gemessen wird
+        pooled.project(closes, quantities, 5, args.workers * pooled.min_chunk_paths)
+        results = {
+            'im Prozess': measure(inline, closes, quantities, args),
+            f'Pool ({args.workers} Worker)': measure(pooled, closes, quantities, args)
+        }
+    finally:
+        pooled.shutdown()
+
+    print(f'{args.symbols} Symbole, {args.paths} Pfade, {args.horizon} Tage, Median aus {args.runs} Läufen '
+          f'({os.cpu_count()} CPUs)')
+    print(f"{'Variante':20s} {'Sekunden':>10s} {'Pfade/s':>12s} {'VaR 95%':>10s}")
+    for name, (seconds, result) in results.items():
+        print(f"{name:20s} {seconds:10.3f} {args.paths / seconds:12.0f} {result['var_percent']:9.2f}%")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: ORM-Laden gegen Core-Select in LotRow-Zeilen
+
+Legt in einer temporären SQLite-Datenbank ein Portfolio mit vielen Lots an und
+vergleicht portfolio_query().all() (PortfolioEntry-Instanzen mit Identity Map)
+mit user_lots() (Core-Select in __slots__-Zeilen): Ladezeit, Zeit für einen
+Durchlauf über alle gelesenen Attribute und Speicherspitze (tracemalloc).
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_read_model --lots 50000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+from benchmarks.synthetic import generate_portfolio
+
+def consume(entries):
+    """Liest die Attribute wie Statistiken und Charts es tun"""
+    total = 0.0
+    for entry in entries:
+        total += entry.total_value + (entry.current_value or 0) + entry.quantity
+        entry.symbol, entry.company_name, entry.purchase_date, entry.id
+    return total
+
+def measure(db, load, runs):
+    """Zeiten ohne tracemalloc (verfälscht die Laufzeit), Speicherspitze in einem eigenen Lauf"""
+    load_ms, consume_ms = [], []
+    for _ in range(runs):
+        db.session.remove()  # leere Identity Map wie bei einer neuen Anfrage
+        started = time.perf_counter()
+        entries = load()
+        loaded = time.perf_counter()
+        consume(entries)
+        load_ms.append((loaded - started) * 1000)
+        consume_ms.append((time.perf_counter() - loaded) * 1000)
+        del entries
+
+    db.session.remove()
+    tracemalloc.start()
+    consume(load())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'load_ms': statistics.median(load_ms),
+        'consume_ms': statistics.median(consume_ms),
+        'peak_mb': peak / 1024 / 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=50000)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    # Umgebung muss vor dem Import der App gesetzt sein
+    os.environ['DATABASE_URL'] = f'sqlite:///{database.name}'
+    from src.main import app
+    from src.models.portfolio import db, PortfolioEntry
+    from src.services.tenant_service import portfolio_query, user_lots
+
+    try:
+        with app.app_context():
+            rows = []
+            for entry in generate_portfolio(args.lots, args.symbols, 3650):
+                total_value = entry['purchase_price'] * entry['quantity']
+                rows.append({
+                    **entry,
+                    'purchase_date': date.fromisoformat(entry['purchase_date']),
+                    'total_value': total_value,
+                    'current_price': entry['purchase_price'] * 1.1,
+                    'current_value': total_value * 1.1
+                })
+            db.session.execute(db.insert(PortfolioEntry), rows)
+            db.session.commit()
+
+        with app.test_request_context():
+            results = {
+                'ORM (PortfolioEntry)': measure(db, lambda: portfolio_query().all(), args.runs),
+                'Core (LotRow)': measure(db, user_lots, args.runs)
+            }
+
+        print(f'{args.lots} Lots, Median aus {args.runs} Läufen')
+        print(f"{'Variante':22s} {'Laden ms':>10s} {'Lesen ms':>10s} {'Spitze MB':>10s}")
+        for name, result in results.items():
+            print(f"{name:22s} {result['load_ms']:10.1f} {result['consume_ms']:10.1f} {result['peak_mb']:10.1f}")
+        orm, core = results.values()
+        print(f"Faktor Laden: {orm['load_ms'] / core['load_ms']:.1f}x, Speicher: {orm['peak_mb'] / core['peak_mb']:.1f}x")
+    finally:
+        os.unlink(database.name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark: JSON-Serialisierung und Kompression großer Antworten
+
+Vergleicht Flasks Standard-Provider mit dem orjson-Provider aus
+response_service sowie die Antwortgröße unkomprimiert, mit gzip und Brotli.
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_serialization
+"""
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.services import response_service
+from src.services.response_service import NumpyJSONProvider, OrjsonProvider
+
+def portfolio_payload(entries=5000):
+    """Wie GET /api/portfolio (to_dict mit bereits formatierten Datumswerten)"""
+    today = date.today()
+    return {'success': True, 'total_entries': entries, 'data': [{
+        'id': i,
+        'symbol': f'SY{i % 300:03d}',
+        'company_name': f'Synthetic Corp {i % 300}',
+        'purchase_date': (today - timedelta(days=i % 3650)).isoformat(),
+        'purchase_price': 100.0 + i % 97,
+        'quantity': float(i % 50 + 1),
+        'total_value': (100.0 + i % 97) * (i % 50 + 1),
+        'created_at': datetime(2024, 1, 1, 12, 0).isoformat()
+    } for i in range(entries)]}
+
+def history_payload(days=3650):
+    """Wie get_historical_data für ein Symbol über 10 Jahre"""
+    start = date.today() - timedelta(days=days)
+    return {'success': True, 'data': [{
+        'date': (start + timedelta(days=i)).strftime('%Y-%m-%d'),
+        'open': 100.0 + i * 0.01, 'high': 101.0 + i * 0.01, 'low': 99.0 + i * 0.01,
+        'close': 100.5 + i * 0.01, 'volume': 1000000 + i
+    } for i in range(days)]}
+
+def chart_payload(points=2500):
+    """Chart-Reihe als Liste von Punkten (bisher mit float()-Konvertierung je Wert)"""
+    rng = np.random.default_rng(1)
+    values = 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, points)))
+    start = date.today() - timedelta(days=points)
+    return {'success': True, 'data': [{
+        'date': (start + timedelta(days=i)).strftime('%Y-%m-%d'),
+        'value': float(value), 'invested': 10000.0, 'profit_loss': float(value - 10000)
+    } for i, value in enumerate(values)]}
+
+def chart_numpy_payload(points=2500):
+    """Dieselbe Reihe als NumPy-Arrays, die der orjson-Provider direkt ausgibt"""
+    rng = np.random.default_rng(1)
+    values = 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, points)))
+    dates = np.arange(np.datetime64(date.today() - timedelta(days=points)), np.datetime64(date.today()))
+    return {'success': True, 'dates': dates.astype(str), 'value': values,
+            'invested': np.full(points, 10000.0), 'profit_loss': values - 10000}
+
+def time_dumps(provider, payload, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        body = provider.dumps(payload)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings)), body.encode()
+
+def main(repeats=20):
+    app = Flask(__name__)
+    providers = {'default': DefaultJSONProvider(app), 'numpy': NumpyJSONProvider(app)}
+    if response_service.orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+    else:
+        print('orjson nicht installiert: nur Standard-Provider')
+
+    payloads = {
+        'portfolio_5000': portfolio_payload(),
+        'history_10y': history_payload(),
+        'chart_2500': chart_payload(),
+        'chart_2500_numpy': chart_numpy_payload()
+    }
+
+    for name, payload in payloads.items():
+        print(f'\n{name}')
+        for provider_name, provider in providers.items():
+            if provider_name == 'default' and name.endswith('_numpy'):
+                continue  # der Standard-Provider kann keine NumPy-Arrays
+            median, body = time_dumps(provider, payload, repeats)
+            print(f'  {provider_name:8s} {median:8.2f} ms  {len(body) / 1024:8.1f} KiB')
+
+        started = time.perf_counter()
+        gzipped = response_service.compress(body, 'gzip', 5)
+        line = f'  gzip     {(time.perf_counter() - started) * 1000:8.2f} ms  {len(gzipped) / 1024:8.1f} KiB'
+        if response_service.brotli is not None:
+            started = time.perf_counter()
+            compressed = response_service.compress(body, 'br', 5)
+            line += (f'\n  br       {(time.perf_counter() - started) * 1000:8.2f} ms  '
+                     f'{len(compressed) / 1024:8.1f} KiB')
+        print(line)
+    return True
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
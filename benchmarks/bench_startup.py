@@ -0,0 +1,93 @@
+"""Benchmark: Kaltstart bis zur ersten beantworteten Anfrage
+
+Startet pro Lauf einen frischen Python-Prozess, importiert src.main und
+beantwortet eine Anfrage über den Testclient. Gemessen wird die Wanduhrzeit vom
+Prozessstart bis zur Antwort sowie das Startprofil der App (Phasen).
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TARGET_MS = 1000
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+from src.main import app
+imported = time.perf_counter()
+response = app.test_client().get({path!r})
+answered = time.perf_counter()
+from src.services.service_registry import startup_profile
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (answered - imported) * 1000,
+    'status': response.status_code,
+    'profile': startup_profile.report()
+}}))
+'''
+
+def run_once(path, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(path=path)], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    wall_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_ms'] = wall_ms
+    return result
+
+def import_profile(env, top):
+    """Die langsamsten Importe laut python -X importtime (kumuliert)"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import src.main'], env=env,
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nur Pakete der obersten Ebene, sonst zählt jeder Untermodul-Import doppelt
+        if name.startswith('  ') and not name.strip().startswith('src.'):
+            continue
+        rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/api/portfolio/stats', help='Erste Anfrage')
+    parser.add_argument('--importtime', type=int, default=0, help='Die N langsamsten Importe anzeigen')
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database.name}')
+    try:
+        run_once(args.path, env)  # legt die Tabellen an und wärmt den Dateisystem-Cache
+        results = [run_once(args.path, env) for _ in range(args.runs)]
+
+        for key in ('wall_ms', 'import_ms', 'first_request_ms'):
+            values = [result[key] for result in results]
+            print(f'{key:18s} Median {statistics.median(values):8.1f} ms  Min {min(values):8.1f} ms')
+        print('Phasen (letzter Lauf):')
+        for name, ms in results[-1]['profile']['phases'].items():
+            print(f'  {name:16s} {ms:8.1f} ms')
+
+        if args.importtime:
+            print('Langsamste Importe:')
+            for ms, name in import_profile(env, args.importtime):
+                print(f'  {ms:8.1f} ms  {name}')
+
+        median = statistics.median(result['wall_ms'] for result in results)
+        print(f'Kaltstart bis erste Antwort: {median:.1f} ms (Ziel < {TARGET_MS} ms)')
+        return median < TARGET_MS
+    finally:
+        os.unlink(database.name)
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
@@ -0,0 +1,100 @@
+"""Benchmark: Kursaktualisierung per Trade-Stream statt Quote-Polling
+
+Startet den Marktdaten-Ersatzserver und den Ersatz-Trade-Feed, legt ein
+Portfolio an und ruft im Sekundentakt POST /api/market/portfolio/update auf.
+Gemessen werden die Upstream-Quote-Anfragen je Phase (Stream verbunden,
+Feed ausgefallen mit Polling-Fallback, nach dem Reconnect), die Zeit bis zur
+Wiederverbindung sowie Ticks, Flushes und geschriebene Zeilen.
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_stream --symbols 50 --seconds 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_market_server import FakeMarketServer
+from benchmarks.fake_trade_feed import FakeTradeFeed
+from benchmarks.synthetic import generate_portfolio
+
+def wait_for(condition, timeout):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if condition():
+            return time.perf_counter() - started
+        time.sleep(0.05)
+    return None
+
+def run_phase(client, server, seconds):
+    """Aktualisiert die Portfolio-Kurse im Sekundentakt; gibt die Upstream-Anfragen zurück"""
+    before = server.state.request_count
+    ended = time.perf_counter() + seconds
+    while time.perf_counter() < ended:
+        client.post('/api/market/portfolio/update')
+        time.sleep(1)
+    return server.state.request_count - before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10, help='Dauer je Phase')
+    parser.add_argument('--rate', type=float, default=20, help='Feed-Nachrichten pro Sekunde')
+    parser.add_argument('--outage', type=float, default=5, help='Sekunden, in denen der Feed Verbindungen ablehnt')
+    args = parser.parse_args()
+
+    server = FakeMarketServer(latency=0.005).start()
+    feed = FakeTradeFeed(rate=args.rate).start()
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+
+    # Umgebung muss vor dem Import der App gesetzt sein
+    os.environ.update({
+        'FINNHUB_BASE_URL': server.finnhub_url,
+        'FINNHUB_WS_URL': feed.url,
+        'FINNHUB_RATE_LIMIT': '6000',
+        'PRICE_STREAM': '1',
+        'STREAM_FLUSH_SECONDS': '0.5',
+        'STREAM_POLL_SECONDS': '2',
+        'DATABASE_URL': f'sqlite:///{database.name}'
+    })
+    from src.main import app
+    from src.services.stream_service import trade_stream
+
+    try:
+        client = app.test_client()
+        for entry in generate_portfolio(args.symbols, args.symbols, 365):
+            client.post('/api/portfolio', json=entry)
+        subscribed = wait_for(lambda: trade_stream.connected and len(trade_stream.symbols) == args.symbols, 10)
+        print(f'Abonniert: {len(trade_stream.symbols)} Symbole nach {subscribed or float("nan"):.2f} s')
+        # Erste Ticks aller Symbole abwarten, sonst zählt der Start als Polling
+        wait_for(lambda: len(trade_stream.latest(trade_stream.symbols)) == args.symbols, 10)
+
+        streaming = run_phase(client, server, args.seconds)
+
+        feed.drop_connections(reject_seconds=args.outage)
+        wait_for(lambda: not trade_stream.connected, 5)
+        outage_started = time.perf_counter()
+        fallback = run_phase(client, server, min(args.seconds, args.outage))
+        reconnected = wait_for(lambda: trade_stream.connected, args.outage + trade_stream.max_backoff)
+        recovery = time.perf_counter() - outage_started
+
+        resumed = run_phase(client, server, args.seconds)
+        status = trade_stream.status()
+
+        print(f"{'Phase':28s} {'Upstream-Anfragen':>18s}")
+        print(f"{'Stream verbunden':28s} {streaming:18d}")
+        print(f"{'Feed ausgefallen (Polling)':28s} {fallback:18d}")
+        print(f"{'nach Reconnect':28s} {resumed:18d}")
+        print(f"Polling ohne Stream wäre: ~{args.symbols} Anfragen je Aktualisierung")
+        print(f"Wiederverbunden nach {recovery:.2f} s" if reconnected is not None else 'Keine Wiederverbindung')
+        print(f"Ticks: {status['ticks']}, Nachrichten: {status['messages']}, Flushes: {status['flushes']}, "
+              f"geschriebene Zeilen: {status['rows_written']}, Polls: {status['polls']}, "
+              f"Verbindungen: {status['connects']}")
+    finally:
+        trade_stream.stop()
+        feed.stop()
+        server.stop()
+        os.unlink(database.name)
+
+if __name__ == '__main__':
+    main()
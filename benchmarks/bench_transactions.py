@@ -0,0 +1,94 @@
+"""Benchmark: Ledger-Fortschreibung für Käufe, Verkäufe, Dividenden und Splits
+
+Erzeugt eine synthetische, nach Datum sortierte Buchungsfolge über mehrere
+Symbole (Verkäufe nie über den Bestand) und bucht sie für FIFO und
+Durchschnittskosten in einen leeren Ledger. Gemessen werden Buchungen pro
+Sekunde sowie die Dauer einer einzelnen neuen Buchung auf dem fertigen Ledger
+im Vergleich zum vollständigen Neuaufbau.
+
+Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_transactions --transactions 1000000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.synthetic import symbol_names
+
+def generate_events(count, symbols, seed=11):
+    """Ereignisse im Format von TransactionService._events"""
+    from src.services.transaction_service import EVENT_ORDER
+
+    rng = random.Random(seed)
+    names = symbol_names(symbols)
+    held = dict.fromkeys(names, 0.0)
+    prices = {symbol: rng.uniform(20, 500) for symbol in names}
+    day = date.today() - timedelta(days=count // 500 + 1)
+    events = []
+    for i in range(count):
+        if i % 500 == 0:
+            day += timedelta(days=1)
+        symbol = names[rng.randrange(len(names))]
+        prices[symbol] *= 1 + rng.gauss(0, 0.01)
+        price = prices[symbol]
+        roll = rng.random()
+        if roll < 0.0005:
+            kind, ratio = 'split', float(rng.choice((2, 3, 4)))
+            held[symbol] *= ratio
+            prices[symbol] /= ratio
+            events.append(((day, EVENT_ORDER[kind], i), kind, symbol, i, day, None, None, ratio, 0.0))
+        elif roll < 0.02 and held[symbol]:
+            kind = 'dividend'
+            events.append(((day, EVENT_ORDER[kind], i), kind, symbol, i, day, None, price * 0.005, None, 0.0))
+        elif roll < 0.45 and held[symbol]:
+            kind = 'sell'
+            quantity = held[symbol] * rng.uniform(0.05, 0.6)
+            held[symbol] -= quantity
+            events.append(((day, EVENT_ORDER[kind], i), kind, symbol, i, day, quantity, price, None, 1.0))
+        else:
+            kind = 'buy'
+            quantity = float(rng.randint(1, 100))
+            held[symbol] += quantity
+            events.append(((day, EVENT_ORDER[kind], i), kind, symbol, i, day, quantity, quantity * price))
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--symbols', type=int, default=50)
+    args = parser.parse_args()
+
+    from src.services.transaction_service import EVENT_ORDER, METHODS, Ledger
+
+    started = time.perf_counter()
+    events = generate_events(args.transactions, args.symbols)
+    counts = {}
+    for event in events:
+        counts[event[1]] = counts.get(event[1], 0) + 1
+    print(f"{len(events)} Buchungen auf {args.symbols} Symbolen erzeugt in {time.perf_counter() - started:.1f} s: "
+          + ', '.join(f'{kind} {count}' for kind, count in sorted(counts.items())))
+
+    for method in METHODS:
+        ledger = Ledger(method)
+        started = time.perf_counter()
+        ledger.apply(events)
+        replay_seconds = time.perf_counter() - started
+
+        # Eine weitere Buchung am letzten Tag: anhängen statt neu aufbauen
+        symbol, quantity = next(iter(ledger.open_quantities().items()))
+        day = events[-1][0][0]
+        extra = ((day, EVENT_ORDER['sell'], len(events)), 'sell', symbol, len(events), day, quantity / 2, 100.0,
+                 None, 1.0)
+        started = time.perf_counter()
+        ledger.apply([extra])
+        append_seconds = time.perf_counter() - started
+
+        summary = ledger.summary()
+        open_lots = sum(len(book.lots) for book in ledger.books.values())
+        print(f"{method:8s} {len(events) / replay_seconds:,.0f} Buchungen/s ({replay_seconds:.2f} s), "
+              f"neue Buchung {append_seconds * 1e6:.0f} µs statt {replay_seconds * 1000:.0f} ms Neuaufbau, "
+              f"offene Lots {open_lots}, realisiert {summary['realized_profit_loss']:,.0f}, "
+              f"Dividenden {summary['dividends']:,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Lokaler Ersatz für die Finnhub- und Alpha-Vantage-HTTP-APIs
+
+Liefert deterministische synthetische Kurse (Random Walk je Symbol) mit
+konfigurierbarer Latenz, Rate Limit und 429-Quote. Finnhub liegt unter
+/api/v1, Alpha Vantage unter /query, Wechselkurse (Frankfurter-Format) unter /fx.
+
+Standalone: python -m benchmarks.fake_market_server --port 8765 --latency 50
+"""
+import argparse
+import bisect
+import functools
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+@functools.lru_cache(maxsize=4096)
+def _full_walk(symbol, today):
+    """Deterministischer Tagesverlauf eines Symbols (gleiche Werte bei jedem Lauf)"""
+    rng = random.Random(zlib.crc32(symbol.encode()))
+    price = rng.uniform(20, 500)
+    day = datetime(2000, 1, 3)
+    end = datetime.combine(today, datetime.min.time())
+    timestamps, closes = [], []
+    while day <= end:
+        if day.weekday() < 5:
+            price *= 1 + rng.gauss(0.0003, 0.015)
+            timestamps.append(int(day.timestamp()))
+            closes.append(price)
+        day += timedelta(days=1)
+    return timestamps, closes
+
+def _price_walk(symbol, start_ts, end_ts):
+    timestamps, closes = _full_walk(symbol, date.today())
+    first = bisect.bisect_left(timestamps, start_ts)
+    last = bisect.bisect_right(timestamps, end_ts)
+    return list(zip(timestamps[first:last], closes[first:last]))
+
+class FakeMarketState:
+    def __init__(self, latency=0.05, jitter=0.2, rate_limit=None, error_rate=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit  # Anfragen pro Minute, None = unbegrenzt
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.request_count = 0
+        self.throttled_count = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Zählt die Anfrage; False bedeutet 429"""
+        now = time.monotonic()
+        with self._lock:
+            self.request_count += 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.throttled_count += 1
+                return False
+            if self.rate_limit:
+                self._window = [t for t in self._window if now - t < 60]
+                if len(self._window) >= self.rate_limit:
+                    self.throttled_count += 1
+                    return False
+                self._window.append(now)
+            delay = self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+class FakeMarketHandler(BaseHTTPRequestHandler):
+    state: FakeMarketState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if not self.state.admit():
+            return self._send(429, {'error': 'API limit reached'})
+
+        if url.path == '/api/v1/quote':
+            return self._send(200, self._quote(params['symbol']))
+        if url.path == '/api/v1/stock/candle':
+            return self._send(200, self._candles(params['symbol'], int(params['from']), int(params['to'])))
+        if url.path == '/api/v1/search':
+            query = params.get('q', '').upper()
+            return self._send(200, {'count': 1, 'result': [{
+                'description': f'{query} Synthetic Corp', 'displaySymbol': query, 'symbol': query, 'type': 'Common Stock'
+            }]})
+        if url.path == '/api/v1/stock/profile2':
+            symbol = params['symbol']
+            rng = random.Random(zlib.crc32(symbol.encode()))
+            return self._send(200, {
+                'ticker': symbol, 'name': f'{symbol} Synthetic Corp', 'currency': 'USD',
+                'country': rng.choice(['US', 'DE', 'GB', 'JP']),
+                'finnhubIndustry': rng.choice(['Technology', 'Financial Services', 'Health Care', 'Energy'])
+            })
+        if url.path.startswith('/fx/') and url.path.endswith('..'):
+            start = datetime.strptime(url.path[len('/fx/'):-2], '%Y-%m-%d')
+            return self._send(200, self._fx_rates(start, params.get('to', 'EUR').split(',')))
+        if url.path == '/query' and params.get('function') == 'GLOBAL_QUOTE':
+            price = self._quote(params['symbol'])['c']
+            return self._send(200, {'Global Quote': {'01. symbol': params['symbol'], '05. price': f'{price:.4f}'}})
+        return self._send(404, {'error': 'not found'})
+
+    def _quote(self, symbol):
+        now = time.time()
+        rows = _price_walk(symbol, now - 10 * 86400, now)
+        return {'c': rows[-1][1], 'pc': rows[-2][1], 't': rows[-1][0]}
+
+    def _candles(self, symbol, start_ts, end_ts):
+        rows = _price_walk(symbol, start_ts, end_ts)
+        if not rows:
+            return {'s': 'no_data'}
+        closes = [price for _, price in rows]
+        return {
+            's': 'ok',
+            't': [ts for ts, _ in rows],
+            'o': closes, 'h': [c * 1.01 for c in closes], 'l': [c * 0.99 for c in closes], 'c': closes,
+            'v': [1000000] * len(rows)
+        }
+
+    def _fx_rates(self, start, currencies):
+        """Tageskurse je USD, abgeleitet aus dem Random Walk eines Pseudo-Symbols je Währung"""
+        end = time.time()
+        series = {currency: _price_walk(f'FX{currency}', start.timestamp(), end) for currency in currencies}
+        rates = {}
+        for currency, rows in series.items():
+            first = rows[0][1] if rows else 1.0
+            for ts, price in rows:
+                day = datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+                rates.setdefault(day, {})[currency] = round(0.9 * price / first, 6)
+        return {'amount': 1.0, 'base': 'USD', 'start_date': start.strftime('%Y-%m-%d'), 'rates': rates}
+
+class FakeMarketServer:
+    """Startet den Ersatzserver in einem Hintergrund-Thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, **state_options):
+        self.state = FakeMarketState(**state_options)
+        handler = type('BoundFakeMarketHandler', (FakeMarketHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def finnhub_url(self):
+        return f'{self.base_url}/api/v1'
+
+    @property
+    def alpha_vantage_url(self):
+        return f'{self.base_url}/query'
+
+    @property
+    def fx_url(self):
+        return f'{self.base_url}/fx'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=50, help='Millisekunden pro Anfrage')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Anfragen pro Minute')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Anteil zufälliger 429-Antworten')
+    args = parser.parse_args()
+
+    server = FakeMarketServer(port=args.port, latency=args.latency / 1000,
+                              rate_limit=args.rate_limit, error_rate=args.error_rate)
+    print(f'FINNHUB_BASE_URL={server.finnhub_url}')
+    print(f'ALPHA_VANTAGE_BASE_URL={server.alpha_vantage_url}')
+    print(f'FX_BASE_URL={server.fx_url}')
+    server.httpd.serve_forever()
+
+if __name__ == '__main__':
+    main()
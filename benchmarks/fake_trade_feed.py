@@ -0,0 +1,227 @@
+"""Lokaler Ersatz für den Finnhub-Trade-Feed (WebSocket, nur Standardbibliothek)
+
+Versteht subscribe/unsubscribe-Nachrichten und sendet für alle abonnierten
+Symbole in festem Takt Trades im Finnhub-Format, ausgehend vom letzten
+Schlusskurs des Random Walks aus fake_market_server. Verbindungen lassen sich
+gezielt trennen bzw. ablehnen, um Reconnect und Polling-Fallback zu prüfen.
+
+Standalone: python -m benchmarks.fake_trade_feed --port 8766 --rate 20
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from datetime import date
+
+from benchmarks.fake_market_server import _full_walk
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def _read_exact(stream, count):
+    data = b''
+    while len(data) < count:
+        chunk = stream.read(count - len(data))
+        if not chunk:
+            raise ConnectionError('Verbindung geschlossen')
+        data += chunk
+    return data
+
+def read_frame(stream):
+    """(Opcode, Nutzdaten) eines (maskierten) Client-Frames"""
+    first, second = _read_exact(stream, 2)
+    opcode, length = first & 0x0F, second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', _read_exact(stream, 2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', _read_exact(stream, 8))[0]
+    mask = _read_exact(stream, 4) if second & 0x80 else None
+    payload = _read_exact(stream, length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return opcode, payload
+
+def encode_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 1 << 16:
+        header += bytes([126]) + struct.pack('!H', len(payload))
+    else:
+        header += bytes([127]) + struct.pack('!Q', len(payload))
+    return header + payload
+
+class FeedClient:
+    def __init__(self, connection):
+        self.connection = connection
+        self.symbols = set()
+        self.lock = threading.Lock()
+
+    def send(self, payload: bytes, opcode: int = 0x1):
+        with self.lock:
+            self.connection.sendall(encode_frame(payload, opcode))
+
+class FakeTradeFeedState:
+    def __init__(self, rate=10.0, trades_per_symbol=3, seed=1):
+        self.rate = rate  # Nachrichten pro Sekunde und Verbindung
+        self.trades_per_symbol = trades_per_symbol
+        self.rng = random.Random(seed)
+        self.clients = set()
+        self.connections = 0
+        self.subscribes = 0
+        self.unsubscribes = 0
+        self.messages_sent = 0
+        self.trades_sent = 0
+        self.reject_until = 0.0
+        self.prices = {}
+        self.lock = threading.Lock()
+
+    def price(self, symbol):
+        if symbol not in self.prices:
+            closes = _full_walk(symbol, date.today())[1]
+            self.prices[symbol] = closes[-1] if closes else random.Random(zlib.crc32(symbol.encode())).uniform(20, 500)
+        self.prices[symbol] *= 1 + self.rng.gauss(0, 0.0005)
+        return round(self.prices[symbol], 4)
+
+class FakeTradeFeedHandler(socketserver.StreamRequestHandler):
+    state: FakeTradeFeedState = None
+
+    def handle(self):
+        headers = {}
+        request_line = self.rfile.readline().decode('latin-1')
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if not request_line.startswith('GET') or 'sec-websocket-key' not in headers:
+            self.wfile.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            return
+        if time.monotonic() < self.state.reject_until:
+            self.wfile.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n')
+            return
+
+        accept = base64.b64encode(
+            hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        self.wfile.write((
+            'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+
+        client = FeedClient(self.connection)
+        with self.state.lock:
+            self.state.clients.add(client)
+            self.state.connections += 1
+        try:
+            while True:
+                opcode, payload = read_frame(self.rfile)
+                if opcode == 0x8:  # Close
+                    client.send(payload[:2], 0x8)
+                    break
+                if opcode == 0x9:  # Ping
+                    client.send(payload, 0xA)
+                    continue
+                if opcode != 0x1:
+                    continue
+                message = json.loads(payload)
+                with self.state.lock:
+                    if message.get('type') == 'subscribe':
+                        client.symbols.add(message['symbol'])
+                        self.state.subscribes += 1
+                    elif message.get('type') == 'unsubscribe':
+                        client.symbols.discard(message['symbol'])
+                        self.state.unsubscribes += 1
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.state.lock:
+                self.state.clients.discard(client)
+
+class FakeTradeFeed:
+    """Startet den Feed-Server und den Sendetakt in Hintergrund-Threads"""
+
+    def __init__(self, host='127.0.0.1', port=0, **state_options):
+        self.state = FakeTradeFeedState(**state_options)
+        handler = type('BoundFakeTradeFeedHandler', (FakeTradeFeedHandler,), {'state': self.state})
+        self.server = socketserver.ThreadingTCPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'ws://{host}:{port}'
+
+    def _broadcast(self):
+        while not self._stop.wait(1 / self.state.rate):
+            with self.state.lock:
+                clients = [(client, sorted(client.symbols)) for client in self.state.clients]
+                now_ms = int(time.time() * 1000)
+                batches = [
+                    (client, [
+                        {'s': symbol, 'p': self.state.price(symbol), 't': now_ms + i, 'v': self.state.rng.randint(1, 500)}
+                        for symbol in symbols for i in range(self.state.trades_per_symbol)
+                    ])
+                    for client, symbols in clients if symbols
+                ]
+            for client, trades in batches:
+                try:
+                    client.send(json.dumps({'type': 'trade', 'data': trades}).encode())
+                except OSError:
+                    continue
+                with self.state.lock:
+                    self.state.messages_sent += 1
+                    self.state.trades_sent += len(trades)
+
+    def drop_connections(self, reject_seconds: float = 0.0):
+        """Trennt alle Clients; neue Verbindungen werden reject_seconds lang abgelehnt"""
+        with self.state.lock:
+            self.state.reject_until = time.monotonic() + reject_seconds
+            clients = list(self.state.clients)
+        for client in clients:
+            try:
+                client.connection.shutdown(2)
+            except OSError:
+                pass
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self.server.serve_forever, daemon=True),
+            threading.Thread(target=self._broadcast, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.drop_connections()
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--rate', type=float, default=10, help='Nachrichten pro Sekunde und Verbindung')
+    parser.add_argument('--trades', type=int, default=3, help='Trades je Symbol und Nachricht')
+    args = parser.parse_args()
+
+    feed = FakeTradeFeed(port=args.port, rate=args.rate, trades_per_symbol=args.trades).start()
+    print(f'FINNHUB_WS_URL={feed.url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        feed.stop()
+
+if __name__ == '__main__':
+    main()
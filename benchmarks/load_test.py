@@ -0,0 +1,147 @@
+"""Lasttest für ASYNC_MODE=0 gegenüber ASYNC_MODE=1 gegen den Marktdaten-Ersatzserver
+
+Startet die App pro Modus in einem eigenen Prozess (uvicorn mit src.asgi, falls
+installiert, sonst der Werkzeug-Server mit Threads), legt ein Portfolio an und
+feuert parallele Anfragen auf Endpunkte mit vielen Upstream-Aufrufen.
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.load_test --latency 200 --requests 100 --concurrency 32
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_market_server import FakeMarketServer
+from benchmarks.run_benchmarks import percentile
+from benchmarks.synthetic import generate_portfolio, symbol_names
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_command(port, server):
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'src.asgi:asgi_app',
+                '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+    script = ('from werkzeug.serving import make_server\n'
+              'from src.main import app\n'
+              f'make_server("127.0.0.1", {port}, app, threaded=True).serve_forever()\n')
+    return [sys.executable, '-c', script]
+
+def http(method, url, payload=None, timeout=60):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+def wait_until_ready(base_url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('App-Prozess wurde beendet')
+        if http('GET', f'{base_url}/api/portfolio', timeout=2) == 200:
+            return
+        time.sleep(0.2)
+    raise RuntimeError('App antwortet nicht')
+
+def run_load(base_url, method, paths, concurrency):
+    """Ruft jeden Pfad einmal auf; liefert Latenzen (ms), Fehler und Durchsatz"""
+    def call(path):
+        started = time.perf_counter()
+        status = http(method, base_url + path)
+        return (time.perf_counter() - started) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, paths))
+    wall = time.perf_counter() - started
+
+    latencies = [elapsed for elapsed, _ in results]
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, status in results if not 200 <= status < 300),
+        'mean_ms': round(statistics.mean(latencies), 1),
+        'p50_ms': round(percentile(latencies, 0.50), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'throughput_rps': round(len(results) / wall, 2)
+    }
+
+def run_mode(async_mode, args, market):
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ,
+               ASYNC_MODE='1' if async_mode else '0',
+               FINNHUB_BASE_URL=market.finnhub_url,
+               ALPHA_VANTAGE_BASE_URL=market.alpha_vantage_url,
+               FX_BASE_URL=market.fx_url,
+               FINNHUB_RATE_LIMIT=str(args.app_rate_limit),
+               DATABASE_URL=f'sqlite:///{database.name}')
+    process = subprocess.Popen(server_command(port, args.server), env=env)
+    try:
+        wait_until_ready(base_url, process)
+        for entry in generate_portfolio(args.entries, args.symbols, 30):
+            http('POST', f'{base_url}/api/portfolio', entry)
+
+        # Eindeutige Symbole, damit kein Cache die Upstream-Latenz verdeckt
+        prefix = 'A' if async_mode else 'S'
+        quotes = [f'/api/market/quote/{prefix}{name}' for name in symbol_names(args.requests)]
+        updates = ['/api/market/portfolio/update'] * max(1, args.requests // 10)
+        return {
+            'quote': run_load(base_url, 'GET', quotes, args.concurrency),
+            'portfolio_update': run_load(base_url, 'POST', updates, args.concurrency)
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        os.unlink(database.name)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=200, help='Upstream-Latenz in Millisekunden')
+    parser.add_argument('--requests', type=int, default=100, help='Quote-Anfragen pro Modus')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--entries', type=int, default=60)
+    parser.add_argument('--symbols', type=int, default=30)
+    parser.add_argument('--app-rate-limit', type=int, default=6000, help='Rate Limit der App pro Minute')
+    parser.add_argument('--server', choices=('uvicorn', 'werkzeug'), default=None)
+    args = parser.parse_args()
+
+    if args.server is None:
+        try:
+            import uvicorn  # noqa: F401
+            args.server = 'uvicorn'
+        except ImportError:
+            args.server = 'werkzeug'
+
+    market = FakeMarketServer(latency=args.latency / 1000).start()
+    try:
+        print(f'Server: {args.server}, Upstream-Latenz {args.latency:.0f} ms')
+        for async_mode in (False, True):
+            results = run_mode(async_mode, args, market)
+            for name, stats in results.items():
+                print(f"ASYNC_MODE={int(async_mode)} {name:18s} p50 {stats['p50_ms']:8.1f} ms  "
+                      f"p95 {stats['p95_ms']:8.1f} ms  {stats['throughput_rps']:7.2f} req/s  "
+                      f"errors {stats['errors']}")
+    finally:
+        market.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
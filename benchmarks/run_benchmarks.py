@@ -0,0 +1,197 @@
+"""Reproduzierbare Last- und Latenzmessung gegen den lokalen Marktdaten-Ersatzserver
+
+Startet FakeMarketServer, zeigt die App per Umgebungsvariablen darauf, legt ein
+synthetisches Portfolio in einer temporären SQLite-Datenbank an und misst die
+Endpunkte über den Flask-Testclient. Ergebnisse werden als JSON geschrieben und
+können mit --compare gegen einen früheren Lauf (z.B. eines anderen Commits)
+verglichen werden.
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.run_benchmarks --entries 200 --symbols 30 --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.fake_market_server import FakeMarketServer
+from benchmarks.synthetic import generate_portfolio, generate_receipt_images
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def scenarios(args):
+    """(Name, Methode, Pfad) aller gemessenen Endpunkte; Upload separat"""
+    benchmarks = 'SPY,QQQ,VTI,VEA'
+    return [
+        ('market_portfolio_update', 'POST', '/api/market/portfolio/update'),
+        ('portfolio_stats', 'GET', '/api/portfolio/stats'),
+        ('charts_allocation', 'GET', '/api/charts/portfolio/allocation'),
+        ('charts_allocation_sector', 'GET', '/api/charts/portfolio/allocation/sector'),
+        ('charts_performance', 'GET', '/api/charts/portfolio/performance'),
+        ('charts_vs_etf', 'GET', f'/api/charts/portfolio/vs-etf/SPY?days={args.history_days}'),
+        ('charts_vs_etfs', 'GET', f'/api/charts/portfolio/vs-etfs?symbols={benchmarks}&days={args.history_days}'),
+        ('charts_profit_loss', 'GET', '/api/charts/portfolio/profit-loss'),
+        ('charts_trending', 'GET', '/api/charts/market/trending'),
+    ]
+
+def measure(app, name, method, path, args, body_factory=None):
+    """Führt einen Kaltstart-Aufruf und danach args.requests Aufrufe mit args.concurrency Threads aus"""
+    def call(index):
+        client = app.test_client()
+        kwargs = body_factory(index) if body_factory else {}
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response.status_code, len(response.get_data())
+
+    cold_ms, cold_status, _ = call(0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(call, range(1, args.requests + 1)))
+    wall = time.perf_counter() - started
+
+    latencies = [elapsed for elapsed, _, _ in results]
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    stats = {
+        'path': path,
+        'requests': len(results),
+        'errors': sum(count for status, count in statuses.items() if not status.startswith('2')),
+        'status_codes': statuses,
+        'cold_ms': round(cold_ms, 2),
+        'cold_status': cold_status,
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(max(latencies), 2),
+        'throughput_rps': round(len(results) / wall, 2) if wall > 0 else None,
+        'response_bytes': results[-1][2] if results else 0
+    }
+    print(f"{name:28s} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  "
+          f"cold {stats['cold_ms']:9.1f} ms  {stats['throughput_rps']} req/s  errors {stats['errors']}")
+    return stats
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+def compare(results, baseline_path, max_regression):
+    """Vergleicht p50/p95 mit einem früheren Lauf; True wenn keine Regression über dem Schwellwert"""
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)['results']
+
+    ok = True
+    print(f"\nVergleich mit {baseline_path}:")
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            before, after = baseline[name][key], stats[key]
+            change = (after - before) / before if before else 0.0
+            marker = ''
+            if change > max_regression:
+                marker = '  <-- Regression'
+                ok = False
+            print(f"  {name:28s} {key}: {before:9.1f} -> {after:9.1f} ms ({change:+.0%}){marker}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100, help='Anzahl Portfolio-Einträge')
+    parser.add_argument('--symbols', type=int, default=20, help='Anzahl unterschiedlicher Symbole')
+    parser.add_argument('--history-days', type=int, default=180, help='Länge der Kurshistorie in Tagen')
+    parser.add_argument('--requests', type=int, default=20, help='Aufrufe pro Endpunkt (nach dem Kaltstart)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=50, help='Upstream-Latenz in Millisekunden')
+    parser.add_argument('--upstream-rate-limit', type=int, default=None, help='Upstream-Limit pro Minute (429 darüber)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Anteil zufälliger 429-Antworten')
+    parser.add_argument('--app-rate-limit', type=int, default=60, help='Rate Limit der App pro Minute')
+    parser.add_argument('--ocr-documents', type=int, default=0, help='Anzahl OCR-Uploads (benötigt Tesseract)')
+    parser.add_argument('--output', default=None, help='Ergebnisdatei (JSON)')
+    parser.add_argument('--compare', default=None, help='Früheres Ergebnis zum Vergleich')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Erlaubte Verschlechterung (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    server = FakeMarketServer(latency=args.latency / 1000, rate_limit=args.upstream_rate_limit,
+                              error_rate=args.error_rate).start()
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+
+    # Umgebung muss vor dem Import der App gesetzt sein
+    os.environ.update({
+        'FINNHUB_BASE_URL': server.finnhub_url,
+        'ALPHA_VANTAGE_BASE_URL': server.alpha_vantage_url,
+        'FX_BASE_URL': server.fx_url,
+        'FINNHUB_RATE_LIMIT': str(args.app_rate_limit),
+        'DATABASE_URL': f'sqlite:///{database.name}'
+    })
+    from src.main import app
+
+    try:
+        portfolio = generate_portfolio(args.entries, args.symbols, args.history_days)
+        client = app.test_client()
+        for entry in portfolio:
+            client.post('/api/portfolio', json=entry)
+
+        results = {}
+        for name, method, path in scenarios(args):
+            results[name] = measure(app, name, method, path, args)
+
+        if args.ocr_documents:
+            images = generate_receipt_images(portfolio[:args.ocr_documents])
+
+            def upload_body(index):
+                filename, data = images[index % len(images)]
+                return {'data': {'file': (io.BytesIO(data), filename)}, 'content_type': 'multipart/form-data'}
+
+            upload_args = argparse.Namespace(**{**vars(args), 'requests': max(1, args.ocr_documents - 1)})
+            results['portfolio_upload'] = measure(
+                app, 'portfolio_upload', 'POST', '/api/portfolio/upload', upload_args, upload_body)
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'upstream_requests': server.state.request_count,
+                'upstream_throttled': server.state.throttled_count,
+                'parameters': vars(args)
+            },
+            'results': results
+        }
+
+        if args.output:
+            with open(args.output, 'w') as handle:
+                json.dump(report, handle, indent=2)
+            print(f"\nErgebnisse geschrieben: {args.output}")
+
+        if args.compare and not compare(results, args.compare, args.max_regression):
+            return 1
+        return 0
+
+    finally:
+        server.stop()
+        os.unlink(database.name)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Synthetische Portfolios und OCR-Belege für die Benchmarks"""
+import io
+import random
+from datetime import date, timedelta
+
+def symbol_names(count):
+    """Stabile, eindeutige Ticker (SYA, SYB, ...) für reproduzierbare Läufe"""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    names = []
+    for i in range(count):
+        suffix = letters[i % 26] + (letters[i // 26 % 26] if i >= 26 else '')
+        names.append(f'SY{suffix}')
+    return names
+
+def generate_portfolio(entries, symbols, history_days, seed=42):
+    """Portfolio-Einträge im Format von POST /api/portfolio"""
+    rng = random.Random(seed)
+    names = symbol_names(symbols)
+    today = date.today()
+    rows = []
+    for i in range(entries):
+        symbol = names[i % len(names)]
+        purchase_date = today - timedelta(days=rng.randint(1, history_days))
+        rows.append({
+            'symbol': symbol,
+            'company_name': f'{symbol} Synthetic Corp',
+            'purchase_date': purchase_date.isoformat(),
+            'purchase_price': round(rng.uniform(20, 500), 2),
+            'quantity': float(rng.randint(1, 100))
+        })
+    return rows
+
+def receipt_text(entry):
+    """Text eines deutschen Wertpapier-Kaufbelegs"""
+    purchase_date = date.fromisoformat(entry['purchase_date'])
+    return '\n'.join([
+        'Wertpapierabrechnung Kauf',
+        f"Unternehmen: {entry['company_name']}",
+        f"Symbol: {entry['symbol']}",
+        f"Datum: {purchase_date.strftime('%d.%m.%Y')}",
+        f"Anzahl: {int(entry['quantity'])} Stück",
+        f"Kurs: {entry['purchase_price']:.2f} EUR",
+        f"Gesamt: {entry['purchase_price'] * entry['quantity']:.2f} EUR",
+    ])
+
+def generate_receipt_images(entries):
+    """PNG-Belege als Bytes (benötigt Pillow)"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:  # Pillow < 10.1 kennt nur die kleine Bitmap-Schrift
+        font = ImageFont.load_default()
+
+    images = []
+    for entry in entries:
+        image = Image.new('RGB', (900, 400), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.multiline_text((30, 30), receipt_text(entry), fill='black', font=font, spacing=12)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        images.append((f"beleg_{entry['symbol']}.png", buffer.getvalue()))
+    return images
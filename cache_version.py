@@ -0,0 +1,37 @@
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+
+class CacheVersion(db.Model):
+    """Prozessübergreifender Versionszähler je Cache-Bereich (z.B. 'user:3', 'alerts')
+
+    Jeder Worker hält seine Caches im Speicher; ändert ein Prozess die
+    Daten, erhöht er den Zähler, und alle anderen verwerfen ihre Einträge,
+    sobald sie eine höhere Version lesen.
+    """
+    __tablename__ = 'cache_version'
+
+    scope = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.scope} {self.version}>'
+
+    @staticmethod
+    def current(scope):
+        return db.session.execute(
+            select(CacheVersion.version).where(CacheVersion.scope == scope)
+        ).scalar() or 0
+
+    @staticmethod
+    def bump(scope):
+        """Erhöht den Zähler in eigener Transaktion, damit andere Worker ihn sofort sehen"""
+        increment = update(CacheVersion).where(CacheVersion.scope == scope).values(version=CacheVersion.version + 1)
+        try:
+            with db.engine.begin() as connection:
+                if not connection.execute(increment).rowcount:
+                    connection.execute(CacheVersion.__table__.insert().values(scope=scope, version=1))
+        except IntegrityError:
+            # Ein anderer Prozess hat die Zeile gleichzeitig angelegt
+            with db.engine.begin() as connection:
+                connection.execute(increment)
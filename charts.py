@@ -1,17 +1,42 @@
-from flask import Blueprint, jsonify, request
-from src.models.portfolio import PortfolioEntry
-from src.services.market_data_service import MarketDataService
+from flask import Blueprint, jsonify, request, current_app
+from src.services.service_registry import services
+from src.services.snapshot_service import snapshot_service
+from src.services.tenant_service import current_user_id, user_cached, user_lots
+from src.services.profile_service import profile_cache
+from src.services.fx_service import converter_for
+from src.services.transaction_service import cost_basis_method, ledger_for, transaction_service
+from src.services.series_service import RESOLUTIONS, build_portfolio_series, downsample_indices, history_to_arrays, trading_calendar
+from src.services.async_market_data_service import async_view
 from datetime import datetime, timedelta
+import numpy as np
 import json
 
 charts_bp = Blueprint('charts', __name__)
-market_service = MarketDataService()
+# Wird erst beim ersten Chart-Abruf erzeugt und mit analytics geteilt
+history_prefetcher = services.lazy('history_prefetcher')
+
+def _price_arrays(prefetch, symbols):
+    """Kursreihen der angegebenen Symbole als (Datum, Schlusskurs)-Arrays"""
+    return {
+        symbol: history_to_arrays(data) for symbol, data in prefetch.data.items() if symbol in symbols and data
+    }
+
+def _chart_options():
+    """Auflösung und Punktlimit der Zeitreihen-Charts (?resolution=, ?max_points=); ValueError bei ungültigen Angaben"""
+    resolution = request.args.get('resolution', 'daily')
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Ungültige Auflösung. Erlaubt: {", ".join(RESOLUTIONS)}')
+    max_points = request.args.get('max_points', type=int)
+    if max_points is not None and max_points < 3:
+        raise ValueError('max_points muss mindestens 3 sein')
+    return resolution, max_points
 
 @charts_bp.route('/charts/portfolio/allocation', methods=['GET'])
+@user_cached
 def get_portfolio_allocation():
     """Gibt die Portfolio-Allokation für Pie-Chart zurück"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_lots()
         
         if not entries:
             return jsonify({
@@ -19,19 +44,23 @@ def get_portfolio_allocation():
                 'error': 'Keine Portfolio-Einträge vorhanden'
             }), 404
         
-        # Berechne Allokation basierend auf aktuellem Wert oder Investitionswert
+        # Berechne Allokation basierend auf aktuellem Wert oder Investitionswert (in Berichtswährung),
+        # nur der nach Verkäufen noch offene Teil jedes Lots
+        converter = converter_for(entries)
+        cost_fractions, quantity_factors = ledger_for(entries, converter).lot_factors(entries)
+        current = converter.current() * quantity_factors
+        values = np.where(np.isnan(current), converter.invested() * cost_fractions, current)
         allocation_data = []
-        total_value = 0
+        total_value = float(values.sum())
         
-        for entry in entries:
-            value = entry.current_value if entry.current_value else entry.total_value
-            total_value += value
-            
+        for entry, value, factor in zip(entries, values.tolist(), quantity_factors.tolist()):
+            if factor <= 0:
+                continue
             allocation_data.append({
                 'symbol': entry.symbol,
                 'company_name': entry.company_name,
                 'value': value,
-                'quantity': entry.quantity
+                'quantity': entry.quantity * factor
             })
         
         # Berechne Prozentanteile
@@ -44,7 +73,71 @@ def get_portfolio_allocation():
         return jsonify({
             'success': True,
             'data': allocation_data,
-            'total_value': total_value
+            'total_value': total_value,
+            'currency': converter.target
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Profilfelder für gruppierte Allokationen
+ALLOCATION_GROUPS = {
+    'sector': 'finnhubIndustry',
+    'country': 'country'
+}
+
+@charts_bp.route('/charts/portfolio/allocation/<group>', methods=['GET'])
+@user_cached
+def get_grouped_allocation(group):
+    """Gibt die Allokation nach Sektor oder Land zurück (nur gecachte Profile, kein Upstream-Abruf)"""
+    try:
+        if group not in ALLOCATION_GROUPS:
+            return jsonify({
+                'success': False,
+                'error': f'Unbekannte Gruppierung. Erlaubt: {", ".join(ALLOCATION_GROUPS)}'
+            }), 400
+        
+        entries = user_lots()
+        
+        if not entries:
+            return jsonify({
+                'success': False,
+                'error': 'Keine Portfolio-Einträge vorhanden'
+            }), 404
+        
+        field = ALLOCATION_GROUPS[group]
+        profiles = profile_cache.get_cached(set(entry.symbol for entry in entries))
+        
+        converter = converter_for(entries)
+        cost_fractions, quantity_factors = ledger_for(entries, converter).lot_factors(entries)
+        current = converter.current() * quantity_factors
+        values = np.where(np.isnan(current), converter.invested() * cost_fractions, current)
+        
+        groups = {}
+        total_value = float(values.sum())
+        for entry, value, factor in zip(entries, values.tolist(), quantity_factors.tolist()):
+            if factor <= 0:
+                continue
+            name = (profiles.get(entry.symbol) or {}).get(field) or 'Unbekannt'
+            item = groups.setdefault(name, {group: name, 'value': 0, 'symbols': []})
+            item['value'] += value
+            if entry.symbol not in item['symbols']:
+                item['symbols'].append(entry.symbol)
+        
+        allocation_data = sorted(groups.values(), key=lambda x: x['value'], reverse=True)
+        for item in allocation_data:
+            item['percentage'] = (item['value'] / total_value * 100) if total_value > 0 else 0
+        
+        return jsonify({
+            'success': True,
+            'data': allocation_data,
+            'total_value': total_value,
+            'currency': converter.target,
+            # Profile dieser Symbole können über /api/market/profiles geladen werden
+            'missing_profiles': sorted(set(entry.symbol for entry in entries) - set(profiles))
         })
         
     except Exception as e:
@@ -54,10 +147,12 @@ def get_portfolio_allocation():
         }), 500
 
 @charts_bp.route('/charts/portfolio/performance', methods=['GET'])
-def get_portfolio_performance():
+@user_cached
+@async_view
+async def get_portfolio_performance():
     """Gibt Portfolio-Performance über Zeit zurück"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_lots()
         
         if not entries:
             return jsonify({
@@ -66,59 +161,69 @@ def get_portfolio_performance():
             }), 404
         
         # Sammle alle Symbole und deren historische Daten
-        symbols = list(set(entry.symbol for entry in entries))
-        performance_data = []
+        symbols = set(entry.symbol for entry in entries)
+        try:
+            resolution, max_points = _chart_options()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        # Bestimme Zeitraum (letzten 6 Monate oder seit ältestem Kauf)
+        # Zeitraum: letzte `days` Tage (Standard 180), days=0 seit dem ältesten Kauf
+        days = request.args.get('days', 180, type=int)
         oldest_date = min(entry.purchase_date for entry in entries)
-        start_date = max(oldest_date, (datetime.now() - timedelta(days=180)).date())
-        
-        # Hole historische Daten für alle Symbole
-        historical_data = {}
-        for symbol in symbols:
-            hist_data = market_service.get_historical_data(symbol, 180)
-            if hist_data:
-                historical_data[symbol] = {item['date']: item['close'] for item in hist_data}
-        
-        # Berechne Portfolio-Wert für jeden Tag
-        current_date = start_date
         end_date = datetime.now().date()
+        start_date = oldest_date if days <= 0 else max(oldest_date, end_date - timedelta(days=days))
+        
+        # Abgeschlossene Tage kommen aus den gespeicherten Tagesständen; Kurse werden
+        # nur für noch fehlende Tage und den laufenden Tag geladen
+        user_id = current_user_id()
+        converter = converter_for(entries)
+        backlog = snapshot_service.backlog(user_id, converter.target, entries)
+        fetch_start = backlog[0] if backlog else end_date
+        prefetch = await history_prefetcher.prefetch_async(
+            (symbol, snapshot_service.history_days(fetch_start)) for symbol in symbols
+        )
+        price_arrays = converter.price_arrays(_price_arrays(prefetch, symbols))
+        # Tagesstände werden mit dem konfigurierten Verfahren gespeichert, ?method= gilt hier nicht
+        ledger = transaction_service.ledger(user_id, entries, converter, cost_basis_method(from_request=False))
+        lots = ledger.series_lots(converter.lots())
+        if backlog:
+            snapshot_service.store(user_id, converter.target, lots, price_arrays, *backlog)
+        
+        # Portfolio-Wert je Handelstag als Bereichsabfrage plus laufender Tag
+        series = snapshot_service.series(user_id, converter.target, lots, price_arrays, start_date, end_date)
+        performance_data = []
         
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            daily_value = 0
-            daily_invested = 0
-            
-            for entry in entries:
-                # Nur Einträge berücksichtigen, die bereits gekauft wurden
-                if entry.purchase_date <= current_date:
-                    daily_invested += entry.total_value
-                    
-                    # Aktueller Wert basierend auf historischem Kurs
-                    if entry.symbol in historical_data and date_str in historical_data[entry.symbol]:
-                        current_price = historical_data[entry.symbol][date_str]
-                        daily_value += entry.quantity * current_price
-                    else:
-                        # Fallback: Verwende Kaufpreis wenn kein historischer Kurs verfügbar
-                        daily_value += entry.total_value
-            
-            if daily_invested > 0:  # Nur Tage mit Investitionen
-                performance_data.append({
-                    'date': date_str,
-                    'portfolio_value': daily_value,
-                    'invested_value': daily_invested,
-                    'profit_loss': daily_value - daily_invested,
-                    'profit_loss_percent': ((daily_value - daily_invested) / daily_invested * 100) if daily_invested > 0 else 0
-                })
-            
-            current_date += timedelta(days=1)
-        
-        return jsonify({
+        if series is not None:
+            series = series.resample(resolution)
+            if max_points:
+                series = series.take(downsample_indices(series.dates, [series.values, series.invested], max_points))
+            rows = zip(series.date_strings(), series.values.tolist(), series.invested.tolist())
+            for date_str, daily_value, daily_invested in rows:
+                if daily_invested > 0:  # Nur Tage mit Investitionen
+                    performance_data.append({
+                        'date': date_str,
+                        'portfolio_value': daily_value,
+                        'invested_value': daily_invested,
+                        'profit_loss': daily_value - daily_invested,
+                        'profit_loss_percent': (daily_value - daily_invested) / daily_invested * 100
+                    })
+        
+        response = {
             'success': True,
             'data': performance_data,
             'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat()
-        })
+            'end_date': end_date.isoformat(),
+            'currency': converter.target,
+            'resolution': resolution,
+            'max_points': max_points
+        }
+        if current_app.debug:
+            response['meta'] = {'prefetch': prefetch.meta()}
+        
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({
@@ -127,10 +232,12 @@ def get_portfolio_performance():
         }), 500
 
 @charts_bp.route('/charts/portfolio/vs-etf/<etf_symbol>', methods=['GET'])
-def get_portfolio_vs_etf_chart(etf_symbol):
+@user_cached
+@async_view
+async def get_portfolio_vs_etf_chart(etf_symbol):
     """Vergleicht Portfolio-Performance mit ETF über Zeit"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_lots()
         
         if not entries:
             return jsonify({
@@ -140,63 +247,194 @@ def get_portfolio_vs_etf_chart(etf_symbol):
         
         etf_symbol = etf_symbol.upper()
         days = int(request.args.get('days', 180))
+        try:
+            resolution, max_points = _chart_options()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Hole ETF- und Portfolio-Kursreihen gemeinsam (parallel)
+        portfolio_symbols = set(entry.symbol for entry in entries)
+        prefetch = await history_prefetcher.prefetch_async(
+            [(etf_symbol, days)] + [(symbol, days) for symbol in portfolio_symbols]
+        )
         
-        # Hole ETF historische Daten
-        etf_historical = market_service.get_historical_data(etf_symbol, days)
+        etf_historical = prefetch.data.get(etf_symbol)
         if not etf_historical:
             return jsonify({
                 'success': False,
                 'error': f'Keine historischen Daten für {etf_symbol} verfügbar'
             }), 404
         
-        # Portfolio historische Performance (vereinfacht)
-        portfolio_symbols = list(set(entry.symbol for entry in entries))
-        portfolio_historical = {}
-        
-        for symbol in portfolio_symbols:
-            hist_data = market_service.get_historical_data(symbol, days)
-            if hist_data:
-                portfolio_historical[symbol] = {item['date']: item['close'] for item in hist_data}
+        # Gemeinsamer Handelstag-Index aus Portfolio- und ETF-Kursen, alles in Berichtswährung
+        converter = converter_for(entries, [etf_symbol])
+        price_arrays = converter.price_arrays(_price_arrays(prefetch, portfolio_symbols))
+        etf_arrays = converter.price_arrays({etf_symbol: history_to_arrays(etf_historical)})[etf_symbol]
+        start_date = (datetime.now() - timedelta(days=days)).date()
+        calendar = trading_calendar(list(price_arrays.values()) + [etf_arrays], start_date=start_date)
+        ledger = ledger_for(entries, converter)
+        series = build_portfolio_series(ledger.series_lots(converter.lots()), price_arrays, dates=calendar)
+        if series is None:
+            return jsonify({
+                'success': False,
+                'error': 'Keine historischen Daten für das Portfolio verfügbar'
+            }), 404
+        series = series.resample(resolution)
+        etf_closes = series.align(etf_arrays)
+        if max_points:
+            indices = downsample_indices(series.dates, [series.values, etf_closes], max_points)
+            series, etf_closes = series.take(indices), etf_closes[indices]
         
         # Berechne vergleichende Performance
         comparison_data = []
-        total_invested = sum(entry.total_value for entry in entries)
+        total_invested = float((converter.invested() * ledger.lot_factors(entries)[0]).sum())
         
-        # ETF Startpreis für Normalisierung
-        etf_start_price = etf_historical[0]['close']
+        # ETF normalisiert auf 100 ab dem ersten Kurs im Zeitraum
+        known = etf_closes[~np.isnan(etf_closes)]
+        etf_start_price = known[0] if len(known) else np.nan
         
-        for etf_data in etf_historical:
-            date_str = etf_data['date']
-            
-            # ETF Performance (normalisiert auf 100)
-            etf_performance = (etf_data['close'] / etf_start_price) * 100
-            
-            # Portfolio Performance für dieses Datum
-            portfolio_value = 0
-            for entry in entries:
-                if entry.symbol in portfolio_historical and date_str in portfolio_historical[entry.symbol]:
-                    current_price = portfolio_historical[entry.symbol][date_str]
-                    portfolio_value += entry.quantity * current_price
-                else:
-                    # Fallback
-                    portfolio_value += entry.total_value
-            
-            portfolio_performance = (portfolio_value / total_invested) * 100 if total_invested > 0 else 100
+        for i, date_str in enumerate(series.date_strings()):
+            portfolio_value = float(series.values[i])
+            invested = float(series.invested[i])
+            etf_ratio = etf_closes[i] / etf_start_price
             
             comparison_data.append({
                 'date': date_str,
-                'portfolio_performance': portfolio_performance,
-                'etf_performance': etf_performance,
+                'portfolio_performance': (portfolio_value / invested) * 100 if invested > 0 else 100,
+                'etf_performance': None if np.isnan(etf_ratio) else float(etf_ratio * 100),
                 'portfolio_value': portfolio_value,
-                'etf_value': (etf_data['close'] / etf_start_price) * total_invested
+                'etf_value': None if np.isnan(etf_ratio) else float(etf_ratio * invested)
             })
         
-        return jsonify({
+        response = {
             'success': True,
             'data': comparison_data,
             'etf_symbol': etf_symbol,
-            'total_invested': total_invested
-        })
+            'total_invested': total_invested,
+            'currency': converter.target,
+            'resolution': resolution,
+            'max_points': max_points
+        }
+        if current_app.debug:
+            response['meta'] = {'prefetch': prefetch.meta()}
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Obergrenze für Benchmarks pro Anfrage (jede kostet einen Upstream-Abruf)
+MAX_BENCHMARKS = 10
+
+@charts_bp.route('/charts/portfolio/vs-etfs', methods=['GET'])
+@user_cached
+@async_view
+async def get_portfolio_vs_etfs_chart():
+    """Vergleicht Portfolio-Performance mit mehreren ETFs in einer Anfrage"""
+    try:
+        entries = user_lots()
+        
+        if not entries:
+            return jsonify({
+                'success': False,
+                'error': 'Keine Portfolio-Einträge vorhanden'
+            }), 404
+        
+        benchmarks = []
+        for symbol in request.args.get('symbols', 'SPY').split(','):
+            symbol = symbol.strip().upper()
+            if symbol and symbol not in benchmarks:
+                benchmarks.append(symbol)
+        
+        if not benchmarks or len(benchmarks) > MAX_BENCHMARKS:
+            return jsonify({
+                'success': False,
+                'error': f'Zwischen 1 und {MAX_BENCHMARKS} ETF-Symbole erforderlich'
+            }), 400
+        
+        days = int(request.args.get('days', 180))
+        try:
+            resolution, max_points = _chart_options()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Portfolio- und alle Benchmark-Kursreihen gemeinsam laden (parallel)
+        portfolio_symbols = set(entry.symbol for entry in entries)
+        prefetch = await history_prefetcher.prefetch_async(
+            [(symbol, days) for symbol in benchmarks] + [(symbol, days) for symbol in portfolio_symbols]
+        )
+        
+        # Portfolio-Reihe nur einmal berechnen, auf dem Handelstag-Index aller Reihen
+        converter = converter_for(entries, benchmarks)
+        price_arrays = converter.price_arrays(_price_arrays(prefetch, portfolio_symbols))
+        benchmark_arrays = converter.price_arrays(_price_arrays(prefetch, benchmarks))
+        start_date = (datetime.now() - timedelta(days=days)).date()
+        calendar = trading_calendar(
+            list(price_arrays.values()) + list(benchmark_arrays.values()), start_date=start_date
+        )
+        series = build_portfolio_series(
+            ledger_for(entries, converter).series_lots(converter.lots()), price_arrays, dates=calendar
+        )
+        if series is None:
+            return jsonify({
+                'success': False,
+                'error': 'Keine historischen Daten für das Portfolio verfügbar'
+            }), 404
+        series = series.resample(resolution)
+        
+        # Benchmarks auf den Portfolio-Index ausrichten und auf 100 normalisieren
+        curves = {}
+        missing = []
+        for symbol in benchmarks:
+            if symbol not in benchmark_arrays:
+                missing.append(symbol)
+                continue
+            closes = series.align(benchmark_arrays[symbol])
+            first = closes[~np.isnan(closes)]
+            curves[symbol] = closes / first[0] * 100 if len(first) else closes
+        
+        if max_points:
+            indices = downsample_indices(series.dates, [series.values] + list(curves.values()), max_points)
+            series = series.take(indices)
+            curves = {symbol: curve[indices] for symbol, curve in curves.items()}
+        
+        portfolio_performance = np.divide(
+            series.values * 100, series.invested,
+            out=np.full(len(series), 100.0), where=series.invested > 0
+        )
+        
+        comparison_data = []
+        for i, date_str in enumerate(series.date_strings()):
+            comparison_data.append({
+                'date': date_str,
+                'portfolio_performance': float(portfolio_performance[i]),
+                'portfolio_value': float(series.values[i]),
+                'benchmarks': {
+                    symbol: None if np.isnan(curve[i]) else float(curve[i]) for symbol, curve in curves.items()
+                }
+            })
+        
+        response = {
+            'success': True,
+            'data': comparison_data,
+            'etf_symbols': list(curves),
+            'missing_symbols': missing,
+            'currency': converter.target,
+            'resolution': resolution,
+            'max_points': max_points
+        }
+        if current_app.debug:
+            response['meta'] = {'prefetch': prefetch.meta()}
+        
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({
@@ -205,10 +443,11 @@ def get_portfolio_vs_etf_chart(etf_symbol):
         }), 500
 
 @charts_bp.route('/charts/portfolio/profit-loss', methods=['GET'])
+@user_cached
 def get_profit_loss_chart():
     """Gibt Gewinn/Verlust-Daten für jede Position zurück"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_lots()
         
         if not entries:
             return jsonify({
@@ -217,20 +456,26 @@ def get_profit_loss_chart():
             }), 404
         
         profit_loss_data = []
-        
-        for entry in entries:
-            if entry.current_value:
-                profit_loss = entry.current_value - entry.total_value
-                profit_loss_percent = (profit_loss / entry.total_value * 100) if entry.total_value > 0 else 0
+        converter = converter_for(entries)
+        cost_fractions, quantity_factors = ledger_for(entries, converter).lot_factors(entries)
+        invested_values = (converter.invested() * cost_fractions).tolist()
+        current_values = (converter.current() * quantity_factors).tolist()
+        
+        for entry, invested, current_value, factor in zip(entries, invested_values, current_values,
+                                                          quantity_factors.tolist()):
+            # Vollständig verkaufte Lots erscheinen unter /api/transactions/realized
+            if entry.current_value and factor > 0:
+                profit_loss = current_value - invested
+                profit_loss_percent = (profit_loss / invested * 100) if invested > 0 else 0
                 
                 profit_loss_data.append({
                     'symbol': entry.symbol,
                     'company_name': entry.company_name,
-                    'invested': entry.total_value,
-                    'current_value': entry.current_value,
+                    'invested': invested,
+                    'current_value': current_value,
                     'profit_loss': profit_loss,
                     'profit_loss_percent': profit_loss_percent,
-                    'quantity': entry.quantity
+                    'quantity': entry.quantity * factor
                 })
         
         # Sortiere nach Gewinn/Verlust
@@ -238,7 +483,8 @@ def get_profit_loss_chart():
         
         return jsonify({
             'success': True,
-            'data': profit_loss_data
+            'data': profit_loss_data,
+            'currency': converter.target
         })
         
     except Exception as e:
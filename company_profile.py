@@ -0,0 +1,17 @@
+import json
+from datetime import datetime
+from src.models.user import db
+
+class CompanyProfile(db.Model):
+    """Persistenter Cache für Finnhub-Unternehmensprofile (/stock/profile2)"""
+    __tablename__ = 'company_profile'
+
+    symbol = db.Column(db.String(20), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CompanyProfile {self.symbol}>'
+
+    def to_dict(self):
+        return json.loads(self.data)
@@ -0,0 +1,434 @@
+import csv
+import heapq
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from importlib.util import find_spec
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from src.models.user import db
+from src.models.portfolio import PortfolioEntry
+from src.models.portfolio_entry_meta import PortfolioEntryMeta
+from src.models.portfolio_snapshot import PortfolioSnapshot
+from src.models.portfolio_transaction import PortfolioTransaction
+from src.services.service_registry import services
+
+SECTIONS = ('positions', 'transactions', 'performance')
+JOB_FORMATS = {'xlsx': 'openpyxl', 'pdf': 'reportlab'}
+MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf'
+}
+# Zeilen je Datenbank-Abruf beim Streamen
+FETCH_ROWS = 1000
+CSV_CHUNK_BYTES = 64 * 1024
+# Der PDF-Auszug zeigt eine ausgedünnte Kurve und nur die letzten Buchungen
+MAX_CHART_POINTS = 500
+PDF_TRANSACTIONS = 200
+
+HEADERS = {
+    'positions': ['symbol', 'company_name', 'quantity', 'invested', 'current_value', 'unrealized_profit_loss',
+                  'unrealized_profit_loss_percent', 'realized_profit_loss', 'dividends', 'currency'],
+    'transactions': ['date', 'type', 'symbol', 'quantity', 'price', 'ratio', 'fees', 'currency'],
+    'performance': ['date', 'portfolio_value', 'invested_value', 'cash_flow', 'profit_loss', 'profit_loss_percent']
+}
+
+def available(export_format: str) -> bool:
+    """CSV geht immer; XLSX und PDF benötigen openpyxl bzw. reportlab"""
+    module = JOB_FORMATS.get(export_format)
+    return module is None or find_spec(module) is not None
+
+def _number(value, digits: int = 4):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(float(value), digits)
+
+def _streamed(statement) -> Iterator:
+    """Zeilen eines Core-Selects in Blöcken, ohne das Ergebnis vollständig zu laden"""
+    return iter(db.session.execute(statement.execution_options(yield_per=FETCH_ROWS)))
+
+def position_rows(user_id: Optional[int], currency: str, method: str) -> Iterator[list]:
+    """Offene und geschlossene Positionen je Symbol mit unrealisiertem und realisiertem Ergebnis
+
+    Wird sofort berechnet (eine Zeile je Symbol): Fehler im Ledger, z.B. ein
+    Überverkauf, fallen als ValueError beim Aufruf auf und nicht erst beim Senden.
+    """
+    from src.services.fx_service import CurrencyConverter
+    from src.services.tenant_service import owner_lots
+    from src.services.transaction_service import transaction_service
+
+    entries = owner_lots(user_id)
+    if not entries:
+        return iter(())
+    converter = CurrencyConverter(entries, currency)
+    ledger = transaction_service.ledger(user_id, entries, converter, method)
+    cost_fractions, quantity_factors = ledger.lot_factors(entries)
+    invested = converter.invested() * cost_fractions
+    current = converter.current() * quantity_factors
+
+    positions: Dict[str, list] = {}
+    for entry, cost, value, factor in zip(entries, invested.tolist(), current.tolist(), quantity_factors.tolist()):
+        position = positions.setdefault(entry.symbol, [entry.company_name, 0.0, 0.0, 0.0])
+        position[1] += entry.quantity * factor
+        position[2] += cost
+        position[3] += value
+    rows = []
+    for symbol, (company_name, quantity, cost, value) in sorted(positions.items()):
+        book = ledger.books[symbol]
+        unrealized = value - cost if quantity > 0 else 0.0
+        rows.append([symbol, company_name, _number(quantity, 6), _number(cost, 2), _number(value, 2),
+               _number(unrealized, 2), _number(unrealized / cost * 100 if cost > 0 else 0.0, 2),
+               _number(book.realized, 2), _number(book.dividends, 2), currency])
+    return iter(rows)
+
+def transaction_rows(user_id: Optional[int]) -> Iterator[list]:
+    """Käufe und Transaktionen nach Datum, aus zwei sortierten Datenbank-Streams zusammengeführt"""
+    from src.services.tenant_service import owner_select
+
+    buys = owner_select(
+        user_id, PortfolioEntry.purchase_date, PortfolioEntry.id, PortfolioEntry.symbol, PortfolioEntry.quantity,
+        PortfolioEntry.purchase_price, PortfolioEntryMeta.currency
+    ).order_by(PortfolioEntry.purchase_date, PortfolioEntry.id)
+    transactions = select(
+        PortfolioTransaction.trade_date, PortfolioTransaction.id, PortfolioTransaction.symbol,
+        PortfolioTransaction.type, PortfolioTransaction.quantity, PortfolioTransaction.price,
+        PortfolioTransaction.ratio, PortfolioTransaction.fees
+    ).where(
+        PortfolioTransaction.user_id.is_(None) if user_id is None else PortfolioTransaction.user_id == user_id
+    ).order_by(PortfolioTransaction.trade_date, PortfolioTransaction.id)
+
+    buy_rows = ((day, 0, entry_id, [day.isoformat(), 'buy', symbol, quantity, price, None, 0.0, currency])
+                for day, entry_id, symbol, quantity, price, currency in _streamed(buys))
+    booked = ((day, 1, transaction_id, [day.isoformat(), kind, symbol, quantity, price, ratio, fees, None])
+              for day, transaction_id, symbol, kind, quantity, price, ratio, fees in _streamed(transactions))
+    for *_, row in heapq.merge(buy_rows, booked, key=lambda item: item[:3]):
+        yield row
+
+def performance_rows(user_id: Optional[int], currency: str) -> Iterator[list]:
+    """Gespeicherte Tagesendstände (abgeschlossene Tage) als Zeilen"""
+    statement = select(
+        PortfolioSnapshot.snapshot_date, PortfolioSnapshot.total_value, PortfolioSnapshot.invested,
+        PortfolioSnapshot.cash_flow
+    ).where(
+        PortfolioSnapshot.user_id.is_(None) if user_id is None else PortfolioSnapshot.user_id == user_id,
+        PortfolioSnapshot.currency == currency
+    ).order_by(PortfolioSnapshot.snapshot_date)
+    for day, value, invested, cash_flow in _streamed(statement):
+        profit_loss = value - invested
+        yield [day.isoformat(), _number(value, 2), _number(invested, 2), _number(cash_flow, 2),
+               _number(profit_loss, 2), _number(profit_loss / invested * 100 if invested > 0 else 0.0, 4)]
+
+def update_snapshots(user_id: Optional[int], currency: str):
+    """Trägt fehlende Tagesstände synchron nach (lädt dafür ggf. die Kurshistorie)"""
+    from src.services.snapshot_service import snapshot_service
+    from src.services.tenant_service import owner_lots
+
+    entries = owner_lots(user_id)
+    if entries:
+        snapshot_service.update(user_id, currency, entries, services.get('history_prefetcher'))
+
+def sections(user_id: Optional[int], currency: str, method: str,
+             names: Iterable[str] = SECTIONS) -> List[Tuple[str, Iterator[list]]]:
+    """(Abschnitt, Zeilen) je Abschnitt
+
+    Positionen werden sofort berechnet (ValueError vor dem Senden), Buchungen
+    und Tagesstände erst beim Lesen abgefragt.
+    """
+    report = []
+    for name in names:
+        if name == 'positions':
+            report.append((name, position_rows(user_id, currency, method)))
+        elif name == 'transactions':
+            report.append((name, transaction_rows(user_id)))
+        elif name == 'performance':
+            report.append((name, performance_rows(user_id, currency)))
+    return report
+
+def csv_chunks(report: Iterable[Tuple[str, Iterator[list]]], chunk_bytes: int = CSV_CHUNK_BYTES) -> Iterator[str]:
+    """CSV mit einem Kopfblock je Abschnitt, in Stücken von etwa chunk_bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for index, (name, rows) in enumerate(report):
+        if index:
+            writer.writerow([])
+        writer.writerow([f'# {name}'])
+        writer.writerow(HEADERS[name])
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= chunk_bytes:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+def write_xlsx(path: str, report: Iterable[Tuple[str, Iterator[list]]]):
+    """Ein Arbeitsblatt je Abschnitt; der Write-only-Modus hält keine Zeilen im Speicher"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for name, rows in report:
+        sheet = workbook.create_sheet(name)
+        sheet.append(HEADERS[name])
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+def _chart_points(user_id: Optional[int], currency: str) -> Tuple[List, List]:
+    """Ausgedünnte Performance-Kurve (höchstens MAX_CHART_POINTS Tage) und Monatsendstände"""
+    scope = (PortfolioSnapshot.user_id.is_(None) if user_id is None else PortfolioSnapshot.user_id == user_id,
+             PortfolioSnapshot.currency == currency)
+    count = db.session.execute(select(func.count()).select_from(PortfolioSnapshot).where(*scope)).scalar() or 0
+    step = max(1, math.ceil(count / MAX_CHART_POINTS))
+    points, months = [], []
+    previous = None
+    for index, row in enumerate(performance_rows(user_id, currency)):
+        if index % step == 0 or index == count - 1:
+            points.append(row)
+        if previous is not None and previous[0][:7] != row[0][:7]:
+            months.append(previous)
+        previous = row
+    if previous is not None:
+        months.append(previous)
+    return points, months
+
+def write_pdf(path: str, user_id: Optional[int], currency: str, method: str, names: Iterable[str] = SECTIONS):
+    """Depotauszug mit Positionen, Wertentwicklung (Diagramm und Monatsendstände) und letzten Buchungen"""
+    from reportlab.graphics.charts.lineplots import LinePlot
+    from reportlab.graphics.charts.piecharts import Pie
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('ALIGN', (2, 1), (-1, -1), 'RIGHT')
+    ])
+    story = [
+        Paragraph('Depotauszug', styles['Title']),
+        Paragraph(f'Stand {date.today().isoformat()}, Berichtswährung {currency}, Einstand nach {method}',
+                  styles['Normal']),
+        Spacer(1, 12)
+    ]
+
+    if 'positions' in names:
+        positions = list(position_rows(user_id, currency, method))
+        story += [Paragraph('Positionen', styles['Heading2']),
+                  Table([HEADERS['positions']] + positions, repeatRows=1, style=table_style), Spacer(1, 12)]
+        slices = [(row[0], row[4]) for row in positions if row[4] and row[4] > 0]
+        if slices:
+            pie = Pie()
+            pie.x, pie.y, pie.width, pie.height = 150, 10, 160, 160
+            pie.data = [value for _, value in slices]
+            pie.labels = [symbol for symbol, _ in slices]
+            drawing = Drawing(460, 180)
+            drawing.add(pie)
+            story += [drawing, Spacer(1, 12)]
+
+    if 'performance' in names:
+        points, months = _chart_points(user_id, currency)
+        if len(points) > 1:
+            origin = date.fromisoformat(points[0][0]).toordinal()
+            plot = LinePlot()
+            plot.x, plot.y, plot.width, plot.height = 40, 30, 680, 200
+            plot.data = [
+                [(date.fromisoformat(row[0]).toordinal() - origin, row[1]) for row in points],
+                [(date.fromisoformat(row[0]).toordinal() - origin, row[2]) for row in points]
+            ]
+            plot.lines[0].strokeColor = colors.darkblue
+            plot.lines[1].strokeColor = colors.grey
+            plot.xValueAxis.labelTextFormat = lambda value: date.fromordinal(int(value) + origin).isoformat()
+            drawing = Drawing(760, 250)
+            drawing.add(plot)
+            story += [Paragraph('Wertentwicklung (Marktwert und investiertes Kapital)', styles['Heading2']), drawing]
+        if months:
+            story += [Paragraph('Monatsendstände', styles['Heading2']),
+                      Table([HEADERS['performance']] + months, repeatRows=1, style=table_style), Spacer(1, 12)]
+
+    if 'transactions' in names:
+        recent = list(_last(transaction_rows(user_id), PDF_TRANSACTIONS))
+        if recent:
+            story += [Paragraph(f'Letzte {len(recent)} Buchungen', styles['Heading2']),
+                      Table([HEADERS['transactions']] + recent, repeatRows=1, style=table_style)]
+
+    SimpleDocTemplate(path, pagesize=landscape(A4), title='Depotauszug').build(story)
+
+def _last(rows: Iterator[list], count: int) -> Iterator[list]:
+    return iter(deque(rows, maxlen=count))
+
+class ExportJob:
+    __slots__ = ('id', 'user_id', 'format', 'status', 'created_at', 'finished_at', 'path', 'error')
+
+    def __init__(self, user_id: Optional[int], export_format: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.format = export_format
+        self.status = 'pending'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.path = None
+        self.error = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'format': self.format,
+            'status': self.status,
+            'created_at': datetime.utcfromtimestamp(self.created_at).isoformat(),
+            'finished_at': datetime.utcfromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+            'size': os.path.getsize(self.path) if self.status == 'done' else None,
+            'error': self.error
+        }
+
+    def state(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'ExportJob':
+        job = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(job, name, state.get(name))
+        return job
+
+class ExportJobs:
+    """XLSX- und PDF-Exporte in Hintergrund-Threads; fertige Dateien bleiben `ttl_seconds` abrufbar
+
+    Der Status jedes Jobs liegt als `<id>.json` neben der Datei im
+    Exportverzeichnis, damit jeder Worker Status und Download beantworten kann,
+    nicht nur der, der den Job angenommen hat.
+    """
+
+    def __init__(self, max_workers: int = 2, directory: str = None, ttl_seconds: int = 3600):
+        self.max_workers = max_workers
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._app = None
+        self._executor = None
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='export')
+            return self._executor
+
+    def _directory(self) -> str:
+        directory = self.directory or os.path.join(tempfile.gettempdir(), 'portfolio-exports')
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self._directory(), f'{job_id}.json')
+
+    def _save(self, job: ExportJob):
+        """Schreibt den Status atomar, Leser sehen nie eine halbe Datei"""
+        path = self._state_path(job.id)
+        with open(f'{path}.tmp', 'w') as handle:
+            json.dump(job.state(), handle)
+        os.replace(f'{path}.tmp', path)
+
+    def submit(self, user_id: Optional[int], export_format: str, currency: str, method: str,
+               names: Iterable[str] = SECTIONS) -> ExportJob:
+        self.purge()
+        job = ExportJob(user_id, export_format)
+        self._save(job)
+        self._pool().submit(self._run, job, currency, method, tuple(names))
+        return job
+
+    def _run(self, job: ExportJob, currency: str, method: str, names: Tuple[str, ...]):
+        job.status = 'running'
+        self._save(job)
+        path = os.path.join(self._directory(), f'{job.id}.{job.format}')
+        try:
+            with self._app.app_context():
+                if 'performance' in names:
+                    update_snapshots(job.user_id, currency)
+                if job.format == 'xlsx':
+                    write_xlsx(path, sections(job.user_id, currency, method, names))
+                else:
+                    write_pdf(path, job.user_id, currency, method, names)
+            job.path = path
+            job.status = 'done'
+        except Exception as e:
+            print(f"Fehler beim Export: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+            if os.path.exists(path):
+                os.unlink(path)
+        job.finished_at = time.time()
+        self._save(job)
+
+    def refresh_snapshots(self, user_id: Optional[int], currency: str):
+        """Trägt fehlende Tagesstände im Hintergrund nach, höchstens einmal gleichzeitig je Portfolio und Währung"""
+        key = (user_id, currency)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._pool().submit(self._refresh, key)
+
+    def _refresh(self, key: Tuple[Optional[int], str]):
+        try:
+            with self._app.app_context():
+                update_snapshots(*key)
+        except Exception as e:
+            print(f"Fehler beim Nachtragen der Tagesstände: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _load(self, job_id: str) -> Optional[ExportJob]:
+        try:
+            with open(self._state_path(job_id)) as handle:
+                return ExportJob.from_state(json.load(handle))
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id: str, user_id: Optional[int]) -> Optional[ExportJob]:
+        # Die ID landet im Dateinamen und darf daher nur aus Hex-Ziffern bestehen
+        if not job_id.isalnum():
+            return None
+        job = self._load(job_id)
+        return job if job is not None and job.user_id == user_id else None
+
+    def purge(self):
+        """Entfernt abgelaufene Jobs samt Dateien, auch solche, deren Worker abgebrochen wurde"""
+        cutoff = time.time() - self.ttl_seconds
+        directory = self._directory()
+        for name in os.listdir(directory):
+            job_id, extension = os.path.splitext(name)
+            if extension != '.json':
+                continue
+            job = self._load(job_id)
+            if job is None or (job.finished_at or job.created_at) >= cutoff:
+                continue
+            for path in (os.path.join(directory, f'{job.id}.{job.format}'), self._state_path(job.id)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass  # ein anderer Worker war schneller
+
+export_jobs = ExportJobs()
+
+def init_app(app):
+    """Worker-Anzahl, Zielverzeichnis und Aufbewahrung der Hintergrund-Exporte laut Konfiguration"""
+    export_jobs._app = app
+    export_jobs.max_workers = int(app.config.get('EXPORT_WORKERS', 2))
+    export_jobs.directory = app.config.get('EXPORT_DIR')
+    export_jobs.ttl_seconds = int(app.config.get('EXPORT_TTL_SECONDS', 3600))
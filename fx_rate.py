@@ -0,0 +1,12 @@
+from src.models.user import db
+
+class FxRate(db.Model):
+    """Tägliche Wechselkurse als Einheiten der Währung je 1 USD"""
+    __tablename__ = 'fx_rate'
+
+    currency = db.Column(db.String(3), primary_key=True)
+    rate_date = db.Column(db.Date, primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<FxRate {self.currency} {self.rate_date} {self.rate}>'
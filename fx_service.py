@@ -0,0 +1,330 @@
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.models.user import db
+from src.models.fx_rate import FxRate
+from src.models.portfolio_entry_meta import PortfolioEntryMeta
+from src.services.metrics_service import record_cache, record_upstream
+from src.services.profile_service import profile_cache
+
+PIVOT_CURRENCY = 'USD'
+DEFAULT_QUOTE_CURRENCY = 'USD'
+CURRENCY_CODE = re.compile(r'^[A-Z]{3}$')
+
+# Toleranz für Tage ohne Kurs (Wochenenden, Feiertage der EZB)
+COVERAGE_SLACK = timedelta(days=4)
+# Nach einem fehlgeschlagenen Abruf wird frühestens so viele Sekunden später erneut gefragt
+RETRY_SECONDS = 30
+
+def normalize_currency(value) -> Optional[str]:
+    """Gültiger ISO-4217-Code in Großbuchstaben oder None"""
+    if not value:
+        return None
+    value = str(value).strip().upper()
+    return value if CURRENCY_CODE.match(value) else None
+
+class FxService:
+    """Tägliche Wechselkurse: Speicher -> Datenbank -> EZB-Kurse (Frankfurter-API)
+
+    Kurse werden je Währung als Zeitraum in einem Aufruf geladen und als
+    sortierte Arrays gehalten, damit Umrechnungen vektorisiert laufen.
+    """
+
+    def __init__(self, base_url: str = None, refresh_seconds: int = 3600, retry_seconds: int = RETRY_SECONDS):
+        self.base_url = base_url or os.environ.get('FX_BASE_URL', 'https://api.frankfurter.app')
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        # Währung -> (Datums-Array, Kurs-Array, abgedeckt von, abgedeckt bis, geprüft um)
+        self._series: Dict[str, Tuple[np.ndarray, np.ndarray, date, date, float]] = {}
+        # Währung -> frühester nächster Abruf nach einem Fehlschlag
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _covers(self, currency: str, start: date, end: date) -> bool:
+        entry = self._series.get(currency)
+        if not entry:
+            return False
+        _, _, covered_start, covered_end, checked_at = entry
+        if covered_start > start:
+            return False
+        # Bis gestern abgedeckt genügt; der heutige Kurs wird höchstens stündlich nachgefragt
+        return covered_end >= end or time.time() - checked_at < self.refresh_seconds
+
+    def _set_series(self, currency: str, rows: Dict[date, float], start: date, end: date, checked_at: float = None):
+        days = sorted(rows)
+        self._series[currency] = (
+            np.array(days, dtype='datetime64[D]'),
+            np.array([rows[day] for day in days], dtype=np.float64),
+            start, end, time.time() if checked_at is None else checked_at
+        )
+
+    def _load_from_db(self, currencies: List[str], start: date) -> Dict[str, Dict[date, float]]:
+        rows = {currency: {} for currency in currencies}
+        query = FxRate.query.filter(FxRate.currency.in_(currencies), FxRate.rate_date >= start)
+        for row in query.all():
+            rows[row.currency][row.rate_date] = row.rate
+        return rows
+
+    def _fetch(self, currencies: List[str], start: date) -> Optional[Dict[str, Dict[date, float]]]:
+        """Ein Aufruf für alle Währungen ab `start` bis heute; None, wenn der Abruf fehlschlägt"""
+        rows = {currency: {} for currency in currencies}
+        started = time.perf_counter()
+        try:
+            import requests
+            response = requests.get(
+                f'{self.base_url}/{start.isoformat()}..',
+                params={'from': PIVOT_CURRENCY, 'to': ','.join(currencies)}, timeout=15
+            )
+            record_upstream('fx', time.perf_counter() - started, 0.0, str(response.status_code))
+            if response.status_code != 200:
+                print(f"FX API Error: {response.status_code} - {response.text}")
+                return None
+            for day, rates in response.json().get('rates', {}).items():
+                rate_date = datetime.strptime(day, '%Y-%m-%d').date()
+                for currency, rate in rates.items():
+                    if currency in rows:
+                        rows[currency][rate_date] = float(rate)
+        except Exception as e:
+            record_upstream('fx', time.perf_counter() - started, 0.0, 'error')
+            print(f"FX request error: {str(e)}")
+            return None
+        return rows
+
+    def _store(self, fetched: Dict[str, Dict[date, float]], known: Dict[str, Dict[date, float]]):
+        new_rows = [
+            FxRate(currency=currency, rate_date=day, rate=rate)
+            for currency, rates in fetched.items() for day, rate in rates.items()
+            if day not in known.get(currency, {})
+        ]
+        if not new_rows:
+            return
+        try:
+            db.session.add_all(new_rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"FX store error: {str(e)}")
+
+    def ensure_rates(self, currencies: Iterable[str], start: date, end: date = None):
+        """Stellt sicher, dass Kurse für den Zeitraum geladen sind (gebündelt, nicht je Umrechnung)
+
+        Schlägt der Abruf fehl, gilt der Zeitraum nicht als abgedeckt: vorhandene
+        Kurse werden weiter verwendet (letzter bekannter Kurs), und nach
+        `retry_seconds` fragt die nächste Anfrage erneut.
+        """
+        end = end or date.today()
+        now = time.time()
+        with self._lock:
+            missing = sorted(
+                currency for currency in set(currencies)
+                if currency != PIVOT_CURRENCY and not self._covers(currency, start, end)
+                and self._retry_at.get(currency, 0) <= now
+            )
+        for currency in set(currencies) - {PIVOT_CURRENCY}:
+            record_cache('fx', currency not in missing)
+        if not missing:
+            return
+
+        load_start = start - COVERAGE_SLACK
+        stored = self._load_from_db(missing, load_start)
+        to_fetch = []
+        for currency in missing:
+            days = stored[currency]
+            if not days or min(days) > start + COVERAGE_SLACK or max(days) < end - COVERAGE_SLACK:
+                to_fetch.append(currency)
+
+        failed = set()
+        if to_fetch:
+            fetched = self._fetch(to_fetch, load_start)
+            if fetched is None:
+                failed = set(to_fetch)
+            else:
+                self._store(fetched, stored)
+                for currency in to_fetch:
+                    stored[currency].update(fetched[currency])
+
+        with self._lock:
+            for currency in missing:
+                existing = self._series.get(currency)
+                rows = stored[currency]
+                if existing is not None:
+                    # Bereits geladene ältere Kurse behalten
+                    for day, rate in zip(existing[0].astype(object), existing[1]):
+                        rows.setdefault(day, float(rate))
+                if currency in failed or not rows:
+                    # Nicht als abgedeckt merken; vorhandene Kurse bleiben nutzbar, Abruf nach der Pause
+                    self._retry_at[currency] = now + self.retry_seconds
+                    if rows:
+                        covered_start = existing[2] if existing is not None else min(rows)
+                        self._set_series(currency, rows, covered_start, max(rows), 0.0)
+                    continue
+                self._retry_at.pop(currency, None)
+                covered_start = min(load_start, existing[2]) if existing is not None else load_start
+                self._set_series(currency, rows, covered_start, max(rows))
+
+    def rates(self, currency: str, dates: np.ndarray) -> np.ndarray:
+        """Einheiten von `currency` je USD an den Tagen `dates`, letzter bekannter Kurs davor"""
+        if currency == PIVOT_CURRENCY:
+            return np.ones(len(dates))
+        with self._lock:
+            entry = self._series.get(currency)
+        if entry is None or not len(entry[0]):
+            raise ValueError(f'Keine Wechselkurse für {currency} verfügbar')
+        rate_dates, values = entry[0], entry[1]
+        index = np.searchsorted(rate_dates, dates.astype('datetime64[D]'), side='right') - 1
+        return values[np.clip(index, 0, len(values) - 1)]
+
+    def factors(self, from_currency: str, to_currency: str, dates: np.ndarray) -> np.ndarray:
+        """Multiplikatoren für die Umrechnung von `from_currency` nach `to_currency` je Tag"""
+        if from_currency == to_currency:
+            return np.ones(len(dates))
+        return self.rates(to_currency, dates) / self.rates(from_currency, dates)
+
+fx_service = FxService()
+
+def reporting_currency(requested: str = None, default: str = None) -> str:
+    return normalize_currency(requested) or normalize_currency(default) or DEFAULT_QUOTE_CURRENCY
+
+def entry_currencies(entries) -> Dict[int, Optional[str]]:
+    """Kaufwährung je Eintrag aus den Zusatzdaten (eine Abfrage)"""
+    ids = [entry.id for entry in entries]
+    if not ids:
+        return {}
+    rows = PortfolioEntryMeta.query.with_entities(PortfolioEntryMeta.entry_id, PortfolioEntryMeta.currency) \
+        .filter(PortfolioEntryMeta.entry_id.in_(ids)).all()
+    return {entry_id: currency for entry_id, currency in rows}
+
+def resolve_quote_currencies(symbols: Iterable[str]) -> Tuple[Dict[str, str], Set[str]]:
+    """Handelswährung je Symbol aus den lokal gespeicherten Unternehmensprofilen und die ungeklärten Symbole
+
+    Läuft bei jeder Umrechnung und wartet daher nicht auf Finnhub: fehlende
+    Profile werden im Hintergrund nachgeladen. Bis dahin (oder ohne Währung im
+    Profil) gilt DEFAULT_QUOTE_CURRENCY, und das Symbol zählt als ungeklärt.
+    """
+    symbols = set(symbols)
+    profiles = profile_cache.get_cached(symbols)
+    if symbols - set(profiles):
+        profile_cache.prefetch(symbols - set(profiles))
+    currencies, unresolved = {}, set()
+    for symbol in symbols:
+        currency = normalize_currency((profiles.get(symbol) or {}).get('currency'))
+        if currency is None:
+            unresolved.add(symbol)
+        currencies[symbol] = currency or DEFAULT_QUOTE_CURRENCY
+    return currencies, unresolved
+
+def quote_currencies(symbols: Iterable[str]) -> Dict[str, str]:
+    """Handelswährung je Symbol (siehe resolve_quote_currencies)"""
+    return resolve_quote_currencies(symbols)[0]
+
+class ConvertedLot:
+    __slots__ = ('symbol', 'purchase_date', 'quantity', 'total_value')
+
+    def __init__(self, symbol, purchase_date, quantity, total_value):
+        self.symbol = symbol
+        self.purchase_date = purchase_date
+        self.quantity = quantity
+        self.total_value = total_value
+
+class CurrencyConverter:
+    """Rechnet Einstände, Kurse und aktuelle Werte einer Anfrage in die Berichtswährung um
+
+    Ohne Kaufwährung gilt für einen Eintrag die Handelswährung seines Symbols;
+    Symbole ohne bekannte Handelswährung stehen in `unresolved`. Stimmen alle Währungen mit der Berichtswährung überein, werden die Werte
+    unverändert durchgereicht und keine Kurse geladen.
+    """
+
+    def __init__(self, entries, target: str, extra_symbols: Iterable[str] = (), fx: FxService = None):
+        self.target = target
+        self.fx = fx or fx_service
+        self.entries = list(entries)
+        self.symbol_currency, self.unresolved = resolve_quote_currencies(
+            {entry.symbol for entry in self.entries} | set(extra_symbols))
+        stored = entry_currencies(self.entries)
+        self.entry_currency = {
+            entry.id: stored.get(entry.id) or self.symbol_currency[entry.symbol] for entry in self.entries
+        }
+
+        currencies = set(self.symbol_currency.values()) | set(self.entry_currency.values())
+        self.identity = currencies == {target}
+        if not self.identity and self.entries:
+            oldest = min(entry.purchase_date for entry in self.entries)
+            self.fx.ensure_rates(currencies | {target}, oldest)
+
+    def _convert(self, amounts: np.ndarray, currencies: List[str], dates: np.ndarray) -> np.ndarray:
+        """Vektorisiert je Ausgangswährung"""
+        result = np.array(amounts, dtype=np.float64)
+        currencies = np.array(currencies)
+        for currency in set(currencies.tolist()):
+            mask = currencies == currency
+            result[mask] *= self.fx.factors(currency, self.target, dates[mask])
+        return result
+
+    def invested(self, entries=None) -> np.ndarray:
+        """Einstandswerte zum Kurs des jeweiligen Kauftags"""
+        entries = self.entries if entries is None else entries
+        amounts = np.array([entry.total_value for entry in entries], dtype=np.float64)
+        if self.identity:
+            return amounts
+        dates = np.array([entry.purchase_date for entry in entries], dtype='datetime64[D]')
+        return self._convert(amounts, [self.entry_currency[entry.id] for entry in entries], dates)
+
+    def current(self, entries=None) -> np.ndarray:
+        """Aktuelle Werte (in Handelswährung gespeichert) zum heutigen Kurs; NaN ohne Kurs"""
+        entries = self.entries if entries is None else entries
+        amounts = np.array([entry.current_value if entry.current_value else np.nan for entry in entries],
+                           dtype=np.float64)
+        if self.identity:
+            return amounts
+        dates = np.full(len(entries), np.datetime64(date.today(), 'D'))
+        return self._convert(amounts, [self.symbol_currency[entry.symbol] for entry in entries], dates)
+
+    def trade_values(self, symbols: List[str], amounts, dates) -> np.ndarray:
+        """Beträge in der Handelswährung des jeweiligen Symbols (z.B. Verkaufserlöse) zum Kurs ihres Tages"""
+        amounts = np.array(amounts, dtype=np.float64)
+        unknown = set(symbols) - set(self.symbol_currency)
+        if unknown:
+            currencies, unresolved = resolve_quote_currencies(unknown)
+            self.symbol_currency.update(currencies)
+            self.unresolved |= unresolved
+        currencies = [self.symbol_currency[symbol] for symbol in symbols]
+        if set(currencies) <= {self.target}:
+            return amounts
+        dates = np.array(dates, dtype='datetime64[D]')
+        self.fx.ensure_rates(set(currencies) | {self.target}, dates.min().astype(object))
+        return self._convert(amounts, currencies, dates)
+
+    def lots(self, entries=None) -> list:
+        """Lots mit umgerechnetem Einstand für build_portfolio_series"""
+        entries = self.entries if entries is None else entries
+        if self.identity:
+            return entries
+        invested = self.invested(entries)
+        return [
+            ConvertedLot(entry.symbol, entry.purchase_date, entry.quantity, float(value))
+            for entry, value in zip(entries, invested)
+        ]
+
+    def price_arrays(self, price_arrays: Dict[str, tuple]) -> Dict[str, tuple]:
+        """(Datum, Schlusskurs)-Arrays je Symbol, Kurse in Berichtswährung"""
+        if self.identity:
+            return price_arrays
+        converted = {}
+        for symbol, (dates, closes) in price_arrays.items():
+            currency = self.symbol_currency.get(symbol, DEFAULT_QUOTE_CURRENCY)
+            if currency != self.target:
+                self.fx.ensure_rates([currency, self.target], dates[0].astype(object))
+            converted[symbol] = (dates, closes * self.fx.factors(currency, self.target, dates))
+        return converted
+
+def converter_for(entries, extra_symbols: Iterable[str] = ()) -> CurrencyConverter:
+    """Konverter in die per ?currency= gewählte oder konfigurierte Berichtswährung"""
+    from flask import current_app, request
+    target = reporting_currency(request.args.get('currency'), current_app.config.get('REPORTING_CURRENCY'))
+    return CurrencyConverter(entries, target, extra_symbols)
@@ -0,0 +1,173 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.services.async_market_data_service import offload
+from src.services.metrics_service import bind_context, record_cache
+
+class HistoryCache:
+    """In-Memory-Cache für tägliche Kursreihen, geteilt über alle Anfragen"""
+
+    def __init__(self, ttl_seconds: int = 900):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, int, List[Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, days: int) -> Optional[List[Dict]]:
+        """Gibt die gecachte Reihe zurück, falls sie den Zeitraum abdeckt"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if not entry:
+            return None
+
+        fetched_at, cached_days, data = entry
+        if time.time() - fetched_at > self.ttl_seconds or cached_days < days:
+            return None
+        if cached_days == days:
+            return data
+
+        # Längere Reihe auf den angefragten Zeitraum zuschneiden
+        start_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        return [item for item in data if item['date'] >= start_str]
+
+    def put(self, symbol: str, days: int, data: List[Dict]):
+        with self._lock:
+            current = self._entries.get(symbol)
+            # Eine frische, längere Reihe nicht durch eine kürzere ersetzen
+            if current and current[1] > days and time.time() - current[0] <= self.ttl_seconds:
+                return
+            self._entries[symbol] = (time.time(), days, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class QuoteCache:
+    """Kurzlebiger Cache für aktuelle Kurse, geteilt über alle Benutzer"""
+
+    def __init__(self, ttl_seconds: int = 30):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, symbols: Iterable[str]) -> Dict[str, float]:
+        now = time.time()
+        found = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry and now - entry[0] <= self.ttl_seconds:
+                    found[symbol] = entry[1]
+        return found
+
+    def put_many(self, prices: Dict[str, float]):
+        now = time.time()
+        with self._lock:
+            for symbol, price in prices.items():
+                if price is not None:
+                    self._entries[symbol] = (now, price)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class PrefetchResult:
+    """Ergebnis eines Prefetch-Laufs: Kursreihen plus Zeitmessung pro Symbol"""
+
+    def __init__(self):
+        self.data: Dict[str, List[Dict]] = {}
+        self.timings: Dict[str, Dict] = {}
+        self.total_seconds = 0.0
+
+    def closes(self, symbol: str) -> Dict[str, float]:
+        """Schlusskurse eines Symbols als Dictionary Datum -> Kurs"""
+        return {item['date']: item['close'] for item in self.data.get(symbol) or []}
+
+    def meta(self) -> Dict:
+        return {
+            'total_seconds': round(self.total_seconds, 4),
+            'symbols': self.timings
+        }
+
+class HistoryPrefetcher:
+    """Lädt alle benötigten Kursreihen parallel unter dem gemeinsamen Rate Limit"""
+
+    def __init__(self, market_service, cache: HistoryCache = None, max_workers: int = 8,
+                 async_market_service=None):
+        self.market_service = market_service
+        self.async_market_service = async_market_service
+        self.cache = cache or history_cache
+        self.max_workers = max_workers
+
+    def _collect(self, requests: Iterable[Tuple[str, int]], result: PrefetchResult) -> List[Tuple[str, int]]:
+        """Fasst Anfragen pro Symbol zusammen, bedient Cache-Treffer und gibt die fehlenden zurück"""
+        wanted: Dict[str, int] = {}
+        for symbol, days in requests:
+            wanted[symbol] = max(days, wanted.get(symbol, 0))
+
+        missing = []
+        for symbol, days in wanted.items():
+            cached = self.cache.get(symbol, days)
+            record_cache('history', cached is not None)
+            if cached is not None:
+                result.data[symbol] = cached
+                result.timings[symbol] = {'source': 'cache', 'days': days, 'seconds': 0.0}
+            else:
+                missing.append((symbol, days))
+        return missing
+
+    def _store(self, fetched, result: PrefetchResult):
+        for symbol, days, data, seconds in fetched:
+            if data:
+                self.cache.put(symbol, days, data)
+                result.data[symbol] = data
+            result.timings[symbol] = {
+                'source': 'upstream',
+                'days': days,
+                'seconds': round(seconds, 4),
+                'points': len(data) if data else 0
+            }
+
+    def prefetch(self, requests: Iterable[Tuple[str, int]]) -> PrefetchResult:
+        """Holt (Symbol, Tage)-Paare; doppelte Symbole werden zum größten Zeitraum zusammengefasst"""
+        started = time.perf_counter()
+        result = PrefetchResult()
+        missing = self._collect(requests, result)
+
+        if missing:
+            workers = min(self.max_workers, len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                self._store(executor.map(bind_context(self._fetch), missing), result)
+
+        result.total_seconds = time.perf_counter() - started
+        return result
+
+    async def prefetch_async(self, requests: Iterable[Tuple[str, int]]) -> PrefetchResult:
+        """Wie prefetch, aber ohne den Worker-Thread zu blockieren
+
+        Mit asynchronem Dienst (ASYNC_MODE) laufen die Abrufe als Coroutinen,
+        sonst läuft der synchrone Prefetch (im Async-Modus in einem Hilfs-Thread).
+        """
+        if self.async_market_service is None:
+            return await offload(self.prefetch, list(requests))
+
+        started = time.perf_counter()
+        result = PrefetchResult()
+        missing = self._collect(requests, result)
+
+        if missing:
+            self._store(await self.async_market_service.get_many_historical(missing), result)
+
+        result.total_seconds = time.perf_counter() - started
+        return result
+
+    def _fetch(self, request: Tuple[str, int]):
+        symbol, days = request
+        started = time.perf_counter()
+        data = self.market_service.get_historical_data(symbol, days)
+        return symbol, days, data, time.perf_counter() - started
+
+# Gemeinsame Caches für alle Blueprints und Benutzer
+history_cache = HistoryCache()
+quote_cache = QuoteCache()
@@ -3,51 +3,158 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from src.services.service_registry import startup_profile
+from flask import Flask, request, send_from_directory
 from flask_cors import CORS
 from src.models.portfolio import db, PortfolioEntry
+from src.models.portfolio_entry_meta import upgrade_schema
+from src.models.portfolio_snapshot import upgrade_schema as upgrade_snapshot_schema
 from src.routes.user import user_bp
 from src.routes.portfolio import portfolio_bp
 from src.routes.market_data import market_data_bp
 from src.routes.charts import charts_bp
+from src.routes.analytics import analytics_bp
+from src.routes.metrics import metrics_bp
+from src.routes.alerts import alerts_bp
+from src.routes.transactions import transactions_bp
+from src.services import (
+    alert_service, asset_service, export_service, metrics_service, ocr_service, profile_service, profiler_service,
+    response_service, snapshot_service, stream_service, tenant_service
+)
+startup_profile.mark('imports')
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# CORS aktivieren für alle Routen
-CORS(app)
-
-# Blueprints registrieren
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(portfolio_bp, url_prefix='/api')
-app.register_blueprint(market_data_bp, url_prefix='/api')
-app.register_blueprint(charts_bp, url_prefix='/api')
-
-# Datenbank konfigurieren
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+def create_app(debug=None):
+    """Baut die App samt Datenbank, Hooks und Hintergrunddiensten auf
+
+    `debug` setzt den Debug-Modus vor den init_app-Aufrufen; app.run(debug=True)
+    käme dafür zu spät.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    if debug is not None:
+        app.debug = debug
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+    # CORS aktivieren für alle Routen
+    CORS(app)
+
+    # Blueprints registrieren
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(portfolio_bp, url_prefix='/api')
+    app.register_blueprint(market_data_bp, url_prefix='/api')
+    app.register_blueprint(charts_bp, url_prefix='/api')
+    app.register_blueprint(analytics_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(alerts_bp, url_prefix='/api')
+    app.register_blueprint(transactions_bp, url_prefix='/api')
+    startup_profile.mark('blueprints')
+
+    # Datenbank konfigurieren
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '0') == '1'
+    app.config['STARTUP_PROFILE'] = os.environ.get('STARTUP_PROFILE', '0') == '1'
+    # X-User-Id nur hinter einem authentifizierenden Proxy auswerten, der den Header selbst setzt
+    app.config['TRUST_USER_HEADER'] = os.environ.get('TRUST_USER_HEADER', '0') == '1'
+    # Profiling einzelner Anfragen per X-Profile-Header oder ?profile= (im Debug-Modus immer verfügbar)
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN')
+    app.config['PROFILING_INTERVAL_MS'] = float(os.environ.get('PROFILING_INTERVAL_MS', 5))
+    app.config['PROFILING_KEEP'] = int(os.environ.get('PROFILING_KEEP', 20))
+    # Berichtswährung für Statistiken und Charts (pro Anfrage per ?currency= überschreibbar)
+    app.config['REPORTING_CURRENCY'] = os.environ.get('REPORTING_CURRENCY', 'USD')
+    # Kurse per WebSocket-Trade-Feed statt Polling (PRICE_STREAM=1, benötigt websocket-client)
+    app.config['PRICE_STREAM'] = os.environ.get('PRICE_STREAM', '0') == '1'
+    app.config['STREAM_FLUSH_SECONDS'] = float(os.environ.get('STREAM_FLUSH_SECONDS', 5))
+    app.config['STREAM_POLL_SECONDS'] = float(os.environ.get('STREAM_POLL_SECONDS', 60))
+    # Ergebnis-Caches erst ab dieser Kursbewegung (Prozent) verwerfen; Sperrdatei für den einen Stream-Prozess
+    app.config['STREAM_INVALIDATE_PERCENT'] = float(os.environ.get('STREAM_INVALIDATE_PERCENT', 0.1))
+    app.config['STREAM_LOCK_FILE'] = os.environ.get('STREAM_LOCK_FILE')
+    # Ausgelöste Alarme zusätzlich auf der Konsole bzw. als JSON-Zeilen in einer Datei ausgeben
+    app.config['ALERT_LOG'] = os.environ.get('ALERT_LOG', '0') == '1'
+    app.config['ALERT_LOG_FILE'] = os.environ.get('ALERT_LOG_FILE')
+    # Spätestens nach so vielen Sekunden übernimmt ein Worker Alarmregel-Änderungen anderer Worker
+    app.config['ALERT_SYNC_SECONDS'] = float(os.environ.get('ALERT_SYNC_SECONDS', 1.0))
+    # Einstandsverfahren für Verkäufe: fifo oder average (pro Anfrage per ?method= überschreibbar)
+    app.config['COST_BASIS_METHOD'] = os.environ.get('COST_BASIS_METHOD', 'fifo')
+    # XLSX-/PDF-Exporte im Hintergrund (benötigen openpyxl bzw. reportlab)
+    app.config['EXPORT_WORKERS'] = int(os.environ.get('EXPORT_WORKERS', 2))
+    app.config['EXPORT_DIR'] = os.environ.get('EXPORT_DIR')
+    app.config['EXPORT_TTL_SECONDS'] = int(os.environ.get('EXPORT_TTL_SECONDS', 3600))
+    # Statische Dateien aus dem beim Start erstellten Manifest (für die Entwicklung mit STATIC_MANIFEST=0 abschalten)
+    app.config['STATIC_MANIFEST'] = os.environ.get('STATIC_MANIFEST', '1') == '1'
+
+    db.init_app(app)
+    # Kurzlebige Worker können das Schema-Abgleichen abschalten, wenn die Tabellen bereits existieren
+    if os.environ.get('DB_CREATE_ALL', '1') == '1':
+        with app.app_context():
+            db.create_all()
+            upgrade_schema(db.engine)
+            upgrade_snapshot_schema(db.engine)
+    startup_profile.mark('database')
+
+    # Benutzer je API-Anfrage (Session, X-User-Id nur mit TRUST_USER_HEADER) für benutzerbezogene Portfolios
+    tenant_service.init_app(app)
+
+    # Uploads im Speicher puffern (bis MAX_CONTENT_LENGTH), OCR liest direkt aus dem Request
+    ocr_service.init_app(app)
+
+    # orjson-Provider (falls installiert) und gzip/Brotli-Kompression großer Antworten
+    response_service.init_app(app)
+
+    # Metriken (/api/metrics, Server-Timing) nur bei METRICS_ENABLED=1
+    metrics_service.init_app(app, db)
+
+    # Stichproben-Profiler für einzelne Anfragen, nur bei PROFILING_ENABLED=1 oder im Debug-Modus
+    profiler_service.init_app(app)
+
+    # Asset-Manifest mit Hash-Namen und vorkomprimierten Varianten
+    asset_service.init_app(app)
+
+    # Tagesend-Job für Portfolio-Tagesstände (flask --app src.main snapshots)
+    snapshot_service.init_app(app)
+
+    # Hintergrund-Exporte (XLSX/PDF) laufen mit eigenem App-Kontext
+    export_service.init_app(app)
+
+    # Fehlende Unternehmensprofile (Handelswährung) werden im Hintergrund nachgeladen
+    profile_service.init_app(app)
+
+    # Alarm-Zustellung und gebündeltes Speichern der Alarmzustände am Anfrageende
+    alert_service.init_app(app)
+
+    # Trade-Stream startet mit der ersten Anfrage in genau einem Prozess (Sperrdatei)
+    stream_service.init_app(app)
+
+    # Startprofil (STARTUP_PROFILE=1 gibt es aus, /api/metrics/startup liefert es bei aktivierten Metriken)
+    startup_profile.init_app(app)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if asset_service.asset_manifest is not None:
+            return asset_service.asset_manifest.response_for(path, request, app.response_class)
+
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    return app
 
+# Worker des Projektions-Pools (spawn) importieren dieses Modul erneut als __mp_main__;
+# dort darf weder das Schema abgeglichen noch der Trade-Stream gestartet werden
+if __name__ != '__mp_main__':
+    app = create_app(debug=True if __name__ == '__main__' else None)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
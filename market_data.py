@@ -1,26 +1,74 @@
 from flask import Blueprint, jsonify, request
-from src.services.market_data_service import MarketDataService, AlphaVantageService
-from src.models.portfolio import PortfolioEntry, db
+from src.services.service_registry import services
+from src.services.async_market_data_service import async_market_service, async_view, offload
+from src.services.symbol_index_service import symbol_index
+from src.services.profile_service import profile_cache
+from src.services.metrics_service import record_cache
+from src.services.history_service import quote_cache
+from src.services.stream_service import streamed_quotes, trade_stream
+from src.services.alert_service import alert_engine
+from src.services.tenant_service import invalidate_user_cache, user_entries, user_lots
+from src.models.portfolio import db
 from datetime import datetime
 
 market_data_bp = Blueprint('market_data', __name__)
 
-# Initialisiere Market Data Services
-finnhub_service = MarketDataService()
-alpha_vantage_service = AlphaVantageService()
+# Market Data Services, erzeugt beim ersten Zugriff
+finnhub_service = services.lazy('finnhub')
+alpha_vantage_service = services.lazy('alpha_vantage')
+
+async def _current_price(symbol):
+    """Finnhub-Kurs, im Async-Modus nicht-blockierend über httpx"""
+    streamed = streamed_quotes([symbol])
+    if streamed:
+        return streamed[symbol]
+
+    cached = quote_cache.get_many([symbol])
+    record_cache('quote', bool(cached))
+    if cached:
+        return cached[symbol]
+
+    if async_market_service:
+        price = await async_market_service.get_current_price(symbol)
+    else:
+        price = await offload(finnhub_service.get_current_price, symbol)
+    quote_cache.put_many({symbol: price})
+    alert_engine.observe({symbol: price})
+    return price
+
+async def _multiple_quotes(symbols):
+    """Kurse mehrerer Symbole; nur die weder gestreamten noch gecachten werden upstream geholt"""
+    quotes = streamed_quotes(symbols)
+    quotes.update(quote_cache.get_many([symbol for symbol in symbols if symbol not in quotes]))
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    for symbol in symbols:
+        record_cache('quote', symbol in quotes)
+    if not missing:
+        return quotes
+
+    if async_market_service:
+        fetched = await async_market_service.get_multiple_quotes(missing)
+    else:
+        fetched = await offload(finnhub_service.get_multiple_quotes, missing)
+    quote_cache.put_many(fetched)
+    # Gestreamte Kurse prüft der Stream selbst, gecachte wurden beim Abruf geprüft
+    alert_engine.observe(fetched)
+    quotes.update(fetched)
+    return quotes
 
 @market_data_bp.route('/market/quote/<symbol>', methods=['GET'])
-def get_quote(symbol):
+@async_view
+async def get_quote(symbol):
     """Holt den aktuellen Kurs für ein Symbol"""
     try:
         symbol = symbol.upper()
         
         # Versuche zuerst Finnhub
-        price = finnhub_service.get_current_price(symbol)
+        price = await _current_price(symbol)
         
         # Fallback zu Alpha Vantage falls Finnhub nicht funktioniert
         if price is None:
-            price = alpha_vantage_service.get_current_price(symbol)
+            price = await offload(alpha_vantage_service.get_current_price, symbol)
         
         if price is None:
             return jsonify({
@@ -54,12 +102,24 @@ def search_symbols():
                 'error': 'Suchbegriff erforderlich'
             }), 400
         
-        results = finnhub_service.search_symbol(query)
+        # Zuerst lokal suchen, Upstream nur bei Fehltreffern
+        results = symbol_index.search(query)
+        source = 'index'
+        record_cache('symbol_index', bool(results))
+        
+        if not results and not symbol_index.is_known_miss(query):
+            results = finnhub_service.search_symbol(query)
+            source = 'upstream'
+            if results:
+                symbol_index.add(results)
+            else:
+                symbol_index.remember_miss(query)
         
         return jsonify({
             'success': True,
             'data': results,
-            'query': query
+            'query': query,
+            'source': source
         })
         
     except Exception as e:
@@ -73,7 +133,7 @@ def get_company_profile(symbol):
     """Holt Unternehmensinformationen"""
     try:
         symbol = symbol.upper()
-        profile = finnhub_service.get_company_profile(symbol)
+        profile = profile_cache.get_profile(symbol)
         
         if not profile:
             return jsonify({
@@ -92,6 +152,37 @@ def get_company_profile(symbol):
             'error': str(e)
         }), 500
 
+# Obergrenze für Symbole pro Batch-Anfrage
+MAX_PROFILE_SYMBOLS = 50
+
+@market_data_bp.route('/market/profiles', methods=['GET'])
+def get_company_profiles():
+    """Holt Unternehmensinformationen für mehrere Symbole (aus dem Cache, fehlende parallel)"""
+    try:
+        symbols = sorted(set(
+            symbol.strip().upper() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()
+        ))
+        
+        if not symbols or len(symbols) > MAX_PROFILE_SYMBOLS:
+            return jsonify({
+                'success': False,
+                'error': f'Zwischen 1 und {MAX_PROFILE_SYMBOLS} Symbole erforderlich'
+            }), 400
+        
+        profiles = profile_cache.get_profiles(symbols)
+        
+        return jsonify({
+            'success': True,
+            'data': profiles,
+            'missing_symbols': [symbol for symbol in symbols if symbol not in profiles]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @market_data_bp.route('/market/historical/<symbol>', methods=['GET'])
 def get_historical_data(symbol):
     """Holt historische Kursdaten"""
@@ -137,11 +228,27 @@ def get_etf_suggestions():
             'error': str(e)
         }), 500
 
+@market_data_bp.route('/market/stream', methods=['GET'])
+def get_stream_status():
+    """Zustand des Trade-Streams (Verbindung, Abos, Ticks, Flushes)"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': {'enabled': trade_stream.running, **trade_stream.status()}
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @market_data_bp.route('/market/portfolio/update', methods=['POST'])
-def update_portfolio_prices():
-    """Aktualisiert die Kurse aller Portfolio-Einträge"""
+@async_view
+async def update_portfolio_prices():
+    """Aktualisiert die Kurse aller Portfolio-Einträge des aktuellen Benutzers"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_entries()
         
         if not entries:
             return jsonify({
@@ -154,7 +261,7 @@ def update_portfolio_prices():
         symbols = list(set(entry.symbol for entry in entries))
         
         # Hole aktuelle Kurse
-        quotes = finnhub_service.get_multiple_quotes(symbols)
+        quotes = await _multiple_quotes(symbols)
         
         updated_count = 0
         for entry in entries:
@@ -163,6 +270,7 @@ def update_portfolio_prices():
                 updated_count += 1
         
         db.session.commit()
+        invalidate_user_cache()
         
         return jsonify({
             'success': True,
@@ -193,7 +301,7 @@ def compare_with_etf():
             }), 400
         
         # Portfolio-Performance berechnen
-        entries = PortfolioEntry.query.all()
+        entries = user_lots()
         if not entries:
             return jsonify({
                 'success': False,
@@ -1,30 +1,108 @@
-import requests
+import asyncio
 from datetime import datetime, timedelta
+import os
+import threading
 import time
 from typing import Dict, List, Optional
+from src.services.metrics_service import record_upstream
+
+class RateLimiter:
+    """Thread-sicherer Token-Bucket, den alle Instanzen eines Anbieters teilen
+
+    Der Bucket füllt sich nur so schnell nach, dass Burst plus Nachschub in
+    keiner Minute mehr als requests_per_minute Anfragen ergeben; ein größerer
+    Burst senkt daher die Dauerrate.
+    """
+
+    def __init__(self, requests_per_minute: int, burst: int = 1):
+        burst = max(1, min(burst, requests_per_minute))
+        self.interval = 60.0 / (requests_per_minute - burst + 1)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Reserviert einen Slot und gibt die nötige Wartezeit in Sekunden zurück"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) / self.interval)
+            self._last_refill = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * self.interval
+
+    def acquire(self) -> float:
+        """Blockiert bis ein Slot frei ist und gibt die Wartezeit zurück"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Wie acquire, blockiert aber nur die Coroutine statt den Thread"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+# Ein Budget pro Anbieter, damit parallele Abrufe das Limit gemeinsam einhalten
+FINNHUB_RATE_LIMITER = RateLimiter(
+    requests_per_minute=int(os.environ.get('FINNHUB_RATE_LIMIT', 60)),
+    burst=int(os.environ.get('FINNHUB_RATE_BURST', 5)))
+ALPHA_VANTAGE_RATE_LIMITER = RateLimiter(
+    requests_per_minute=int(os.environ.get('ALPHA_VANTAGE_RATE_LIMIT', 5)), burst=1)
+
+def candle_params(symbol: str, days: int) -> Dict:
+    """Parameter für tägliche Kerzen der letzten `days` Tage (Finnhub /stock/candle)"""
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+    return {
+        'symbol': symbol,
+        'resolution': 'D',  # Tägliche Daten
+        'from': int(start_date.timestamp()),
+        'to': int(end_date.timestamp())
+    }
+
+def parse_candles(data: Optional[Dict]) -> Optional[List[Dict]]:
+    """Konvertiert eine Finnhub-Kerzenantwort zu einer Liste von Dictionaries"""
+    if not data or data.get('s') != 'ok':
+        return None
+    historical_data = []
+    for i in range(len(data['t'])):
+        historical_data.append({
+            'date': datetime.fromtimestamp(data['t'][i]).strftime('%Y-%m-%d'),
+            'open': data['o'][i],
+            'high': data['h'][i],
+            'low': data['l'][i],
+            'close': data['c'][i],
+            'volume': data['v'][i]
+        })
+    return historical_data
 
 class MarketDataService:
     def __init__(self, api_key: str = None):
         # Finnhub API - kostenlos mit 60 Anfragen/Minute
-        self.finnhub_api_key = api_key or "demo"  # Demo-Key für Tests
-        self.finnhub_base_url = "https://finnhub.io/api/v1"
+        self.finnhub_api_key = api_key or os.environ.get('FINNHUB_API_KEY', "demo")  # Demo-Key für Tests
+        self.finnhub_base_url = os.environ.get('FINNHUB_BASE_URL', "https://finnhub.io/api/v1")
         
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 1.1  # Etwas mehr als 1 Sekunde für 60 req/min
+        # Rate limiting (geteilt mit allen anderen Finnhub-Instanzen)
+        self.rate_limiter = FINNHUB_RATE_LIMITER
         
     def _make_request(self, url: str, params: Dict) -> Optional[Dict]:
         """Macht eine API-Anfrage mit Rate Limiting"""
+        sleep_seconds = 0.0
+        started = time.perf_counter()
         try:
             # Rate limiting
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            if time_since_last < self.min_request_interval:
-                time.sleep(self.min_request_interval - time_since_last)
+            sleep_seconds = self.rate_limiter.acquire()
             
             params['token'] = self.finnhub_api_key
+            started = time.perf_counter()
+            import requests  # erst beim ersten Upstream-Aufruf laden
             response = requests.get(url, params=params, timeout=10)
-            self.last_request_time = time.time()
+            record_upstream('finnhub', time.perf_counter() - started, sleep_seconds, str(response.status_code))
             
             if response.status_code == 200:
                 return response.json()
@@ -33,6 +111,7 @@ class MarketDataService:
                 return None
                 
         except Exception as e:
+            record_upstream('finnhub', time.perf_counter() - started, sleep_seconds, 'error')
             print(f"Request error: {str(e)}")
             return None
     
@@ -48,32 +127,9 @@ class MarketDataService:
     
     def get_historical_data(self, symbol: str, days: int = 365) -> Optional[List[Dict]]:
         """Holt historische Kursdaten für ein Symbol"""
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
         url = f"{self.finnhub_base_url}/stock/candle"
-        params = {
-            'symbol': symbol,
-            'resolution': 'D',  # Tägliche Daten
-            'from': int(start_date.timestamp()),
-            'to': int(end_date.timestamp())
-        }
-        
-        data = self._make_request(url, params)
-        if data and data.get('s') == 'ok':
-            # Konvertiere zu Liste von Dictionaries
-            historical_data = []
-            for i in range(len(data['t'])):
-                historical_data.append({
-                    'date': datetime.fromtimestamp(data['t'][i]).strftime('%Y-%m-%d'),
-                    'open': data['o'][i],
-                    'high': data['h'][i],
-                    'low': data['l'][i],
-                    'close': data['c'][i],
-                    'volume': data['v'][i]
-                })
-            return historical_data
-        return None
+        data = self._make_request(url, candle_params(symbol, days))
+        return parse_candles(data)
     
     def search_symbol(self, query: str) -> List[Dict]:
         """Sucht nach Aktien-/ETF-Symbolen"""
@@ -86,12 +142,12 @@ class MarketDataService:
         return []
     
     def get_company_profile(self, symbol: str) -> Optional[Dict]:
-        """Holt Unternehmensinformationen"""
+        """Holt Unternehmensinformationen (für wiederholte Abrufe: ProfileCache)"""
         url = f"{self.finnhub_base_url}/stock/profile2"
         params = {'symbol': symbol}
         
-        data = self._make_request(url, params)
-        return data if data else None
+        # Leeres Dictionary = unbekanntes Symbol, None = Anfrage fehlgeschlagen
+        return self._make_request(url, params)
     
     def get_multiple_quotes(self, symbols: List[str]) -> Dict[str, float]:
         """Holt aktuelle Kurse für mehrere Symbole"""
@@ -168,23 +224,23 @@ class MarketDataService:
 # Alpha Vantage als Fallback (falls Finnhub nicht verfügbar)
 class AlphaVantageService:
     def __init__(self, api_key: str = None):
-        self.api_key = api_key or "demo"
-        self.base_url = "https://www.alphavantage.co/query"
-        self.last_request_time = 0
-        self.min_request_interval = 12  # 5 Anfragen pro Minute = 12 Sekunden zwischen Anfragen
+        self.api_key = api_key or os.environ.get('ALPHA_VANTAGE_API_KEY', "demo")
+        self.base_url = os.environ.get('ALPHA_VANTAGE_BASE_URL', "https://www.alphavantage.co/query")
+        self.rate_limiter = ALPHA_VANTAGE_RATE_LIMITER  # 5 Anfragen pro Minute
     
     def _make_request(self, params: Dict) -> Optional[Dict]:
         """Macht eine API-Anfrage mit Rate Limiting"""
+        sleep_seconds = 0.0
+        started = time.perf_counter()
         try:
             # Rate limiting für Alpha Vantage (5 req/min)
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            if time_since_last < self.min_request_interval:
-                time.sleep(self.min_request_interval - time_since_last)
+            sleep_seconds = self.rate_limiter.acquire()
             
             params['apikey'] = self.api_key
+            started = time.perf_counter()
+            import requests
             response = requests.get(self.base_url, params=params, timeout=15)
-            self.last_request_time = time.time()
+            record_upstream('alpha_vantage', time.perf_counter() - started, sleep_seconds, str(response.status_code))
             
             if response.status_code == 200:
                 return response.json()
@@ -193,6 +249,7 @@ class AlphaVantageService:
                 return None
                 
         except Exception as e:
+            record_upstream('alpha_vantage', time.perf_counter() - started, sleep_seconds, 'error')
             print(f"Alpha Vantage request error: {str(e)}")
             return None
     
@@ -0,0 +1,77 @@
+import json
+from flask import Blueprint, Response, jsonify, request
+from src.services.metrics_service import metrics
+from src.services.profiler_service import FORMATS, profiler
+from src.services.service_registry import startup_profile
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Gibt alle Metriken im Prometheus-Textformat zurück"""
+    if not metrics.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Metriken sind deaktiviert (METRICS_ENABLED)'
+        }), 404
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/metrics/startup', methods=['GET'])
+def get_startup_profile():
+    """Gibt die Dauer der Startphasen und der verzögert erzeugten Dienste zurück"""
+    if not metrics.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Metriken sind deaktiviert (METRICS_ENABLED)'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': startup_profile.report()
+    })
+
+@metrics_bp.route('/metrics/profiles', methods=['GET'])
+def get_profiles():
+    """Listet die langsamsten und die letzten profilierten Anfragen"""
+    if not profiler.authorized(request):
+        return jsonify({
+            'success': False,
+            'error': 'Profiling ist deaktiviert (PROFILING_ENABLED) oder das Token fehlt'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'slowest': [profile.summary() for profile in profiler.store.slowest()],
+            'recent': [profile.summary() for profile in profiler.store.recent()]
+        }
+    })
+
+@metrics_bp.route('/metrics/profiles/<int:profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Gibt ein gespeichertes Profil als Collapsed-Stacks oder Speedscope-Datei zurück (?format=)"""
+    if not profiler.authorized(request):
+        return jsonify({
+            'success': False,
+            'error': 'Profiling ist deaktiviert (PROFILING_ENABLED) oder das Token fehlt'
+        }), 404
+
+    profile = profiler.store.get(profile_id)
+    if profile is None:
+        return jsonify({
+            'success': False,
+            'error': 'Profil nicht gefunden'
+        }), 404
+
+    output = request.args.get('format', 'speedscope')
+    if output not in FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f"format muss einer von {', '.join(FORMATS)} sein"
+        }), 400
+    if output == 'collapsed':
+        return Response(profile.collapsed(), mimetype='text/plain')
+    return Response(json.dumps(profile.speedscope()), mimetype='application/json', headers={
+        'Content-Disposition': f'attachment; filename=profile-{profile.id}.speedscope.json'
+    })
@@ -0,0 +1,244 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+def _format_labels(label_names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(label_names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str, label_names: Iterable[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not self.registry.enabled:
+            return
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.label_names, key)} {value}'
+
+class Histogram:
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str,
+                 label_names: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            values = {key: (list(state[0]), state[1], state[2]) for key, state in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            yield f'{self.name}_bucket{labels} {count}'
+            yield f'{self.name}_sum{_format_labels(self.label_names, key)} {total}'
+            yield f'{self.name}_count{_format_labels(self.label_names, key)} {count}'
+
+class MetricsRegistry:
+    """Minimale Prometheus-kompatible Metriken; deaktiviert kostet jede Messung nur eine Abfrage"""
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, label_names: Iterable[str] = ()) -> Counter:
+        metric = Counter(self, name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.histogram(
+    'portfolio_http_request_seconds', 'Latenz pro Route', ('method', 'route', 'status'))
+REQUEST_DB_QUERIES = metrics.histogram(
+    'portfolio_http_request_db_queries', 'Datenbankabfragen pro Anfrage', ('route',), COUNT_BUCKETS)
+DB_QUERY_SECONDS = metrics.histogram(
+    'portfolio_db_query_seconds', 'Dauer einzelner Datenbankabfragen')
+UPSTREAM_REQUESTS = metrics.counter(
+    'portfolio_upstream_requests_total', 'Upstream-Aufrufe pro Anbieter', ('provider', 'status'))
+UPSTREAM_SECONDS = metrics.histogram(
+    'portfolio_upstream_request_seconds', 'Latenz der Upstream-Aufrufe', ('provider',))
+UPSTREAM_SLEEP_SECONDS = metrics.counter(
+    'portfolio_upstream_rate_limit_sleep_seconds_total', 'Wartezeit durch Rate Limiting', ('provider',))
+OCR_STAGE_SECONDS = metrics.histogram(
+    'portfolio_ocr_stage_seconds', 'Dauer der OCR-Verarbeitungsschritte', ('stage',))
+CACHE_REQUESTS = metrics.counter(
+    'portfolio_cache_requests_total', 'Cache-Zugriffe nach Ergebnis', ('cache', 'result'))
+
+class RequestTimings:
+    """Summen einer einzelnen Anfrage für den Server-Timing-Header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.values: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.values.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def header(self) -> str:
+        total = time.perf_counter() - self.started
+        parts = [f'app;dur={total * 1000:.1f}']
+        for name, (seconds, count) in sorted(self.values.items()):
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{count}x"')
+        return ', '.join(parts)
+
+current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    'current_timings', default=None)
+# Stichproben-Profiler der laufenden Anfrage (profiler_service.StackSampler) oder None
+current_sampler: contextvars.ContextVar = contextvars.ContextVar('current_sampler', default=None)
+
+@contextmanager
+def sampled_thread():
+    """Meldet den aktuellen Thread beim Profiler der Anfrage an, solange er für sie arbeitet"""
+    sampler = current_sampler.get()
+    if sampler is None:
+        yield
+        return
+    thread_id = sampler.enter()
+    try:
+        yield
+    finally:
+        sampler.exit(thread_id)
+
+def _run_sampled(fn, *args, **kwargs):
+    with sampled_thread():
+        return fn(*args, **kwargs)
+
+def bind_context(fn):
+    """Überträgt den Anfragekontext (Zeitmessung, Profiler) in Worker-Threads"""
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.copy().run(_run_sampled, fn, *args, **kwargs)
+    return wrapper
+
+def record_upstream(provider: str, seconds: float, sleep_seconds: float, status: str):
+    if not metrics.enabled:
+        return
+    UPSTREAM_REQUESTS.inc(provider=provider, status=status)
+    UPSTREAM_SECONDS.observe(seconds, provider=provider)
+    if sleep_seconds > 0:
+        UPSTREAM_SLEEP_SECONDS.inc(sleep_seconds, provider=provider)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(provider, seconds)
+        if sleep_seconds > 0:
+            timings.add(f'{provider}-ratelimit', sleep_seconds)
+
+def record_cache(cache: str, hit: bool):
+    if metrics.enabled:
+        CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+def record_ocr_stage(stage: str, seconds: float):
+    if not metrics.enabled:
+        return
+    OCR_STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(f'ocr-{stage}', seconds)
+
+def init_app(app, db):
+    """Aktiviert Metriken, Server-Timing und DB-Messung, falls METRICS_ENABLED gesetzt ist"""
+    from flask import request
+    from sqlalchemy import event
+
+    metrics.enabled = bool(app.config.get('METRICS_ENABLED'))
+    if not metrics.enabled:
+        return
+
+    @app.before_request
+    def start_request_timing():
+        request.environ['metrics.token'] = current_timings.set(RequestTimings())
+
+    @app.after_request
+    def finish_request_timing(response):
+        timings = current_timings.get()
+        if timings is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - timings.started,
+                                method=request.method, route=route, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(timings.values.get('db', [0.0, 0])[1], route=route)
+        response.headers['Server-Timing'] = timings.header()
+        return response
+
+    @app.teardown_request
+    def reset_request_timing(exc):
+        token = request.environ.pop('metrics.token', None)
+        if token is not None:
+            current_timings.reset(token)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['metrics_started'].pop()
+        DB_QUERY_SECONDS.observe(seconds)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add('db', seconds)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
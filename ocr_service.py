@@ -1,31 +1,114 @@
-import pytesseract
-from PIL import Image
+import io
 import re
+import subprocess
+import threading
+from tempfile import SpooledTemporaryFile
 from datetime import datetime
-from dateutil import parser
 import os
+import time
+from src.services.metrics_service import record_ocr_stage
+
+# Obergrenze, bis zu der Uploads im Speicher statt in einer temporären Datei gepuffert werden
+DEFAULT_UPLOAD_SPOOL_SIZE = 16 * 1024 * 1024
 
 class OCRService:
     def __init__(self):
         # Konfiguration für deutsche Texterkennung
         self.tesseract_config = '--oem 3 --psm 6 -l deu+eng'
+        self.tesseract_language = 'deu+eng'
+        self._tesserocr = threading.local()  # PyTessBaseAPI ist nicht thread-sicher
     
-    def extract_text_from_image(self, image_path):
-        """Extrahiert Text aus einem Bild mit Tesseract OCR"""
+    def load(self):
+        """Importiert den OCR-Stack (tesserocr bzw. pytesseract, PIL, dateutil) vorab; sonst beim ersten Beleg"""
         try:
-            image = Image.open(image_path)
-            # Konvertiere zu RGB falls nötig
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # OCR durchführen
-            text = pytesseract.image_to_string(image, config=self.tesseract_config)
-            return text
+            import tesserocr  # noqa: F401
+        except ImportError:
+            import pytesseract  # noqa: F401
+        from PIL import Image  # noqa: F401
+        from dateutil import parser  # noqa: F401
+    
+    def decode_image(self, source):
+        """Dekodiert Bytes, ein dateiartiges Objekt oder einen Pfad genau einmal zu einem RGB-Bild"""
+        from PIL import Image
+
+        if isinstance(source, Image.Image):
+            image = source
+        else:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                source = io.BytesIO(source)
+            image = Image.open(source)
+            image.load()
+        # Konvertiere zu RGB falls nötig
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
+    
+    def _tesserocr_api(self):
+        import tesserocr
+
+        api = getattr(self._tesserocr, 'api', None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.tesseract_language, psm=tesserocr.PSM.SINGLE_BLOCK,
+                                          oem=tesserocr.OEM.DEFAULT)
+            self._tesserocr.api = api
+        return api
+    
+    def _tesseract_stdin(self, data: bytes) -> str:
+        """Tesseract-CLI über stdin/stdout; anders als pytesseract ohne temporäre Bilddatei"""
+        import pytesseract
+
+        completed = subprocess.run(
+            [pytesseract.pytesseract.tesseract_cmd, 'stdin', 'stdout', *self.tesseract_config.split()],
+            input=data, capture_output=True, timeout=120
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.decode(errors='replace').strip() or 'tesseract fehlgeschlagen')
+        return completed.stdout.decode('utf-8', errors='replace')
+    
+    def extract_text_from_image(self, source):
+        """Extrahiert Text aus einem Bild mit Tesseract OCR
+
+        source: Bytes, dateiartiges Objekt (z.B. der Upload-Stream), PIL-Bild oder Pfad.
+        Mit tesserocr läuft die Erkennung im Prozess auf dem dekodierten Bild,
+        sonst bekommt die Tesseract-CLI die Originalbytes über stdin.
+        """
+        try:
+            try:
+                import tesserocr  # noqa: F401
+            except ImportError:
+                tesserocr = None
+
+            if tesserocr is not None:
+                api = self._tesserocr_api()
+                api.SetImage(self.decode_image(source))
+                return api.GetUTF8Text()
+
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                data = bytes(source)
+            elif hasattr(source, 'read'):
+                data = source.read()
+            elif isinstance(source, str):
+                with open(source, 'rb') as handle:
+                    data = handle.read()
+            else:
+                data = None
+            if data is not None:
+                try:
+                    return self._tesseract_stdin(data)
+                except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+                    # Tesseract < 4 kennt kein stdin: Fallback über pytesseract
+                    print(f"Tesseract stdin nicht verfügbar: {str(e)}")
+                    source = data
+
+            import pytesseract
+            return pytesseract.image_to_string(self.decode_image(source), config=self.tesseract_config)
         except Exception as e:
             raise Exception(f"Fehler bei der OCR-Verarbeitung: {str(e)}")
     
     def parse_investment_document(self, text):
         """Parst den extrahierten Text und sucht nach Investitionsdaten"""
+        from dateutil import parser
+
         result = {
             'symbol': None,
             'company_name': None,
@@ -33,6 +116,7 @@ class OCRService:
             'purchase_price': None,
             'quantity': None,
             'total_value': None,
+            'currency': None,
             'confidence': 0
         }
         
@@ -110,6 +194,12 @@ class OCRService:
                 except:
                     continue
         
+        # Währung des Belegs (erste Angabe), damit EUR-Belege nicht als USD gelten
+        currency_match = re.search(r'(€|\bEUR\b|\$|\bUSD\b|£|\bGBP\b|\bCHF\b)', text, re.IGNORECASE)
+        if currency_match:
+            token = currency_match.group(1).upper()
+            result['currency'] = {'€': 'EUR', '$': 'USD', '£': 'GBP'}.get(token, token)
+        
         # Suche nach Menge/Anzahl
         quantity_patterns = [
             r'(?:Anzahl|Quantity|Stück|Shares|Menge)[:\s]*([0-9]+[,.]?[0-9]*)',
@@ -151,14 +241,18 @@ class OCRService:
         
         return result
     
-    def process_investment_document(self, image_path):
-        """Vollständige Verarbeitung eines Investitionsbelegs"""
+    def process_investment_document(self, source):
+        """Vollständige Verarbeitung eines Investitionsbelegs (Bytes, Stream oder Pfad)"""
         try:
             # Text extrahieren
-            text = self.extract_text_from_image(image_path)
+            started = time.perf_counter()
+            text = self.extract_text_from_image(source)
+            record_ocr_stage('extract', time.perf_counter() - started)
             
             # Investitionsdaten parsen
+            started = time.perf_counter()
             parsed_data = self.parse_investment_document(text)
+            record_ocr_stage('parse', time.perf_counter() - started)
             
             return {
                 'success': True,
@@ -174,3 +268,20 @@ class OCRService:
                 'message': 'Fehler bei der Dokumentenverarbeitung'
             }
 
+
+def _upload_request_class(base):
+    class SpooledUploadRequest(base):
+        """Puffert Datei-Uploads bis UPLOAD_SPOOL_SIZE im Speicher (Werkzeug: 500 KB, danach Festplatte)"""
+
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            from flask import current_app
+            return SpooledTemporaryFile(
+                max_size=current_app.config.get('UPLOAD_SPOOL_SIZE', DEFAULT_UPLOAD_SPOOL_SIZE), mode='rb+'
+            )
+
+    return SpooledUploadRequest
+
+def init_app(app):
+    """Hält Uploads bis UPLOAD_SPOOL_SIZE im Speicher, damit die OCR ohne Dateisystem auskommt"""
+    app.config.setdefault('UPLOAD_SPOOL_SIZE', app.config.get('MAX_CONTENT_LENGTH') or DEFAULT_UPLOAD_SPOOL_SIZE)
+    app.request_class = _upload_request_class(app.request_class)
@@ -1,9 +1,20 @@
-from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
-import os
-from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, send_file, stream_with_context
+from datetime import date, datetime
+import numpy as np
 from src.models.portfolio import PortfolioEntry, db
-from src.services.ocr_service import OCRService
+from src.services.alert_service import alert_engine
+from src.services.export_service import (
+    JOB_FORMATS, MIMETYPES, SECTIONS, available, csv_chunks, export_jobs, sections
+)
+from src.services.fx_service import converter_for, entry_currencies, normalize_currency, reporting_currency
+from src.services.profile_service import profile_cache
+from src.services.service_registry import services
+from src.services.snapshot_service import snapshot_service
+from src.services.transaction_service import cost_basis_method, ledger_for, transaction_service
+from src.services.tenant_service import (
+    assign_owner, current_user_id, delete_entries, invalidate_user_cache, portfolio_query, user_cached, user_entries,
+    user_lots
+)
 
 portfolio_bp = Blueprint('portfolio', __name__)
 
@@ -16,12 +27,13 @@ def allowed_file(filename):
 
 @portfolio_bp.route('/portfolio', methods=['GET'])
 def get_portfolio():
-    """Gibt alle Portfolio-Einträge zurück"""
+    """Gibt alle Portfolio-Einträge des aktuellen Benutzers zurück"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_entries()
+        currencies = entry_currencies(entries)
         return jsonify({
             'success': True,
-            'data': [entry.to_dict() for entry in entries],
+            'data': [{**entry.to_dict(), 'currency': currencies.get(entry.id)} for entry in entries],
             'total_entries': len(entries)
         })
     except Exception as e:
@@ -54,6 +66,14 @@ def add_portfolio_entry():
                 'error': 'Ungültiges Datumsformat. Verwenden Sie YYYY-MM-DD'
             }), 400
         
+        # Kaufwährung (optional, ISO-Code); ohne Angabe gilt die Handelswährung des Symbols
+        currency = normalize_currency(data.get('currency'))
+        if data.get('currency') and currency is None:
+            return jsonify({
+                'success': False,
+                'error': 'Ungültige Währung. Verwenden Sie einen ISO-Code wie EUR oder USD'
+            }), 400
+        
         # Portfolio-Eintrag erstellen
         entry = PortfolioEntry(
             symbol=data['symbol'],
@@ -64,11 +84,19 @@ def add_portfolio_entry():
         )
         
         db.session.add(entry)
+        assign_owner(entry, currency)
+        # Rückdatierte Käufe: gespeicherte Tagesstände ab dem Kaufdatum neu berechnen
+        snapshot_service.invalidate_from(current_user_id(), purchase_date)
         db.session.commit()
+        invalidate_user_cache()
+        # Profil (Handelswährung) im Hintergrund laden, Umrechnungen lesen nur den Cache
+        profile_cache.prefetch([entry.symbol])
+        # G/V-Alarme hängen am Einstand
+        alert_engine.positions_changed(current_user_id())
         
         return jsonify({
             'success': True,
-            'data': entry.to_dict(),
+            'data': {**entry.to_dict(), 'currency': currency},
             'message': 'Portfolio-Eintrag erfolgreich hinzugefügt'
         }), 201
         
@@ -83,9 +111,27 @@ def add_portfolio_entry():
 def delete_portfolio_entry(entry_id):
     """Löscht einen Portfolio-Eintrag"""
     try:
-        entry = PortfolioEntry.query.get_or_404(entry_id)
-        db.session.delete(entry)
+        # Nur Einträge des aktuellen Benutzers sind sichtbar und löschbar
+        entry = portfolio_query().filter(PortfolioEntry.id == entry_id).first_or_404()
+        delete_entries([entry.id])
+        transaction_service.invalidate(current_user_id())
+        # Ein Kauf, den ein verbuchter Verkauf bereits verbraucht hat, darf nicht verschwinden
+        entries = user_entries()
+        try:
+            ledger_for(entries, converter_for(entries))
+        except ValueError as e:
+            db.session.rollback()
+            transaction_service.invalidate(current_user_id())
+            return jsonify({
+                'success': False,
+                'error': f'Eintrag kann nicht gelöscht werden: {str(e)}'
+            }), 400
+
+        snapshot_service.invalidate_from(current_user_id(), entry.purchase_date)
         db.session.commit()
+        transaction_service.deleted(current_user_id())
+        invalidate_user_cache()
+        alert_engine.positions_changed(current_user_id())
         
         return jsonify({
             'success': True,
@@ -124,28 +170,10 @@ def upload_investment_document():
                 'error': f'Dateityp nicht erlaubt. Erlaubte Typen: {", ".join(ALLOWED_EXTENSIONS)}'
             }), 400
         
-        # Sichere Dateinamen erstellen
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        
-        # Upload-Verzeichnis erstellen falls nicht vorhanden
-        upload_folder = os.path.join(current_app.root_path, 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        # Datei speichern
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-        
-        # OCR-Verarbeitung
-        ocr_service = OCRService()
-        result = ocr_service.process_investment_document(file_path)
-        
-        # Datei nach Verarbeitung löschen (optional)
-        try:
-            os.remove(file_path)
-        except:
-            pass
+        # OCR direkt auf dem (im Speicher gepufferten) Upload, ohne Datei in uploads/
+        # OCR-Stack wird erst beim ersten Upload geladen
+        ocr_service = services.get('ocr')
+        result = ocr_service.process_investment_document(file.read())
         
         if not result['success']:
             return jsonify(result), 500
@@ -170,9 +198,14 @@ def upload_investment_document():
                 )
                 
                 db.session.add(entry)
+                assign_owner(entry, parsed_data.get('currency'))
+                snapshot_service.invalidate_from(current_user_id(), parsed_data['purchase_date'])
                 db.session.commit()
+                invalidate_user_cache()
+                profile_cache.prefetch([entry.symbol])
+                alert_engine.positions_changed(current_user_id())
                 
-                result['auto_created_entry'] = entry.to_dict()
+                result['auto_created_entry'] = {**entry.to_dict(), 'currency': parsed_data.get('currency')}
                 result['message'] += ' - Portfolio-Eintrag automatisch erstellt'
                 auto_created = True
                 
@@ -192,10 +225,15 @@ def upload_investment_document():
 
 @portfolio_bp.route('/portfolio/clear', methods=['DELETE'])
 def clear_portfolio():
-    """Löscht alle Portfolio-Einträge"""
+    """Löscht alle Portfolio-Einträge des aktuellen Benutzers"""
     try:
-        PortfolioEntry.query.delete()
+        delete_entries([entry_id for (entry_id,) in portfolio_query().with_entities(PortfolioEntry.id)])
+        snapshot_service.clear(current_user_id())
+        transaction_service.clear(current_user_id())
         db.session.commit()
+        transaction_service.deleted(current_user_id())
+        invalidate_user_cache()
+        alert_engine.positions_changed(current_user_id())
         
         return jsonify({
             'success': True,
@@ -210,10 +248,11 @@ def clear_portfolio():
         }), 500
 
 @portfolio_bp.route('/portfolio/stats', methods=['GET'])
+@user_cached
 def get_portfolio_stats():
     """Gibt Portfolio-Statistiken zurück"""
     try:
-        entries = PortfolioEntry.query.all()
+        entries = user_lots()
         
         if not entries:
             return jsonify({
@@ -227,19 +266,33 @@ def get_portfolio_stats():
                 }
             })
         
-        total_invested = sum(entry.total_value for entry in entries)
-        current_value = sum(entry.current_value for entry in entries if entry.current_value)
+        # Einstände zum Kurs des Kauftags, aktuelle Werte zum heutigen Kurs in die Berichtswährung;
+        # verkaufte Anteile gehen über den Ledger (FIFO oder Durchschnittskosten) als realisiert ein
+        converter = converter_for(entries)
+        ledger = ledger_for(entries, converter)
+        cost_fractions, quantity_factors = ledger.lot_factors(entries)
+        total_invested = float((converter.invested() * cost_fractions).sum())
+        current_value = float(np.nansum(converter.current() * quantity_factors))
         total_profit_loss = current_value - total_invested if current_value else 0
         total_profit_loss_percent = (total_profit_loss / total_invested * 100) if total_invested > 0 else 0
+        realized = ledger.summary()
         
         return jsonify({
             'success': True,
             'data': {
                 'total_entries': len(entries),
+                'open_positions': len(ledger.open_quantities()),
                 'total_invested': round(total_invested, 2),
                 'current_value': round(current_value, 2) if current_value else 0,
                 'total_profit_loss': round(total_profit_loss, 2),
-                'total_profit_loss_percent': round(total_profit_loss_percent, 2)
+                'total_profit_loss_percent': round(total_profit_loss_percent, 2),
+                'realized_profit_loss': round(realized['realized_profit_loss'], 2),
+                'dividends': round(realized['dividends'], 2),
+                'total_return': round(total_profit_loss + realized['realized_profit_loss'] + realized['dividends'], 2),
+                'cost_basis_method': ledger.method,
+                'currency': converter.target,
+                # Symbole ohne bekannte Handelswährung (als USD gerechnet, Profil wird nachgeladen)
+                'unresolved_currencies': sorted(converter.unresolved)
             }
         })
         
@@ -249,3 +302,134 @@ def get_portfolio_stats():
             'error': str(e)
         }), 500
 
+def _export_options(data):
+    """Abschnitte, Berichtswährung und Einstandsverfahren eines Exports; ValueError bei ungültigen Angaben"""
+    names = data.get('sections') or SECTIONS
+    if isinstance(names, str):
+        names = names.split(',')
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unbekannte Abschnitte: {', '.join(unknown)}. Erlaubt: {', '.join(SECTIONS)}")
+    currency = reporting_currency(data.get('currency'), current_app.config.get('REPORTING_CURRENCY'))
+    return [name for name in SECTIONS if name in names], currency, cost_basis_method()
+
+@portfolio_bp.route('/portfolio/export', methods=['GET'])
+def export_portfolio():
+    """Streamt Positionen, Buchungen und Tagesstände als CSV (?sections=positions,transactions,performance)"""
+    try:
+        if request.args.get('format', 'csv') != 'csv':
+            return jsonify({
+                'success': False,
+                'error': 'XLSX und PDF werden per POST /api/portfolio/export im Hintergrund erstellt'
+            }), 400
+        try:
+            names, currency, method = _export_options(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        user_id = current_user_id()
+        # Positionen vor den Headern berechnen, damit Ledger-Fehler nicht in einer abgeschnittenen Datei enden
+        try:
+            report = sections(user_id, currency, method, names)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        # Gestreamt werden die gespeicherten Tagesstände; fehlende kommen im Hintergrund hinzu
+        if 'performance' in names:
+            export_jobs.refresh_snapshots(user_id, currency)
+
+        # Buchungen und Tagesstände werden erst beim Senden abgefragt und stückweise geschrieben
+        return Response(
+            stream_with_context(csv_chunks(report)),
+            mimetype=MIMETYPES['csv'],
+            headers={'Content-Disposition': f'attachment; filename=portfolio-{date.today().isoformat()}.csv'}
+        )
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@portfolio_bp.route('/portfolio/export', methods=['POST'])
+def create_portfolio_export():
+    """Startet einen XLSX- oder PDF-Export im Hintergrund"""
+    try:
+        data = request.json or {}
+        export_format = data.get('format')
+        if export_format not in JOB_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"format muss einer von {', '.join(JOB_FORMATS)} sein (CSV per GET)"
+            }), 400
+        if not available(export_format):
+            return jsonify({
+                'success': False,
+                'error': f'{JOB_FORMATS[export_format]} ist nicht installiert'
+            }), 501
+        try:
+            names, currency, method = _export_options(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        job = export_jobs.submit(current_user_id(), export_format, currency, method, names)
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        }), 202
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@portfolio_bp.route('/portfolio/export/<job_id>', methods=['GET'])
+def get_portfolio_export(job_id):
+    """Status eines Hintergrund-Exports"""
+    try:
+        job = export_jobs.get(job_id, current_user_id())
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Export nicht gefunden'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@portfolio_bp.route('/portfolio/export/<job_id>/download', methods=['GET'])
+def download_portfolio_export(job_id):
+    """Lädt einen fertigen Hintergrund-Export herunter"""
+    try:
+        job = export_jobs.get(job_id, current_user_id())
+        if job is None or job.status != 'done':
+            return jsonify({
+                'success': False,
+                'error': 'Export nicht gefunden oder noch nicht fertig'
+            }), 404
+
+        return send_file(job.path, mimetype=MIMETYPES[job.format], as_attachment=True,
+                         download_name=f'portfolio-{date.today().isoformat()}.{job.format}')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
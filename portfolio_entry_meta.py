@@ -0,0 +1,26 @@
+from sqlalchemy import inspect, text
+from src.models.user import db
+
+class PortfolioEntryMeta(db.Model):
+    """Zusatzdaten je Portfolio-Eintrag, u.a. der Besitzer
+
+    Eigene Tabelle, damit bestehende Datenbanken ohne Migration weiterlaufen
+    (db.create_all legt nur fehlende Tabellen an). Einträge ohne Zeile hier
+    oder ohne user_id gehören zum gemeinsamen Portfolio ohne Benutzer.
+    """
+    __tablename__ = 'portfolio_entry_meta'
+
+    entry_id = db.Column(db.Integer, db.ForeignKey('portfolio_entry.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True, index=True)
+    # ISO-Code der Kaufwährung; None = Handelswährung des Symbols
+    currency = db.Column(db.String(3), nullable=True)
+
+    def __repr__(self):
+        return f'<PortfolioEntryMeta {self.entry_id} user={self.user_id}>'
+
+def upgrade_schema(engine):
+    """Ergänzt Spalten, die nach dem ersten Anlegen der Tabelle hinzugekommen sind"""
+    columns = {column['name'] for column in inspect(engine).get_columns(PortfolioEntryMeta.__tablename__)}
+    if 'currency' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE portfolio_entry_meta ADD COLUMN currency VARCHAR(3)'))
@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+from sqlalchemy import inspect, text
+from src.models.user import db
+
+SHARED_DAY_INDEX = 'uq_portfolio_snapshot_shared_day'
+
+class PortfolioSnapshot(db.Model):
+    """Tagesendstand eines Portfolios (pro Benutzer und Berichtswährung)"""
+    __tablename__ = 'portfolio_snapshot'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'currency', 'snapshot_date', name='uq_portfolio_snapshot_day'),
+        # NULL gilt in UNIQUE als verschieden; das gemeinsame Portfolio braucht einen eigenen Index
+        db.Index(SHARED_DAY_INDEX, 'currency', 'snapshot_date', unique=True,
+                 sqlite_where=text('user_id IS NULL'), postgresql_where=text('user_id IS NULL')),
+        db.Index('ix_portfolio_snapshot_range', 'user_id', 'currency', 'snapshot_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True)
+    currency = db.Column(db.String(3), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    total_value = db.Column(db.Float, nullable=False)
+    invested = db.Column(db.Float, nullable=False)
+    cash_flow = db.Column(db.Float, nullable=False, default=0.0)
+    positions = db.Column(db.Text, nullable=False, default='{}')  # JSON: Symbol -> Marktwert
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PortfolioSnapshot {self.user_id} {self.snapshot_date} {self.total_value}>'
+
+    def to_dict(self):
+        return {
+            'date': self.snapshot_date.isoformat(),
+            'total_value': self.total_value,
+            'invested': self.invested,
+            'cash_flow': self.cash_flow,
+            'positions': json.loads(self.positions),
+            'currency': self.currency
+        }
+
+def upgrade_schema(engine):
+    """Legt den Index für das gemeinsame Portfolio in bestehenden Datenbanken an
+
+    Doppelte Tage aus der Zeit davor werden zuvor entfernt, der zuletzt gespeicherte bleibt.
+    """
+    if SHARED_DAY_INDEX in {index['name'] for index in inspect(engine).get_indexes(PortfolioSnapshot.__tablename__)}:
+        return
+    with engine.begin() as connection:
+        connection.execute(text(
+            'DELETE FROM portfolio_snapshot WHERE user_id IS NULL AND id NOT IN '
+            '(SELECT MAX(id) FROM portfolio_snapshot WHERE user_id IS NULL GROUP BY currency, snapshot_date)'
+        ))
+        next(index for index in PortfolioSnapshot.__table__.indexes if index.name == SHARED_DAY_INDEX) \
+            .create(connection)
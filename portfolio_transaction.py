@@ -0,0 +1,36 @@
+from datetime import datetime
+from src.models.user import db
+
+class PortfolioTransaction(db.Model):
+    """Verkauf, Dividende oder Aktiensplit zu einem Symbol; Käufe bleiben PortfolioEntry-Lots"""
+    __tablename__ = 'portfolio_transaction'
+    __table_args__ = (
+        db.Index('ix_portfolio_transaction_owner', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    type = db.Column(db.String(10), nullable=False)  # sell | dividend | split
+    trade_date = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Float, nullable=True)  # Verkauf: Stück; Dividende: Stück (leer = gehaltener Bestand)
+    price = db.Column(db.Float, nullable=True)  # Verkauf: Kurs; Dividende: Betrag je Stück (Handelswährung)
+    ratio = db.Column(db.Float, nullable=True)  # Split: neue Stück je alter Aktie (z.B. 4 bei 4:1)
+    fees = db.Column(db.Float, nullable=False, default=0.0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PortfolioTransaction {self.type} {self.symbol} {self.trade_date}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'type': self.type,
+            'trade_date': self.trade_date.isoformat(),
+            'quantity': self.quantity,
+            'price': self.price,
+            'ratio': self.ratio,
+            'fees': self.fees,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.models.user import db
+from src.models.company_profile import CompanyProfile
+from src.services.market_data_service import MarketDataService
+from src.services.service_registry import services
+from src.services.metrics_service import bind_context, record_cache
+
+class ProfileCache:
+    """Unternehmensprofile mit langer TTL: Speicher -> Datenbank -> Finnhub
+
+    Profile ändern sich praktisch nie, daher werden auch leere Antworten
+    (unbekannte Symbole) gespeichert, um wiederholte Abrufe zu vermeiden.
+    """
+
+    def __init__(self, market_service: MarketDataService, ttl_days: int = 7, max_workers: int = 8,
+                 retry_seconds: int = 300):
+        self.market_service = market_service
+        self.ttl = timedelta(days=ttl_days)
+        self.max_workers = max_workers
+        self.retry_seconds = retry_seconds
+        # Aufgerufen mit den Symbolen, deren Profile im Hintergrund neu geladen wurden
+        self.listeners: List[Callable] = []
+        self._memory: Dict[str, tuple] = {}
+        self._attempted: Dict[str, float] = {}
+        self._app = None
+        self._background = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, fetched_at: datetime) -> bool:
+        return datetime.utcnow() - fetched_at < self.ttl
+
+    def get_cached(self, symbols: Iterable[str], include_stale: bool = True) -> Dict[str, Dict]:
+        """Nur lokal gespeicherte Profile, ohne Netzwerkzugriff"""
+        symbols = set(symbols)
+        found = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._memory.get(symbol)
+                if entry and (include_stale or self._is_fresh(entry[0])):
+                    found[symbol] = entry
+
+        missing = symbols - set(found)
+        if missing:
+            for row in CompanyProfile.query.filter(CompanyProfile.symbol.in_(missing)).all():
+                entry = (row.fetched_at, row.to_dict())
+                with self._lock:
+                    self._memory[row.symbol] = entry
+                if include_stale or self._is_fresh(row.fetched_at):
+                    found[row.symbol] = entry
+
+        return {symbol: data for symbol, (_, data) in found.items()}
+
+    def get_profiles(self, symbols: Iterable[str]) -> Dict[str, Dict]:
+        """Liefert Profile; fehlende oder abgelaufene werden parallel nachgeladen"""
+        symbols = set(symbols)
+        profiles = self.get_cached(symbols, include_stale=False)
+        missing = sorted(symbols - set(profiles))
+        for symbol in symbols:
+            record_cache('profile', symbol not in missing)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                fetched = list(executor.map(bind_context(self.market_service.get_company_profile), missing))
+            self._store({symbol: data for symbol, data in zip(missing, fetched) if data is not None})
+            stale = self.get_cached(missing)
+            profiles.update(stale)
+
+        # Leere Profile (unbekannte Symbole) nicht ausliefern
+        return {symbol: data for symbol, data in profiles.items() if data}
+
+    def get_profile(self, symbol: str) -> Optional[Dict]:
+        return self.get_profiles([symbol]).get(symbol)
+
+    def prefetch(self, symbols: Iterable[str]):
+        """Lädt fehlende Profile im Hintergrund, ohne die Anfrage auf Finnhub warten zu lassen
+
+        Je Symbol höchstens ein Versuch alle `retry_seconds` (Rate-Limit, Ausfälle).
+        """
+        if self._app is None:
+            return
+        now = time.time()
+        with self._lock:
+            symbols = sorted(symbol for symbol in set(symbols)
+                             if now - self._attempted.get(symbol, float('-inf')) >= self.retry_seconds)
+            if not symbols:
+                return
+            for symbol in symbols:
+                self._attempted[symbol] = now
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profiles')
+        self._background.submit(self._prefetch, symbols)
+
+    def _prefetch(self, symbols: List[str]):
+        with self._app.app_context():
+            try:
+                loaded = sorted(self.get_profiles(symbols))
+            except Exception as e:
+                print(f"Fehler beim Nachladen der Profile: {str(e)}")
+                return
+            if not loaded:
+                return
+            for listener in self.listeners:
+                try:
+                    listener(loaded)
+                except Exception as e:
+                    print(f"Fehler nach dem Nachladen der Profile: {str(e)}")
+
+    def _store(self, profiles: Dict[str, Dict]):
+        if not profiles:
+            return
+        now = datetime.utcnow()
+        try:
+            for symbol, data in profiles.items():
+                db.session.merge(CompanyProfile(symbol=symbol, data=json.dumps(data), fetched_at=now))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Profile cache error: {str(e)}")
+        with self._lock:
+            for symbol, data in profiles.items():
+                self._memory[symbol] = (now, data)
+
+# Gemeinsamer Cache für alle Blueprints
+profile_cache = ProfileCache(services.lazy('finnhub'))
+
+def init_app(app):
+    """Hintergrund-Nachladen fehlender Profile mit eigenem App-Kontext"""
+    profile_cache._app = app
@@ -0,0 +1,292 @@
+import heapq
+import hmac
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+FORMATS = ('collapsed', 'speedscope')
+
+# Wurzel des Anwendungspakets, für kurze Dateinamen in den Frame-Bezeichnungen
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StackSampler:
+    """Tastet in einem Hintergrund-Thread die Aufrufstapel ab (Wanduhrzeit)
+
+    Gezählt werden ganze Stapel, daher erscheinen auch Wartezeiten wie das
+    Rate-Limit-Sleep in `_make_request` oder blockierende Datenbankaufrufe.
+    Erfasst werden nur der Anfrage-Thread und Threads, die gerade für diese
+    Anfrage arbeiten (angemeldet über metrics_service.sampled_thread, z.B. per
+    bind_context oder die Event-Loop asynchroner Routen); parallele Anfragen
+    und Hintergrund-Threads bleiben außen vor. Jeder Stapel beginnt mit dem
+    Namen seines Threads.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.interval = interval
+        self.threads: Counter = Counter({thread_id: 1})
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enter(self) -> int:
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.threads[thread_id] += 1
+        return thread_id
+
+    def exit(self, thread_id: int):
+        with self._lock:
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] <= 0:
+                del self.threads[thread_id]
+
+    def start(self) -> 'StackSampler':
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        codes: Dict[object, Tuple[str, str, int]] = {}
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                watched = set(self.threads)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in watched:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    location = codes.get(code)
+                    if location is None:
+                        location = codes[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+                    stack.append(location)
+                    frame = frame.f_back
+                name = names.get(thread_id)
+                if name is None:
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                    name = names.setdefault(thread_id, str(thread_id))
+                stack.append((name, '', 0))
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+class RequestProfile:
+    """Abgetastete Stapel einer Anfrage samt Eckdaten"""
+    __slots__ = ('id', 'method', 'path', 'status', 'duration', 'created_at', 'interval', 'samples', 'stacks')
+
+    def __init__(self, profile_id: int, method: str, path: str, status: int, duration: float,
+                 sampler: StackSampler):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.status = status
+        self.duration = duration
+        self.created_at = datetime.utcnow()
+        self.interval = sampler.interval
+        self.samples = sampler.samples
+        self.stacks = sampler.stacks
+
+    def summary(self) -> Dict:
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'duration_ms': round(self.duration * 1000, 1),
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def collapsed(self) -> str:
+        """Collapsed-Stack-Format (flamegraph.pl, speedscope, inferno): 'a;b;c Anzahl' je Zeile"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = ';'.join(_frame_label(*location) for location in stack)
+            lines.append(f'{frames} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self) -> Dict:
+        """Speedscope-Datei mit einem 'sampled'-Profil je Thread; Gewichte in Sekunden"""
+        frames: List[Dict] = []
+        index: Dict[Tuple[str, str, int], int] = {}
+        threads: Dict[str, Tuple[list, list]] = {}
+        # tatsächlicher Abstand der Stichproben statt des nominellen Intervalls
+        weight = self.duration / self.samples if self.samples else self.interval
+        for stack, count in self.stacks.most_common():
+            sample = []
+            for location in stack[1:]:
+                position = index.get(location)
+                if position is None:
+                    position = index[location] = len(frames)
+                    frames.append({'name': location[0], 'file': location[1], 'line': location[2]})
+                sample.append(position)
+            samples, weights = threads.setdefault(stack[0][0], ([], []))
+            samples.append(sample)
+            weights.append(count * weight)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f'{self.method} {self.path} ({self.status})',
+            'exporter': 'portfolio-manager',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': thread,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights
+            } for thread, (samples, weights) in (threads or {'MainThread': ([], [])}).items()]
+        }
+
+def _frame_label(name: str, filename: str, line: int) -> str:
+    if not filename:
+        return name
+    if filename.startswith(APP_ROOT):
+        filename = os.path.relpath(filename, APP_ROOT)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[-1]
+    else:
+        filename = os.path.basename(filename)
+    return f'{name} ({filename}:{line})'
+
+class ProfileStore:
+    """Die letzten und die langsamsten Profile (je höchstens `keep`)"""
+
+    def __init__(self, keep: int = 20):
+        self.keep = keep
+        self._recent: deque = deque(maxlen=keep)
+        self._slowest: List[Tuple[float, int, RequestProfile]] = []  # Min-Heap nach Dauer
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._recent.append(profile)
+            item = (profile.duration, profile.id, profile)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, item)
+            elif item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        with self._lock:
+            for profile in itertools.chain(self._recent, (item[2] for item in self._slowest)):
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def slowest(self) -> List[RequestProfile]:
+        with self._lock:
+            return [item[2] for item in sorted(self._slowest, reverse=True)]
+
+    def recent(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._recent))
+
+class RequestProfiler:
+    """Profiliert einzelne Anfragen auf Wunsch (Header X-Profile oder ?profile=)
+
+    Ohne PROFILING_ENABLED (bzw. Debug-Modus) werden keine Hooks registriert;
+    aktiviert kostet eine nicht angeforderte Anfrage nur die Prüfung auf das Flag.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.token: Optional[str] = None
+        self.interval = 0.005
+        self.store = ProfileStore()
+
+    def authorized(self, request) -> bool:
+        if not self.enabled:
+            return False
+        if not self.token:
+            return True
+        supplied = request.headers.get(PROFILE_TOKEN_HEADER) or ''
+        return hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def requested(self, request) -> Optional[str]:
+        """'store' oder ein Ausgabeformat, falls die Anfrage profiliert werden soll"""
+        flag = request.headers.get(PROFILE_HEADER) or request.args.get('profile')
+        if not flag or flag == '0':
+            return None
+        return flag if flag in FORMATS else 'store'
+
+profiler = RequestProfiler()
+
+def init_app(app):
+    """Aktiviert das Profiling bei PROFILING_ENABLED oder im Debug-Modus"""
+    from flask import request
+    from src.services.metrics_service import current_sampler
+
+    profiler.enabled = bool(app.config.get('PROFILING_ENABLED') or app.debug)
+    profiler.token = app.config.get('PROFILING_TOKEN')
+    profiler.interval = float(app.config.get('PROFILING_INTERVAL_MS', 5)) / 1000
+    profiler.store = ProfileStore(int(app.config.get('PROFILING_KEEP', 20)))
+    if not profiler.enabled:
+        return
+
+    @app.before_request
+    def start_profile():
+        mode = profiler.requested(request)
+        if mode is None or request.path.startswith('/api/metrics/profiles') or not profiler.authorized(request):
+            return
+        sampler = StackSampler(threading.get_ident(), profiler.interval)
+        request.environ['profile.mode'] = mode
+        request.environ['profile.sampler'] = sampler
+        # Über den Kontext erben von der Anfrage gestartete Threads den Profiler
+        request.environ['profile.token'] = current_sampler.set(sampler)
+        sampler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        sampler = request.environ.pop('profile.sampler', None)
+        if sampler is None:
+            return response
+        sampler.stop()
+        current_sampler.reset(request.environ.pop('profile.token'))
+        profile = RequestProfile(profiler.store.next_id(), request.method, request.full_path.rstrip('?'),
+                                 response.status_code, sampler.duration, sampler)
+        profiler.store.add(profile)
+        mode = request.environ.pop('profile.mode')
+        if mode == 'collapsed':
+            response = app.response_class(profile.collapsed(), mimetype='text/plain')
+        elif mode == 'speedscope':
+            response = app.response_class(json.dumps(profile.speedscope()), mimetype='application/json')
+        response.headers['X-Profile-Id'] = str(profile.id)
+        response.headers['X-Profile-Samples'] = str(profile.samples)
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        # Bei unbehandelten Ausnahmen läuft after_request nicht
+        sampler = request.environ.pop('profile.sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            current_sampler.reset(request.environ.pop('profile.token'))
@@ -0,0 +1,201 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+# Bewusst ohne Flask-/Datenbank-Importe: die Worker-Prozesse rechnen nur mit NumPy. Beim Start per
+# `python main.py` importieren sie main.py zusätzlich als __mp_main__, das dann keine App aufbaut.
+
+PERCENTILES = (5, 25, 50, 75, 95)
+MAX_BAND_POINTS = 64
+# Tage je Block: Zufallszahlen für (Pfade x Block x Symbole) auf einmal erzeugen
+BLOCK_DAYS = 21
+# Obergrenze der Zufallszahlen je Block und Stapel (~16 MB), hält den Speicher pro Worker klein
+BLOCK_ELEMENTS = 2_000_000
+
+def estimate_parameters(closes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mittelwert und Kovarianz der täglichen Log-Renditen (Tage x Symbole, vorwärts gefüllt)"""
+    returns = np.diff(np.log(closes), axis=0)
+    returns = returns[~np.isnan(returns).any(axis=1)]
+    if len(returns) < 2:
+        raise ValueError('Zu wenige gemeinsame Handelstage für eine Schätzung')
+    return returns.mean(axis=0), np.atleast_2d(np.cov(returns, rowvar=False))
+
+def cholesky_factor(covariance: np.ndarray) -> np.ndarray:
+    """Cholesky-Faktor; nicht positiv definite Schätzungen werden über die Eigenwerte repariert"""
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        repaired = eigenvectors @ np.diag(np.clip(eigenvalues, 1e-12, None)) @ eigenvectors.T
+        return np.linalg.cholesky(repaired)
+
+def band_steps(horizon: int) -> np.ndarray:
+    """Tage (1..horizon), an denen die Perzentilbänder ausgewertet werden"""
+    return np.unique(np.linspace(1, horizon, min(horizon, MAX_BAND_POINTS)).round().astype(np.int64))
+
+def simulate_paths(mean: np.ndarray, factor: np.ndarray, values: np.ndarray, horizon: int,
+                   paths: int, steps: np.ndarray, seed) -> np.ndarray:
+    """Portfolio-Werte (Pfade x Stützstellen) für korrelierte Log-Renditen, Buy-and-Hold
+
+    Läuft in Worker-Prozessen; Tage werden blockweise vektorisiert, Pfade in
+    Stapeln von höchstens BLOCK_ELEMENTS Zufallszahlen je Block, gespeichert
+    werden nur die Werte an den Stützstellen `steps`.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = len(mean)
+    result = np.empty((paths, len(steps)))
+    batch = max(1, BLOCK_ELEMENTS // (BLOCK_DAYS * symbols))
+    for first in range(0, paths, batch):
+        size = min(batch, paths - first)
+        log_prices = np.zeros((size, symbols))
+        column = 0
+        day = 0
+        while day < horizon:
+            block = min(BLOCK_DAYS, horizon - day)
+            shocks = rng.standard_normal((size, block, symbols)) @ factor.T
+            shocks += mean
+            np.cumsum(shocks, axis=1, out=shocks)
+            shocks += log_prices[:, None, :]
+            # Stützstellen innerhalb dieses Blocks
+            while column < len(steps) and steps[column] <= day + block:
+                result[first:first + size, column] = np.exp(shocks[:, steps[column] - day - 1, :]) @ values
+                column += 1
+            log_prices = shocks[:, -1, :]
+            day += block
+    return result
+
+def _simulate_chunk(arguments):
+    return simulate_paths(*arguments)
+
+class ProjectionCache:
+    """Ergebnisse nach Beständen, Horizont und Parametern (benutzerübergreifend)"""
+
+    def __init__(self, ttl_seconds: int = 900, max_entries: int = 128):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value: Dict):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class ProjectionService:
+    """Monte-Carlo-Projektion des Portfoliowerts auf einem Prozess-Pool
+
+    Renditen und Kovarianzen werden aus den Tagesreihen geschätzt, die Pfade
+    in Blöcken auf die Worker verteilt. Kleine Läufe bleiben im Prozess, weil
+    sich der Versand an den Pool dort nicht lohnt.
+    """
+
+    def __init__(self, max_workers: int = None, min_chunk_paths: int = 2000, inline_work: int = 2_000_000):
+        self.max_workers = max_workers or int(os.environ.get('PROJECTION_WORKERS', os.cpu_count() or 1))
+        self.min_chunk_paths = min_chunk_paths
+        self.inline_work = inline_work  # Pfade x Tage x Symbole, bis zu denen ohne Pool gerechnet wird
+        self.cache = ProjectionCache()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                # spawn statt fork: der Webserver hat Threads und offene Verbindungen
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def simulate(self, mean: np.ndarray, covariance: np.ndarray, values: np.ndarray, horizon: int,
+                 paths: int, seed: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(Stützstellen in Tagen, Werte Pfade x Stützstellen)"""
+        factor = cholesky_factor(covariance)
+        steps = band_steps(horizon)
+        chunks = 1
+        if paths * horizon * len(mean) > self.inline_work and self.max_workers > 1:
+            chunks = max(1, min(self.max_workers, paths // self.min_chunk_paths))
+        sizes = [paths // chunks + (1 if i < paths % chunks else 0) for i in range(chunks)]
+        seeds = np.random.SeedSequence(seed).spawn(chunks)
+        jobs = [(mean, factor, values, horizon, size, steps, child) for size, child in zip(sizes, seeds)]
+
+        if chunks == 1:
+            return steps, simulate_paths(*jobs[0])
+        return steps, np.concatenate(list(self._executor().map(_simulate_chunk, jobs)))
+
+    def project(self, closes: np.ndarray, quantities: np.ndarray, horizon: int, paths: int,
+                confidence: float = 0.95, seed: Optional[int] = None, cash: float = 0.0) -> Dict:
+        """Perzentilbänder und VaR/CVaR des Portfoliowerts nach `horizon` Handelstagen
+
+        closes: Schlusskurse (Tage x Symbole) in Berichtswährung, quantities: Stückzahl je Symbol,
+        cash: Positionen ohne Kursdaten, die mit konstantem Wert eingehen.
+        """
+        mean, covariance = estimate_parameters(closes)
+        values = quantities * closes[-1]
+        start_value = float(values.sum()) + cash
+
+        started = time.perf_counter()
+        steps, simulated = self.simulate(mean, covariance, values, horizon, paths, seed)
+        seconds = time.perf_counter() - started
+        simulated += cash
+
+        bands = np.percentile(simulated, PERCENTILES, axis=0)
+        terminal = simulated[:, -1]
+        losses = start_value - terminal
+        var = float(np.quantile(losses, confidence))
+        tail = losses[losses >= var]
+        cvar = float(tail.mean()) if len(tail) else var
+
+        return {
+            'start_value': start_value,
+            'horizon_days': horizon,
+            'paths': paths,
+            'confidence': confidence,
+            'bands': [
+                {'day': int(day), **{f'p{p}': float(value) for p, value in zip(PERCENTILES, column)}}
+                for day, column in zip(steps, bands.T)
+            ],
+            'terminal': {
+                'mean': float(terminal.mean()),
+                'median': float(np.median(terminal)),
+                'probability_of_loss': float((terminal < start_value).mean())
+            },
+            'var': var,
+            'cvar': cvar,
+            'var_percent': var / start_value * 100 if start_value > 0 else None,
+            'cvar_percent': cvar / start_value * 100 if start_value > 0 else None,
+            'annualized': {
+                'expected_return': float(math.expm1(mean @ (values / values.sum()) * 252)) if values.sum() > 0 else None,
+                'volatility': float(np.sqrt((values / values.sum()) @ covariance @ (values / values.sum()) * 252))
+                if values.sum() > 0 else None
+            },
+            'simulation_seconds': round(seconds, 4),
+            'paths_per_second': round(paths / seconds) if seconds > 0 else None
+        }
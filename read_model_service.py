@@ -0,0 +1,36 @@
+from typing import List
+
+from sqlalchemy import select
+
+from src.models.user import db
+from src.models.portfolio import PortfolioEntry
+
+# Spalten, die Statistiken, Charts und Analysen von einem Lot benötigen
+LOT_COLUMNS = ('id', 'symbol', 'company_name', 'purchase_date', 'quantity', 'total_value', 'current_value')
+
+class LotRow:
+    """Schreibgeschützte Sicht auf einen PortfolioEntry ohne ORM-Instrumentierung
+
+    Hat dieselben Attributnamen wie PortfolioEntry und kann daher überall
+    verwendet werden, wo nur gelesen wird (Konverter, build_portfolio_series).
+    """
+    __slots__ = LOT_COLUMNS
+
+    def __init__(self, id, symbol, company_name, purchase_date, quantity, total_value, current_value):
+        self.id = id
+        self.symbol = symbol
+        self.company_name = company_name
+        self.purchase_date = purchase_date
+        self.quantity = quantity
+        self.total_value = total_value
+        self.current_value = current_value
+
+    def __repr__(self):
+        return f'<LotRow {self.id} {self.symbol}>'
+
+def lot_select():
+    """Core-Select der Lot-Spalten; Ergebnisse landen nicht in der Identity Map"""
+    return select(*(getattr(PortfolioEntry, column) for column in LOT_COLUMNS))
+
+def load_lots(statement) -> List[LotRow]:
+    return [LotRow(*row) for row in db.session.execute(statement)]
@@ -0,0 +1,216 @@
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from src.services.projection_service import ProjectionCache, estimate_parameters
+
+STRATEGIES = ('min_variance', 'max_sharpe', 'target')
+TRADING_DAYS = 252
+FRONTIER_POINTS = 64
+MAX_ITERATIONS = 2000
+TOLERANCE = 1e-10
+
+def project_capped_simplex(values: np.ndarray, cap: float) -> np.ndarray:
+    """Projiziert jede Zeile auf {0 <= w <= cap, sum(w) = 1}
+
+    Ohne Obergrenze exakt über Sortierung, sonst per Bisektion auf der Verschiebung.
+    """
+    if cap >= 1:
+        ordered = -np.sort(-values, axis=1)
+        cumulative = np.cumsum(ordered, axis=1) - 1
+        ranks = np.arange(1, values.shape[1] + 1)
+        support = (ordered - cumulative / ranks > 0).sum(axis=1)
+        shift = cumulative[np.arange(len(values)), support - 1] / support
+        return np.maximum(values - shift[:, None], 0.0)
+    low = values.min(axis=1) - cap
+    high = values.max(axis=1)
+    for _ in range(60):
+        middle = (low + high) / 2
+        total = np.clip(values - middle[:, None], 0.0, cap).sum(axis=1)
+        above = total > 1
+        low = np.where(above, middle, low)
+        high = np.where(above, high, middle)
+    return np.clip(values - high[:, None], 0.0, cap)
+
+def efficient_frontier(mean: np.ndarray, covariance: np.ndarray, cap: float = 1.0,
+                       points: int = FRONTIER_POINTS) -> np.ndarray:
+    """Gewichte (Punkte x Symbole) für min 0.5 w'Σw - t μ'w über viele t gleichzeitig
+
+    Zeile 0 (t = 0) ist das Minimum-Varianz-Portfolio, größere t gewichten die
+    erwartete Rendite stärker. Gelöst wird per beschleunigtem projiziertem
+    Gradientenverfahren (FISTA) für alle t als eine Matrixrechnung.
+    """
+    count = len(mean)
+    lipschitz = max(float(np.linalg.eigvalsh(covariance)[-1]), 1e-12)
+    spread = max(float(np.ptp(mean)), 1e-12)
+    trade_offs = np.concatenate([[0.0], np.geomspace(1e-3, 1e2, points - 1) * lipschitz / spread])
+
+    weights = project_capped_simplex(np.full((points, count), 1.0 / count), cap)
+    momentum = weights
+    for iteration in range(1, MAX_ITERATIONS + 1):
+        gradient = momentum @ covariance - trade_offs[:, None] * mean
+        updated = project_capped_simplex(momentum - gradient / lipschitz, cap)
+        change = float(np.abs(updated - weights).max())
+        momentum = updated + (iteration - 1) / (iteration + 2) * (updated - weights)
+        weights = updated
+        if change < TOLERANCE:
+            break
+    return weights
+
+def portfolio_statistics(weights: np.ndarray, mean: np.ndarray, covariance: np.ndarray,
+                         risk_free: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Erwartete Rendite, Volatilität und Sharpe-Ratio je Gewichtszeile (annualisiert)"""
+    weights = np.atleast_2d(weights)
+    expected = weights @ mean
+    volatility = np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', weights, covariance, weights), 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(volatility > 0, (expected - risk_free * weights.sum(axis=1)) / volatility, np.nan)
+    return expected, volatility, sharpe
+
+class RebalanceService:
+    """Zielgewichte per Mean-Variance-Optimierung und die Orders, um sie zu erreichen
+
+    Schätzungen (annualisierte Log-Renditen und Kovarianz) werden je
+    Symbolmenge, Währung und Zeitraum gecacht, sodass wiederholte
+    Was-wäre-wenn-Anfragen nur noch die Optimierung rechnen.
+    """
+
+    def __init__(self, ttl_seconds: int = 900, max_entries: int = 128):
+        # gleiche TTL-/LRU-Logik wie für die Projektionsergebnisse
+        self.cache = ProjectionCache(ttl_seconds, max_entries)
+
+    def estimates(self, key: Hashable, closes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, bool]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached['mean'], cached['covariance'], True
+        mean, covariance = estimate_parameters(closes)
+        mean, covariance = mean * TRADING_DAYS, covariance * TRADING_DAYS
+        self.cache.put(key, {'mean': mean, 'covariance': covariance, 'frontiers': {}})
+        return mean, covariance, False
+
+    def target_weights(self, strategy: str, mean: np.ndarray, covariance: np.ndarray, max_weight: float = 1.0,
+                       risk_free: float = 0.0, targets: Optional[np.ndarray] = None,
+                       key: Optional[Hashable] = None) -> np.ndarray:
+        """Gewichte der Symbole am investierbaren Vermögen; bei 'target' bleibt der Rest Cash"""
+        if strategy == 'target':
+            return targets
+        if max_weight * len(mean) < 1 - 1e-9:
+            raise ValueError(f'max_weight muss mindestens {1 / len(mean):.4f} betragen (1 / Anzahl Symbole)')
+        # Die Effizienzlinie hängt nur von den Schätzungen und der Obergrenze ab
+        frontiers = self.cache.get(key)['frontiers'] if key is not None and self.cache.get(key) else {}
+        frontier = frontiers.get(max_weight)
+        if frontier is None:
+            frontier = frontiers[max_weight] = efficient_frontier(mean, covariance, max_weight)
+        if strategy == 'min_variance':
+            return frontier[0]
+        _, _, sharpe = portfolio_statistics(frontier, mean, covariance, risk_free)
+        return frontier[int(np.nanargmax(sharpe))] if np.isfinite(sharpe).any() else frontier[0]
+
+    def trades(self, symbols: List[str], quantities: np.ndarray, prices: np.ndarray, weights: np.ndarray,
+               cash: float = 0.0, fractional: bool = False, min_trade_value: float = 0.0) -> Dict:
+        """Kleinste Orderliste von den aktuellen Beständen zu den Zielgewichten
+
+        Ohne `fractional` wird in ganzen Stück gehandelt (vollständige Verkäufe
+        ausgenommen); Restbeträge gehen an die Positionen mit der größten
+        Unterdeckung. Orders unter `min_trade_value` entfallen.
+        """
+        values = quantities * prices
+        total = float(values.sum()) + cash
+        desired = weights * total / prices - quantities
+        # Kleine Abweichungen nicht handeln
+        desired = np.where(np.abs(desired * prices) < min_trade_value, 0.0, desired)
+        closing = (weights <= 0) & (quantities > 0)
+
+        if fractional:
+            deltas = np.round(desired, 6)
+            deltas[closing] = -quantities[closing]
+            spend = float((np.clip(deltas, 0, None) * prices).sum())
+            available = cash - float((np.clip(deltas, None, 0) * prices).sum())
+            if spend > available:
+                deltas = np.where(deltas > 0, np.floor(deltas * max(available, 0.0) / spend * 1e6) / 1e6, deltas)
+        else:
+            deltas = np.trunc(desired)
+            deltas[closing] = -quantities[closing]
+            deltas = np.maximum(deltas, -quantities)
+            tradable = desired != 0
+            leftover = cash - float((deltas * prices).sum())
+            # Budget überschritten: Käufe mit der geringsten Unterdeckung kürzen, sonst ein Stück mehr verkaufen
+            while leftover < -1e-9:
+                deficit = (desired - deltas) * prices
+                buys = np.flatnonzero(deltas >= 1)
+                if len(buys):
+                    pick = buys[np.argmin(deficit[buys])]
+                    deltas[pick] -= 1
+                else:
+                    sells = np.flatnonzero(tradable & (quantities + deltas >= 1))
+                    if not len(sells):
+                        break
+                    pick = sells[np.argmin(deficit[sells])]
+                    deltas[pick] -= 1
+                leftover += prices[pick]
+            # Rest auf die größten Unterdeckungen verteilen, solange ein ganzes Stück bezahlbar ist
+            while True:
+                deficit = (desired - deltas) * prices
+                candidates = np.flatnonzero(tradable & (weights > 0) & (prices <= leftover + 1e-9) & (deficit > 0))
+                if not len(candidates):
+                    break
+                pick = candidates[np.argmax(deficit[candidates])]
+                deltas[pick] += 1
+                leftover -= prices[pick]
+
+        deltas = deltas + 0.0  # keine -0.0 in der Ausgabe
+        target_quantities = quantities + deltas
+        trade_values = deltas * prices
+        orders = []
+        for i, symbol in enumerate(symbols):
+            orders.append({
+                'symbol': symbol,
+                'action': 'buy' if deltas[i] > 0 else 'sell' if deltas[i] < 0 else 'hold',
+                'price': float(prices[i]),
+                'current_quantity': float(quantities[i]),
+                'target_quantity': float(target_quantities[i]),
+                'trade_quantity': float(deltas[i]),
+                'trade_value': float(trade_values[i]),
+                'current_weight': float(values[i] / total) if total > 0 else 0.0,
+                'target_weight': float(weights[i]),
+                'resulting_weight': float(target_quantities[i] * prices[i] / total) if total > 0 else 0.0
+            })
+        orders.sort(key=lambda order: -abs(order['trade_value']))
+        return {
+            'orders': orders,
+            'trade_count': int((deltas != 0).sum()),
+            'turnover': float(np.abs(trade_values).sum()),
+            'total_value': total,
+            'cash_before': cash,
+            'cash_after': float(cash - trade_values.sum())
+        }
+
+    def rebalance(self, key: Hashable, symbols: List[str], closes: np.ndarray, quantities: np.ndarray,
+                  strategy: str, targets: Optional[np.ndarray] = None, cash: float = 0.0, max_weight: float = 1.0,
+                  risk_free: float = 0.0, fractional: bool = False, min_trade_value: float = 0.0) -> Dict:
+        started = time.perf_counter()
+        mean, covariance, cached = self.estimates(key, closes)
+        weights = self.target_weights(strategy, mean, covariance, max_weight, risk_free, targets, key)
+        prices = closes[-1]
+        result = self.trades(symbols, quantities, prices, weights, cash, fractional, min_trade_value)
+
+        total = result['total_value']
+        current = quantities * prices / total if total > 0 else np.zeros(len(symbols))
+        by_symbol = {order['symbol']: order['resulting_weight'] for order in result['orders']}
+        resulting = np.array([by_symbol[symbol] for symbol in symbols])
+        rows = np.vstack([current, weights, resulting])
+        expected, volatility, sharpe = portfolio_statistics(rows, mean, covariance, risk_free)
+        result['statistics'] = {
+            name: {
+                'expected_return': float(expected[i]),
+                'volatility': float(volatility[i]),
+                'sharpe_ratio': float(sharpe[i]) if np.isfinite(sharpe[i]) else None
+            }
+            for i, name in enumerate(('current', 'target', 'after_trades'))
+        }
+        result['strategy'] = strategy
+        result['estimates_cached'] = cached
+        result['estimation_days'] = len(closes)
+        result['seconds'] = time.perf_counter() - started
+        return result
@@ -0,0 +1,112 @@
+import gzip
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'text/javascript', 'image/svg+xml'
+}
+
+def json_default(obj):
+    """Typen, die weder json noch orjson direkt serialisieren"""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'f' and np.isnan(obj).any():
+            return [None if value != value else value for value in obj.tolist()]
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        # NaN wie bei orjson als null ausgeben
+        return None if isinstance(value, float) and value != value else value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return DefaultJSONProvider.default(obj)
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """Standard-Provider mit ISO-Datumsangaben und NumPy-Unterstützung (Fallback ohne orjson)"""
+    default = staticmethod(json_default)
+    sort_keys = False
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON über orjson: serialisiert datetime, date und NumPy-Arrays nativ"""
+    sort_keys = False
+
+    def _options(self, indent: bool) -> int:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        return option | orjson.OPT_INDENT_2 if indent else option
+
+    def _dumps_bytes(self, obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, default=json_default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs) -> str:
+        return self._dumps_bytes(obj, bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._dumps_bytes(obj, indent), mimetype=self.mimetype)
+
+def json_provider_class():
+    return OrjsonProvider if orjson is not None else NumpyJSONProvider
+
+def choose_encoding(accept_encodings) -> str:
+    """Bevorzugt Brotli, sonst gzip; leerer String wenn keines akzeptiert wird"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return ''
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        # Qualität 4 ist für dynamische Antworten der übliche Kompromiss aus Größe und Zeit
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=level)
+
+def init_app(app):
+    """Setzt den schnellen JSON-Provider und komprimiert große Antworten per Accept-Encoding"""
+    from flask import request
+
+    app.json = json_provider_class()(app)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 5)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if not encoding:
+            return response
+
+        response.set_data(compress(data, encoding, app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = encoding
+        return response
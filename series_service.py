@@ -0,0 +1,222 @@
+import numpy as np
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PriceArrays = Tuple[np.ndarray, np.ndarray]
+
+RESOLUTIONS = ('daily', 'weekly', 'monthly')
+
+def history_to_arrays(historical_data: List[Dict]) -> PriceArrays:
+    """Wandelt eine Kursliste von get_historical_data in (Datum, Schlusskurs)-Arrays um"""
+    dates = np.array([item['date'] for item in historical_data], dtype='datetime64[D]')
+    closes = np.array([item['close'] for item in historical_data], dtype=np.float64)
+    return dates, closes
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Füllt NaN-Lücken spaltenweise mit dem letzten bekannten Wert"""
+    mask = np.isnan(matrix)
+    index = np.where(~mask, np.arange(matrix.shape[0])[:, None], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    return matrix[index, np.arange(matrix.shape[1])]
+
+def trading_calendar(price_arrays: Iterable[PriceArrays], start_date: Optional[date] = None,
+                     end_date: Optional[date] = None) -> np.ndarray:
+    """Gemeinsamer Handelstag-Index: Vereinigung aller Kursdaten im Zeitraum"""
+    known = [dates for dates, _ in price_arrays]
+    if known:
+        dates = np.unique(np.concatenate(known))
+    else:
+        dates = np.array([], dtype='datetime64[D]')
+    if start_date:
+        dates = dates[dates >= np.datetime64(start_date, 'D')]
+    if end_date:
+        dates = dates[dates <= np.datetime64(end_date, 'D')]
+    return dates
+
+def period_ends(dates: np.ndarray, resolution: str = 'daily') -> np.ndarray:
+    """Indizes des letzten Handelstags je Woche (Mo-So) bzw. Monat"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Unbekannte Auflösung: {resolution}')
+    if resolution == 'daily' or len(dates) == 0:
+        return np.arange(len(dates))
+    if resolution == 'weekly':
+        # datetime64[W] beginnt donnerstags (1970-01-01), +3 Tage verschiebt auf Montag
+        periods = (dates + np.timedelta64(3, 'D')).astype('datetime64[W]')
+    else:
+        periods = dates.astype('datetime64[M]')
+    return np.append(np.flatnonzero(periods[1:] != periods[:-1]), len(dates) - 1)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: Indizes von max_points formerhaltenden Punkten
+
+    Erster und letzter Punkt bleiben erhalten; aus jedem Bucket dazwischen wird der
+    Punkt gewählt, der mit dem zuvor gewählten Punkt und dem Mittelwert des nächsten
+    Buckets das größte Dreieck bildet. Spitzen und Einbrüche bleiben so sichtbar.
+    Mehrere Kurven (y mit einer Spalte je Kurve) werden auf ihre Spannweite
+    normiert und ihre Dreiecksflächen addiert.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    else:
+        span = np.ptp(y, axis=0)
+        y = y / np.where(span > 0, span, 1.0)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Mittelwerte aller Buckets (plus letzter Punkt als "nächster Bucket" des letzten)
+    bucket_starts = np.append(edges[:-1], n - 1)
+    counts = np.diff(np.append(bucket_starts, n))
+    average_x = np.add.reduceat(x, bucket_starts) / counts
+    average_y = np.add.reduceat(y, bucket_starts) / counts[:, None]
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if end <= start:
+            end = start + 1
+        next_x, next_y = average_x[bucket + 1], average_y[bucket + 1]
+        areas = np.abs(
+            (x[anchor] - next_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end, None]) * (next_y - y[anchor])
+        ).sum(axis=1)
+        anchor = start + int(np.argmax(areas))
+        selected[bucket + 1] = anchor
+    return np.unique(selected)
+
+def downsample_indices(dates: np.ndarray, curves: List[np.ndarray], max_points: int) -> np.ndarray:
+    """LTTB über mehrere Kurven auf gemeinsamem Index; das Punktbudget wird aufgeteilt
+
+    Bei vielen Kurven kann die Vereinigung wegen der Mindestgröße je Kurve mehr
+    als max_points Indizes haben; dann wählt ein zweiter LTTB-Lauf über alle
+    Kurven gemeinsam max_points davon aus, sodass die Spitzen der einzelnen
+    Kurven Kandidaten bleiben.
+    """
+    if max_points >= len(dates):
+        return np.arange(len(dates))
+    x = dates.astype(np.int64)
+    values = [np.nan_to_num(curve) for curve in curves]
+    budget = max(3, max_points // len(values))
+    union = np.unique(np.concatenate([lttb_indices(x, curve, budget) for curve in values]))
+    if len(union) > max_points:
+        union = union[lttb_indices(x[union], np.column_stack(values)[union], max_points)]
+    return union
+
+class PortfolioSeries:
+    """Array-basierte Tagesreihe eines Portfolios auf einem gemeinsamen Handelstag-Index"""
+
+    def __init__(self, dates: np.ndarray, values: np.ndarray, invested: np.ndarray,
+                 cash_flows: np.ndarray, symbols: List[str], prices: np.ndarray,
+                 positions: Optional[np.ndarray] = None):
+        self.dates = dates            # datetime64[D], aufsteigend
+        self.values = values          # Marktwert je Tag
+        self.invested = invested      # investiertes Kapital je Tag
+        self.cash_flows = cash_flows  # an diesem Tag neu investiertes Kapital
+        self.symbols = symbols
+        self.prices = prices          # Schlusskurse (Tage x Symbole), vorwärts gefüllt
+        self.positions = positions    # Marktwert je Tag und Symbol (optional)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def date_strings(self) -> List[str]:
+        return np.datetime_as_string(self.dates, unit='D').tolist()
+
+    def take(self, indices: np.ndarray) -> 'PortfolioSeries':
+        """Behält nur die angegebenen (aufsteigenden) Tage; Zuflüsse dazwischen werden summiert"""
+        if len(indices) == len(self.dates):
+            return self
+        starts = np.concatenate(([0], indices[:-1] + 1))
+        return PortfolioSeries(
+            self.dates[indices], self.values[indices], self.invested[indices],
+            np.add.reduceat(self.cash_flows, starts), self.symbols, self.prices[indices],
+            self.positions[indices] if self.positions is not None else None
+        )
+
+    def resample(self, resolution: str) -> 'PortfolioSeries':
+        """Reduziert die Reihe auf Periodenenden"""
+        return self.take(period_ends(self.dates, resolution))
+
+    def align(self, arrays: PriceArrays) -> np.ndarray:
+        """Richtet eine weitere Kursreihe (z.B. einen ETF) auf den Index aus, vorwärts gefüllt"""
+        dates, closes = arrays
+        aligned = np.full(len(self.dates), np.nan)
+        positions = np.searchsorted(dates, self.dates, side='right') - 1
+        valid = positions >= 0
+        aligned[valid] = closes[positions[valid]]
+        return aligned
+
+def build_portfolio_series(lots: Iterable, price_arrays: Dict[str, PriceArrays],
+                           start_date: Optional[date] = None,
+                           end_date: Optional[date] = None,
+                           dates: Optional[np.ndarray] = None) -> Optional[PortfolioSeries]:
+    """Berechnet Markt- und Investitionswert aller Lots für jeden Handelstag
+
+    lots: Objekte mit symbol, purchase_date, quantity und total_value
+    (z.B. PortfolioEntry). Ohne vorgegebenen Index (dates, siehe
+    trading_calendar) wird er aus den Kursdaten der gehaltenen Symbole gebildet.
+    Tage ohne Kurs übernehmen den letzten bekannten Schlusskurs; Positionen
+    ohne jeden Kurs werden zum Einstandswert bewertet.
+    """
+    lots = list(lots)
+    if not lots:
+        return None
+
+    symbols = sorted(set(lot.symbol for lot in lots))
+    column = {symbol: i for i, symbol in enumerate(symbols)}
+
+    if dates is None:
+        dates = trading_calendar(
+            (price_arrays[symbol] for symbol in symbols if symbol in price_arrays), start_date, end_date
+        )
+    if len(dates) == 0:
+        return None
+
+    # Kursmatrix (Tage x Symbole), Lücken werden vorwärts gefüllt
+    prices = np.full((len(dates), len(symbols)), np.nan)
+    for symbol, (symbol_dates, closes) in price_arrays.items():
+        if symbol not in column:
+            continue
+        positions = np.searchsorted(dates, symbol_dates)
+        inside = (positions < len(dates))
+        inside[inside] &= dates[positions[inside]] == symbol_dates[inside]
+        prices[positions[inside], column[symbol]] = closes[inside]
+        # Letzter Kurs vor Beginn des Index als Startwert für das Vorwärtsfüllen
+        before = symbol_dates < dates[0]
+        if before.any() and np.isnan(prices[0, column[symbol]]):
+            prices[0, column[symbol]] = closes[before][-1]
+    prices = forward_fill(prices)
+
+    # Lots als Zuwächse auf ihren Kauftag, kumuliert zu Beständen je Tag
+    lot_columns = np.array([column[lot.symbol] for lot in lots])
+    purchase_dates = np.array([lot.purchase_date for lot in lots], dtype='datetime64[D]')
+    quantities = np.array([lot.quantity for lot in lots], dtype=np.float64)
+    costs = np.array([lot.total_value for lot in lots], dtype=np.float64)
+
+    rows = np.searchsorted(dates, purchase_dates, side='left')
+    held = rows < len(dates)
+    rows, lot_columns = rows[held], lot_columns[held]
+    quantities, costs = quantities[held], costs[held]
+
+    quantity_delta = np.zeros(prices.shape)
+    cost_delta = np.zeros(prices.shape)
+    np.add.at(quantity_delta, (rows, lot_columns), quantities)
+    np.add.at(cost_delta, (rows, lot_columns), costs)
+    holdings = np.cumsum(quantity_delta, axis=0)
+    cost_basis = np.cumsum(cost_delta, axis=0)
+
+    position_values = np.where(np.isnan(prices), cost_basis, holdings * np.nan_to_num(prices))
+    values = position_values.sum(axis=1)
+    invested = cost_basis.sum(axis=1)
+
+    # Vor dem Index gekaufte Lots gehören zum Anfangsbestand, nicht zu den Zuflüssen
+    cash_flows = np.zeros(len(dates))
+    in_window = purchase_dates[held] >= dates[0]
+    np.add.at(cash_flows, rows[in_window], costs[in_window])
+
+    return PortfolioSeries(dates, values, invested, cash_flows, symbols, prices, position_values)
@@ -0,0 +1,122 @@
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+class StartupProfile:
+    """Misst die Startphasen der App bis zur ersten beantworteten Anfrage"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.first_request_seconds = None
+        self._last = self.started
+
+    def mark(self, phase: str):
+        """Schließt eine Phase ab; gemessen wird die Zeit seit der vorherigen Marke"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> Dict:
+        return {
+            'phases': {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+            'ready_ms': round((self._last - self.started) * 1000, 1),
+            'first_request_ms': round(self.first_request_seconds * 1000, 1)
+            if self.first_request_seconds is not None else None,
+            'lazy_services_ms': {name: round(seconds * 1000, 1) for name, seconds in services.timings.items()}
+        }
+
+    def format(self) -> str:
+        report = self.report()
+        lines = [f'{name:20s} {ms:8.1f} ms' for name, ms in report['phases'].items()]
+        lines.append(f"{'bereit nach':20s} {report['ready_ms']:8.1f} ms")
+        return '\n'.join(lines)
+
+    def init_app(self, app):
+        """Merkt sich die Dauer bis zur ersten Anfrage und gibt bei STARTUP_PROFILE den Bericht aus"""
+        from flask import request
+
+        self.mark('init')
+        if app.config.get('STARTUP_PROFILE'):
+            print(f'Startprofil:\n{self.format()}')
+
+        @app.before_request
+        def record_first_request():
+            if self.first_request_seconds is None:
+                self.first_request_seconds = time.perf_counter() - self.started
+                if app.config.get('STARTUP_PROFILE'):
+                    print(f'Erste Anfrage ({request.path}) nach {self.first_request_seconds * 1000:.1f} ms')
+
+class LazyService:
+    """Platzhalter für einen Dienst, der erst beim ersten Attributzugriff erzeugt wird"""
+
+    def __init__(self, registry: 'ServiceRegistry', name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+class ServiceRegistry:
+    """Erzeugt Dienste erst bei der ersten Verwendung und teilt sie über alle Blueprints"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._instances: Dict[str, object] = {}
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable):
+        self._factories[name] = factory
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.timings[name] = time.perf_counter() - started
+            return self._instances[name]
+
+    def lazy(self, name: str) -> LazyService:
+        return LazyService(self, name)
+
+def _finnhub_service():
+    from src.services.market_data_service import MarketDataService
+    return MarketDataService()
+
+def _alpha_vantage_service():
+    from src.services.market_data_service import AlphaVantageService
+    return AlphaVantageService()
+
+def _history_prefetcher():
+    from src.services.async_market_data_service import async_market_service
+    from src.services.history_service import HistoryPrefetcher
+    return HistoryPrefetcher(services.get('finnhub'), async_market_service=async_market_service)
+
+def _ocr_service():
+    # Importiert pytesseract und PIL erst beim ersten Upload
+    from src.services.ocr_service import OCRService
+    service = OCRService()
+    service.load()
+    return service
+
+def _projection_service():
+    from src.services.projection_service import ProjectionService
+    return ProjectionService()
+
+def _rebalance_service():
+    from src.services.rebalance_service import RebalanceService
+    return RebalanceService()
+
+services = ServiceRegistry()
+services.register('finnhub', _finnhub_service)
+services.register('alpha_vantage', _alpha_vantage_service)
+services.register('history_prefetcher', _history_prefetcher)
+services.register('ocr', _ocr_service)
+services.register('projection', _projection_service)
+services.register('rebalance', _rebalance_service)
+
+startup_profile = StartupProfile()
@@ -0,0 +1,214 @@
+import json
+from datetime import date, timedelta
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db
+from src.models.portfolio_snapshot import PortfolioSnapshot
+from src.services.metrics_service import record_cache
+from src.services.series_service import PortfolioSeries, build_portfolio_series
+
+# Zusätzliche Tage vor dem ersten fehlenden Tag, damit der letzte Schlusskurs davor bekannt ist
+PRICE_LOOKBACK_DAYS = 7
+# Endet die Kurshistorie eines Symbols so lange vor heute, kommen keine Kurse mehr (z.B. Delisting)
+HISTORY_ENDED_DAYS = 10
+
+class SnapshotService:
+    """Tagesendstände je Benutzer und Berichtswährung in der Tabelle portfolio_snapshot
+
+    Abgeschlossene Tage (bis gestern) werden einmal berechnet und danach nur
+    noch als Bereich gelesen; fehlende Tage werden ab dem letzten gespeicherten
+    Tag inkrementell nachgetragen. Gespeichert wird nur, was alle gehaltenen
+    Symbole mit echten Schlusskursen belegen; der Rest bleibt im Rückstand und
+    wird wie der laufende Tag live berechnet. Ändern sich Lots rückwirkend,
+    wird ab dem Kaufdatum neu berechnet.
+    """
+
+    def _scope(self, user_id: Optional[int], currency: str = None):
+        query = PortfolioSnapshot.query.filter(PortfolioSnapshot.user_id.is_(None) if user_id is None
+                                               else PortfolioSnapshot.user_id == user_id)
+        if currency is not None:
+            query = query.filter(PortfolioSnapshot.currency == currency)
+        return query
+
+    def last_snapshot(self, user_id: Optional[int], currency: str) -> Optional[PortfolioSnapshot]:
+        return self._scope(user_id, currency).order_by(PortfolioSnapshot.snapshot_date.desc()).first()
+
+    def backlog(self, user_id: Optional[int], currency: str, entries) -> Optional[Tuple[date, date]]:
+        """Noch nicht gespeicherter Zeitraum abgeschlossener Tage oder None"""
+        if not entries:
+            return None
+        yesterday = date.today() - timedelta(days=1)
+        last = self.last_snapshot(user_id, currency)
+        start = last.snapshot_date + timedelta(days=1) if last else min(entry.purchase_date for entry in entries)
+        # Wochenenden haben keine Schlusskurse und bleiben sonst bis Montagabend offen
+        start = np.busday_offset(np.datetime64(start, 'D'), 0, roll='forward').astype(object)
+        record_cache('snapshot', start > yesterday)
+        return (start, yesterday) if start <= yesterday else None
+
+    def history_days(self, start: date) -> int:
+        """Kurshistorie in Tagen, die für Berechnungen ab `start` benötigt wird"""
+        return max((date.today() - start).days, 0) + PRICE_LOOKBACK_DAYS
+
+    @staticmethod
+    def settled_days(series: PortfolioSeries, price_arrays) -> int:
+        """Anzahl der Tage am Anfang der Reihe, deren Bewertung endgültig ist
+
+        Ein Tag ist endgültig, wenn jedes an ihm gehaltene Symbol an diesem oder
+        einem späteren Tag einen echten Schlusskurs hat; vorwärts gefüllt wurden
+        dann nur Feiertage seiner Börse. Fehlen Kurse (z.B. fehlgeschlagener oder
+        gedrosselter Abruf), bleibt der Tag offen.
+        """
+        settled = np.ones(len(series), dtype=bool)
+        ended = np.datetime64(date.today() - timedelta(days=HISTORY_ENDED_DAYS), 'D')
+        for column, symbol in enumerate(series.symbols):
+            symbol_dates = price_arrays[symbol][0] if symbol in price_arrays else ()
+            if len(symbol_dates) and symbol_dates[-1] < ended:
+                continue
+            covered = series.dates <= symbol_dates[-1] if len(symbol_dates) else np.zeros(len(series), dtype=bool)
+            settled &= covered | (series.positions[:, column] == 0)
+        return len(settled) if settled.all() else int(np.argmin(settled))
+
+    def store(self, user_id: Optional[int], currency: str, lots, price_arrays, start: date, end: date) -> int:
+        """Berechnet die Tage von `start` bis `end` und hängt die endgültigen an; gibt die Anzahl Zeilen zurück"""
+        series = build_portfolio_series(lots, price_arrays, start_date=start, end_date=end)
+        if series is None:
+            return 0
+        settled = self.settled_days(series, price_arrays)
+        if not settled:
+            return 0
+        end = series.dates[settled - 1].astype(object)
+        series = PortfolioSeries(series.dates[:settled], series.values[:settled], series.invested[:settled],
+                                 series.cash_flows[:settled], series.symbols, series.prices[:settled],
+                                 series.positions[:settled])
+
+        # Zuflüsse als Differenz des investierten Kapitals zum Vortag, damit auch an
+        # Nicht-Handelstagen zwischen zwei Läufen gekaufte Lots gezählt werden
+        last = self.last_snapshot(user_id, currency)
+        previous = last.invested if last and last.snapshot_date < start else 0.0
+        cash_flows = np.diff(series.invested, prepend=previous)
+
+        rows = [
+            PortfolioSnapshot(
+                user_id=user_id, currency=currency, snapshot_date=day,
+                total_value=value, invested=invested, cash_flow=cash_flow,
+                positions=json.dumps({
+                    symbol: round(position, 4)
+                    for symbol, position in zip(series.symbols, position_values) if position
+                })
+            )
+            for day, value, invested, cash_flow, position_values in zip(
+                series.dates.astype(object), series.values.tolist(), series.invested.tolist(),
+                cash_flows.tolist(), series.positions.tolist()
+            )
+        ]
+        try:
+            self._scope(user_id, currency).filter(
+                PortfolioSnapshot.snapshot_date >= start, PortfolioSnapshot.snapshot_date <= end
+            ).delete(synchronize_session=False)
+            db.session.add_all(rows)
+            db.session.commit()
+        except IntegrityError:
+            # Parallele Anfrage hat denselben Zeitraum bereits gespeichert
+            db.session.rollback()
+            return 0
+        return len(rows)
+
+    def read(self, user_id: Optional[int], currency: str, start: date, end: date) -> Optional[PortfolioSeries]:
+        """Gespeicherte Tage im Zeitraum als Reihe (eine Bereichsabfrage über den Index)"""
+        rows = self._scope(user_id, currency).with_entities(
+            PortfolioSnapshot.snapshot_date, PortfolioSnapshot.total_value,
+            PortfolioSnapshot.invested, PortfolioSnapshot.cash_flow
+        ).filter(
+            PortfolioSnapshot.snapshot_date >= start, PortfolioSnapshot.snapshot_date <= end
+        ).order_by(PortfolioSnapshot.snapshot_date).all()
+        if not rows:
+            return None
+        days, values, invested, cash_flows = zip(*rows)
+        return PortfolioSeries(
+            np.array(days, dtype='datetime64[D]'), np.array(values, dtype=np.float64),
+            np.array(invested, dtype=np.float64), np.array(cash_flows, dtype=np.float64),
+            [], np.empty((len(rows), 0))
+        )
+
+    def series(self, user_id: Optional[int], currency: str, lots, price_arrays,
+               start: date, end: date) -> Optional[PortfolioSeries]:
+        """Gespeicherte Tage plus live berechnete Tage danach (offener Rückstand und laufender Tag)
+
+        Erwartet, dass der Rückstand (backlog) zuvor mit store nachgetragen wurde
+        und price_arrays ab dessen Beginn abzüglich PRICE_LOOKBACK_DAYS reichen.
+        """
+        stored = self.read(user_id, currency, start, end)
+        last = self.last_snapshot(user_id, currency)
+        live_start = max(start, last.snapshot_date + timedelta(days=1)) if last else start
+        live = build_portfolio_series(lots, price_arrays, start_date=live_start, end_date=end) \
+            if live_start <= end else None
+        if stored is None or live is None:
+            return stored or live
+        return PortfolioSeries(
+            np.concatenate((stored.dates, live.dates)), np.concatenate((stored.values, live.values)),
+            np.concatenate((stored.invested, live.invested)),
+            np.concatenate((stored.cash_flows, np.diff(live.invested, prepend=stored.invested[-1]))),
+            [], np.empty((len(stored) + len(live), 0))
+        )
+
+    def invalidate_from(self, user_id: Optional[int], from_date: date) -> int:
+        """Verwirft alle Tagesstände ab `from_date` (alle Währungen); vor dem Commit aufrufen"""
+        return self._scope(user_id).filter(PortfolioSnapshot.snapshot_date >= from_date) \
+            .delete(synchronize_session=False)
+
+    def invalidate_lots(self, user_id: Optional[int], purchase_dates: Iterable[date]) -> int:
+        """Verwirft nur den Teil ab dem frühesten Kaufdatum geänderter Lots"""
+        purchase_dates = [day for day in purchase_dates if day]
+        if not purchase_dates:
+            return 0
+        return self.invalidate_from(user_id, min(purchase_dates))
+
+    def clear(self, user_id: Optional[int]) -> int:
+        return self._scope(user_id).delete(synchronize_session=False)
+
+    def update(self, user_id: Optional[int], currency: str, entries, prefetcher) -> int:
+        """Trägt fehlende Tage synchron nach (Tagesend-Job, CLI)"""
+        from src.services.fx_service import CurrencyConverter
+        from src.services.series_service import history_to_arrays
+        from src.services.transaction_service import cost_basis_method, transaction_service
+
+        backlog = self.backlog(user_id, currency, entries)
+        if backlog is None:
+            return 0
+        symbols = {entry.symbol for entry in entries}
+        prefetch = prefetcher.prefetch((symbol, self.history_days(backlog[0])) for symbol in symbols)
+        converter = CurrencyConverter(entries, currency)
+        price_arrays = converter.price_arrays({
+            symbol: history_to_arrays(data) for symbol, data in prefetch.data.items() if data
+        })
+        ledger = transaction_service.ledger(user_id, entries, converter, cost_basis_method(from_request=False))
+        return self.store(user_id, currency, ledger.series_lots(converter.lots()), price_arrays, *backlog)
+
+snapshot_service = SnapshotService()
+
+def init_app(app):
+    """Registriert den Tagesend-Job als CLI-Befehl: flask --app src.main snapshots"""
+    import click
+
+    @app.cli.command('snapshots')
+    @click.option('--currency', default=None, help='Berichtswährung (Standard: REPORTING_CURRENCY)')
+    def backfill_snapshots(currency):
+        """Trägt fehlende Tagesendstände für alle Portfolios nach"""
+        from src.models.portfolio_entry_meta import PortfolioEntryMeta
+        from src.services.fx_service import reporting_currency
+        from src.services.service_registry import services
+        from src.services.tenant_service import user_lots
+
+        currency = reporting_currency(currency, app.config.get('REPORTING_CURRENCY'))
+        user_ids = [None] + sorted(
+            user_id for (user_id,) in db.session.query(PortfolioEntryMeta.user_id).distinct()
+            if user_id is not None
+        )
+        prefetcher = services.get('history_prefetcher')
+        for user_id in user_ids:
+            entries = user_lots(user_id)
+            stored = snapshot_service.update(user_id, currency, entries, prefetcher)
+            print(f'Portfolio {user_id or "gemeinsam"}: {stored} Tage gespeichert ({currency})')
@@ -0,0 +1,435 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from itertools import chain
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+from src.services.metrics_service import record_cache
+
+SYMBOLS_CHANGED = 'portfolio_symbols_changed'
+# Versionszähler (CacheVersion), über den andere Prozesse dem Stream-Prozess geänderte Symbole melden
+SYMBOLS_SCOPE = 'stream:symbols'
+# Abstand, in dem Prozesse ohne Stream erneut versuchen, die Sperrdatei zu bekommen
+LOCK_RETRY_SECONDS = 30.0
+
+class LastPriceTable:
+    """Letzter Handelspreis je Symbol; beliebig viele Ticks ergeben einen Wert pro Flush"""
+
+    def __init__(self):
+        # Symbol -> (Preis, Handelszeitpunkt in ms, Empfangszeit monotonic)
+        self._prices: Dict[str, Tuple[float, int, float]] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self.ticks = 0
+
+    def update(self, trades: Iterable[Tuple[str, float, int]]):
+        now = time.monotonic()
+        with self._lock:
+            for symbol, price, timestamp in trades:
+                self.ticks += 1
+                current = self._prices.get(symbol)
+                # Verspätete Ticks nicht über neuere schreiben
+                if current is not None and current[1] > timestamp:
+                    continue
+                self._prices[symbol] = (price, timestamp, now)
+                self._dirty.add(symbol)
+
+    def get_many(self, symbols: Iterable[str], max_age: Optional[float] = None) -> Dict[str, float]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._prices.get(symbol)
+                if entry and (max_age is None or now - entry[2] <= max_age):
+                    found[symbol] = entry[0]
+        return found
+
+    def drain(self) -> Dict[str, float]:
+        """Seit dem letzten Aufruf geänderte Preise"""
+        with self._lock:
+            changed = {symbol: self._prices[symbol][0] for symbol in self._dirty}
+            self._dirty.clear()
+        return changed
+
+    def restore(self, symbols: Iterable[str]):
+        """Markiert Symbole nach einem fehlgeschlagenen Flush erneut als geändert"""
+        with self._lock:
+            self._dirty.update(symbol for symbol in symbols if symbol in self._prices)
+
+    def discard(self, symbols: Iterable[str]):
+        with self._lock:
+            for symbol in symbols:
+                self._prices.pop(symbol, None)
+                self._dirty.discard(symbol)
+
+class TradeStream:
+    """Aktuelle Kurse aus dem Finnhub-Trade-Feed (WebSocket) statt Quote-Polling
+
+    Abonniert werden alle gehaltenen Symbole; Änderungen an PortfolioEntry
+    lösen nach dem Commit (in jedem Prozess) einen Abgleich der Abos aus. Ticks
+    landen in einer Tabelle der letzten Preise, die im Intervall gesammelt in
+    die Datenbank geschrieben wird; zwischengespeicherte Ergebnisse der Halter
+    werden nur verworfen, wenn sich ein Kurs um mehr als `invalidate_percent`
+    bewegt hat. Bricht die Verbindung ab, wird mit wachsendem Abstand neu
+    verbunden und bis dahin per Quote-Endpunkt gepollt.
+    """
+
+    def __init__(self, url: str = None, token: str = None, flush_seconds: float = 5.0,
+                 poll_seconds: float = 60.0, recv_timeout: float = 30.0, max_backoff: float = 60.0,
+                 invalidate_percent: float = 0.1):
+        self.url = url or os.environ.get('FINNHUB_WS_URL', 'wss://ws.finnhub.io')
+        self.token = token or os.environ.get('FINNHUB_API_KEY', 'demo')
+        self.flush_seconds = flush_seconds
+        self.poll_seconds = poll_seconds
+        self.recv_timeout = recv_timeout
+        self.max_backoff = max_backoff
+        self.invalidate_percent = invalidate_percent
+        self.prices = LastPriceTable()
+        self.symbols: Set[str] = set()
+        self.connected = False
+        self.stats = {'connects': 0, 'disconnects': 0, 'messages': 0, 'flushes': 0,
+                      'rows_written': 0, 'polls': 0, 'polled_symbols': 0, 'invalidations': 0}
+        self._subscribed: Set[str] = set()
+        # Kurs je Symbol beim letzten Verwerfen der Ergebnis-Caches
+        self._reference: Dict[str, float] = {}
+        self._symbols_version = 0
+        self._socket = None
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._resync = threading.Event()
+        self._threads = []
+        self._app = None
+
+    # Abos
+
+    def _send(self, message_type: str, symbols: Iterable[str]):
+        for symbol in sorted(symbols):
+            self._socket.send(json.dumps({'type': message_type, 'symbol': symbol}))
+
+    def set_symbols(self, symbols: Iterable[str]):
+        """Gleicht die Abos der laufenden Verbindung mit den gewünschten Symbolen ab"""
+        symbols = set(symbols)
+        with self._send_lock:
+            removed = self.symbols - symbols
+            self.symbols = symbols
+            if self._socket is not None and self.connected:
+                try:
+                    self._send('unsubscribe', self._subscribed - symbols)
+                    self._send('subscribe', symbols - self._subscribed)
+                    self._subscribed = set(symbols)
+                except Exception as e:
+                    print(f"Trade-Stream Abo-Fehler: {str(e)}")
+        self.prices.discard(removed)
+        for symbol in removed:
+            self._reference.pop(symbol, None)
+
+    def request_resync(self):
+        self._resync.set()
+
+    def latest(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """Gestreamte Kurse; ohne Verbindung nur die noch frischen Werte aus dem Polling"""
+        symbols = [symbol for symbol in symbols if symbol in self.symbols]
+        if self.connected:
+            return self.prices.get_many(symbols)
+        return self.prices.get_many(symbols, max_age=self.poll_seconds)
+
+    # Verbindung
+
+    def _handle(self, message: str):
+        self.stats['messages'] += 1
+        data = json.loads(message)
+        if data.get('type') == 'trade':
+            from src.services.alert_service import alert_engine
+            trades = [(trade['s'], float(trade['p']), int(trade.get('t', 0))) for trade in data.get('data') or []]
+            self.prices.update(trades)
+            # Alarme sofort mit dem letzten Trade je Symbol prüfen, nicht erst beim Flush
+            alert_engine.observe({symbol: price for symbol, price, _ in trades})
+        elif data.get('type') == 'error':
+            print(f"Trade-Stream Fehler: {data.get('msg')}")
+
+    def _open(self):
+        connection = websocket.create_connection(f'{self.url}?token={self.token}', timeout=10)
+        connection.settimeout(self.recv_timeout)
+        with self._send_lock:
+            self._socket = connection
+            self._send('subscribe', self.symbols)
+            self._subscribed = set(self.symbols)
+            self.connected = True
+        self.stats['connects'] += 1
+        return connection
+
+    def _close(self, connection):
+        with self._send_lock:
+            self.connected = False
+            self._socket = None
+            self._subscribed = set()
+        self.stats['disconnects'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _run_socket(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                connection = self._open()
+            except Exception as e:
+                print(f"Trade-Stream Verbindungsfehler: {str(e)}")
+                self._stop.wait(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            backoff = 1.0
+            try:
+                while not self._stop.is_set():
+                    try:
+                        message = connection.recv()
+                    except websocket.WebSocketTimeoutException:
+                        # Ruhiger Markt: Verbindung per Ping prüfen
+                        connection.ping()
+                        continue
+                    if not message:
+                        break
+                    self._handle(message)
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"Trade-Stream getrennt: {str(e)}")
+            finally:
+                self._close(connection)
+            self._stop.wait(backoff * random.uniform(0.5, 1.0))
+
+    # Datenbank
+
+    def _held_symbols(self) -> Set[str]:
+        from src.models.portfolio import db, PortfolioEntry
+        return {symbol for (symbol,) in db.session.query(PortfolioEntry.symbol).distinct() if symbol}
+
+    def _poll(self):
+        """Fallback ohne Verbindung: ein Quote-Abruf je Symbol unter dem gemeinsamen Rate Limit"""
+        from src.services.alert_service import alert_engine
+        from src.services.service_registry import services
+        if not self.symbols:
+            return
+        quotes = services.get('finnhub').get_multiple_quotes(sorted(self.symbols))
+        now_ms = int(time.time() * 1000)
+        self.prices.update((symbol, price, now_ms) for symbol, price in quotes.items() if price)
+        alert_engine.observe(quotes)
+        self.stats['polls'] += 1
+        self.stats['polled_symbols'] += len(quotes)
+
+    def _moved(self, prices: Dict[str, float]) -> Set[str]:
+        """Symbole, deren Kurs sich seit dem letzten Verwerfen um mehr als die Toleranz bewegt hat"""
+        moved = set()
+        for symbol, price in prices.items():
+            reference = self._reference.get(symbol)
+            if reference is None or abs(price - reference) > abs(reference) * self.invalidate_percent / 100:
+                self._reference[symbol] = price
+                moved.add(symbol)
+        return moved
+
+    def flush(self) -> int:
+        """Schreibt alle seit dem letzten Flush geänderten Preise in einem Commit"""
+        from src.models.portfolio import db, PortfolioEntry
+        from src.models.portfolio_entry_meta import PortfolioEntryMeta
+        from src.services.history_service import quote_cache
+        from src.services.tenant_service import invalidate_user_cache
+
+        prices = self.prices.drain()
+        if not prices:
+            return 0
+        try:
+            rows = db.session.query(PortfolioEntry, PortfolioEntryMeta.user_id) \
+                .outerjoin(PortfolioEntryMeta, PortfolioEntryMeta.entry_id == PortfolioEntry.id) \
+                .filter(PortfolioEntry.symbol.in_(list(prices))).all()
+            for entry, _ in rows:
+                entry.update_current_price(prices[entry.symbol])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.prices.restore(prices)
+            print(f"Trade-Stream Flush-Fehler: {str(e)}")
+            return 0
+
+        quote_cache.put_many(prices)
+        # Kleine Bewegungen lassen die Ergebnis-Caches bestehen (bis zu deren TTL)
+        moved = self._moved(prices)
+        for user_id in {user_id for entry, user_id in rows if entry.symbol in moved}:
+            invalidate_user_cache(user_id)
+            self.stats['invalidations'] += 1
+        self.stats['flushes'] += 1
+        self.stats['rows_written'] += len(rows)
+        return len(rows)
+
+    def _symbols_changed_elsewhere(self) -> bool:
+        from src.models.cache_version import CacheVersion
+        version = CacheVersion.current(SYMBOLS_SCOPE)
+        changed, self._symbols_version = version > self._symbols_version, version
+        return changed
+
+    def _run_maintenance(self):
+        from src.services.alert_service import alert_engine
+        last_poll = float('-inf')
+        while not self._stop.is_set():
+            with self._app.app_context():
+                try:
+                    if self._symbols_changed_elsewhere():
+                        self._resync.set()
+                    if self._resync.is_set():
+                        self._resync.clear()
+                        self.set_symbols(self._held_symbols())
+                    if not self.connected and time.monotonic() - last_poll >= self.poll_seconds:
+                        last_poll = time.monotonic()
+                        self._poll()
+                    self.flush()
+                    alert_engine.persist()
+                except Exception as e:
+                    print(f"Trade-Stream Wartungsfehler: {str(e)}")
+                finally:
+                    from src.models.portfolio import db
+                    db.session.remove()
+            self._stop.wait(self.flush_seconds)
+
+    def start(self, app):
+        self._app = app
+        self._stop.clear()
+        self._resync.set()
+        targets = [self._run_maintenance]
+        if websocket is not None:
+            targets.append(self._run_socket)
+        else:
+            print('websocket-client nicht installiert: Trade-Stream läuft nur im Polling-Modus')
+        self._threads = [threading.Thread(target=target, daemon=True) for target in targets]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        with self._send_lock:
+            connection = self._socket
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop.is_set()
+
+    def status(self) -> Dict:
+        return {
+            'connected': self.connected,
+            'url': self.url,
+            'symbols': len(self.symbols),
+            'ticks': self.prices.ticks,
+            **self.stats
+        }
+
+trade_stream = TradeStream()
+
+def streamed_quotes(symbols: Iterable[str]) -> Dict[str, float]:
+    """Kurse aus dem Trade-Stream (leer, wenn er nicht läuft)"""
+    if not trade_stream.running:
+        return {}
+    symbols = list(symbols)
+    quotes = trade_stream.latest(symbols)
+    for symbol in symbols:
+        record_cache('stream', symbol in quotes)
+    return quotes
+
+def watch_portfolio_symbols(stream: TradeStream = None):
+    """Gleicht die Abos nach jedem Commit ab, der PortfolioEntry-Zeilen anlegt oder löscht"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from src.models.portfolio import PortfolioEntry
+
+    stream = stream or trade_stream
+
+    @event.listens_for(Session, 'after_flush')
+    def track_rows(session, flush_context):
+        if any(isinstance(obj, PortfolioEntry) for obj in chain(session.new, session.deleted)):
+            session.info[SYMBOLS_CHANGED] = True
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def track_bulk(orm_execute_state):
+        # Query.delete() (z.B. delete_entries) läuft an den Mapper-Events vorbei
+        mapper = orm_execute_state.bind_mapper
+        if (orm_execute_state.is_delete or orm_execute_state.is_insert) \
+                and mapper is not None and mapper.class_ is PortfolioEntry:
+            orm_execute_state.session.info[SYMBOLS_CHANGED] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def resync(session):
+        if session.info.pop(SYMBOLS_CHANGED, False):
+            stream.request_resync()
+            # Läuft der Stream in einem anderen Prozess, erfährt er es über den Versionszähler
+            from src.models.cache_version import CacheVersion
+            try:
+                CacheVersion.bump(SYMBOLS_SCOPE)
+            except Exception as e:
+                print(f"Trade-Stream Abo-Abgleich nicht gemeldet: {str(e)}")
+
+    @event.listens_for(Session, 'after_rollback')
+    def forget(session):
+        session.info.pop(SYMBOLS_CHANGED, None)
+
+def acquire_stream_lock(path: str):
+    """Exklusive, nicht blockierende Sperre auf `path`; Dateiobjekt bei Erfolg, sonst None
+
+    Das Betriebssystem gibt die Sperre frei, wenn der Prozess endet. Ohne fcntl
+    (Windows, dort ohne Mehrprozess-Server) gilt die Sperre immer als erhalten.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return open(path, 'a')
+    handle = open(path, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def init_app(app):
+    """Betreibt den Trade-Stream bei PRICE_STREAM=1 in genau einem Prozess
+
+    Gestartet wird mit der ersten Anfrage (nicht im Reloader-Prozess oder bei
+    CLI-Befehlen) in dem Worker, der die Sperrdatei STREAM_LOCK_FILE bekommt.
+    Die übrigen Worker lesen die geschriebenen Kurse aus der Datenbank und
+    übernehmen den Stream, wenn der Prozess mit der Sperre endet.
+    """
+    if not app.config.get('PRICE_STREAM'):
+        return
+    trade_stream.flush_seconds = app.config.get('STREAM_FLUSH_SECONDS', trade_stream.flush_seconds)
+    trade_stream.poll_seconds = app.config.get('STREAM_POLL_SECONDS', trade_stream.poll_seconds)
+    trade_stream.invalidate_percent = app.config.get('STREAM_INVALIDATE_PERCENT', trade_stream.invalidate_percent)
+    lock_path = app.config.get('STREAM_LOCK_FILE') or os.path.join(tempfile.gettempdir(), 'portfolio-price-stream.lock')
+    watch_portfolio_symbols(trade_stream)
+
+    state = {'lock': None, 'next_attempt': 0.0}
+    start_lock = threading.Lock()
+
+    @app.before_request
+    def start_price_stream():
+        if state['lock'] is not None or time.monotonic() < state['next_attempt']:
+            return None
+        with start_lock:
+            if state['lock'] is not None or time.monotonic() < state['next_attempt']:
+                return None
+            state['next_attempt'] = time.monotonic() + LOCK_RETRY_SECONDS
+            state['lock'] = acquire_stream_lock(lock_path)
+            if state['lock'] is not None:
+                trade_stream.start(app)
+        return None
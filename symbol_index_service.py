@@ -0,0 +1,217 @@
+import bisect
+import csv
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+DEFAULT_SYMBOL_FILE = os.environ.get(
+    'SYMBOL_LIST_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'symbols.csv')
+)
+
+def _normalize(text: str) -> str:
+    """Großbuchstaben ohne Akzente (Ü -> U, ß -> SS), sonstige Zeichen werden zu Leerzeichen"""
+    decomposed = unicodedata.normalize('NFKD', (text or '').upper())
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', re.sub(r'[^0-9A-Z ]', ' ', folded)).strip()
+
+def _trigrams(text: str) -> set:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SymbolIndex:
+    """Lokaler Suchindex für Ticker, Namen, ISIN und WKN
+
+    Die Symbolliste (CSV mit Spalten symbol, description, isin, wkn, type oder
+    JSON-Liste im Format von Finnhub /stock/symbol) wird beim ersten Zugriff
+    geladen und nach refresh_interval Sekunden neu eingelesen, falls sich die
+    Datei geändert hat. Treffer aus der Upstream-Suche werden per add() ergänzt.
+    """
+
+    MAX_PREFIX_CANDIDATES = 200
+    MIN_TRIGRAM_SIMILARITY = 0.5
+    MIN_COMMON_TRIGRAM = 1000
+    MISS_TTL = 3600
+
+    def __init__(self, symbol_file: str = DEFAULT_SYMBOL_FILE, refresh_interval: int = 3600):
+        self.symbol_file = symbol_file
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._records: List[Dict] = []
+        self._by_symbol: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._key_ids: List[int] = []
+        self._trigram_ids: Dict[str, set] = {}
+        self._misses: Dict[str, float] = {}
+        self._file_mtime = None
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self._records)
+
+    def _read_file(self) -> List[Dict]:
+        if self.symbol_file.endswith('.json'):
+            with open(self.symbol_file, encoding='utf-8') as handle:
+                return json.load(handle)
+        with open(self.symbol_file, encoding='utf-8', newline='') as handle:
+            return list(csv.DictReader(handle))
+
+    def maybe_refresh(self):
+        """Lädt die Symbolliste neu, wenn das Intervall abgelaufen ist und die Datei sich geändert hat"""
+        now = time.time()
+        if self._checked_at and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.symbol_file)
+            except OSError:
+                return
+            if mtime == self._file_mtime:
+                return
+            try:
+                records = self._read_file()
+            except Exception as e:
+                print(f"Symbol list error: {str(e)}")
+                return
+            self._rebuild(records)
+            self._file_mtime = mtime
+
+    def _rebuild(self, records: List[Dict]):
+        self._records, self._by_symbol = [], {}
+        self._keys, self._key_ids = [], []
+        self._trigram_ids, self._misses = {}, {}
+
+        pairs = []
+        for record in records:
+            record_id = self._store(record)
+            if record_id is not None:
+                pairs.extend((key, record_id) for key in self._keys_for(self._records[record_id]))
+        pairs.sort()
+        self._keys = [key for key, _ in pairs]
+        self._key_ids = [record_id for _, record_id in pairs]
+
+    def _store(self, record: Dict) -> Optional[int]:
+        """Legt einen Datensatz an (ohne Präfix-Schlüssel) und gibt seine ID zurück"""
+        symbol = (record.get('symbol') or '').strip().upper()
+        if not symbol or symbol in self._by_symbol:
+            return None
+        entry = {
+            'symbol': symbol,
+            'displaySymbol': record.get('displaySymbol') or symbol,
+            'description': record.get('description') or record.get('name') or '',
+            'type': record.get('type') or '',
+            'isin': (record.get('isin') or '').upper() or None,
+            'wkn': (record.get('wkn') or '').upper() or None
+        }
+        record_id = len(self._records)
+        self._records.append(entry)
+        self._by_symbol[symbol] = record_id
+        for trigram in _trigrams(_normalize(f"{symbol} {entry['description']}")):
+            self._trigram_ids.setdefault(trigram, set()).add(record_id)
+        return record_id
+
+    def _keys_for(self, entry: Dict) -> List[str]:
+        keys = [entry['symbol']] + _normalize(entry['description']).split(' ')
+        keys += [code for code in (entry['isin'], entry['wkn']) if code]
+        return [key for key in keys if key]
+
+    def add(self, records: List[Dict]):
+        """Übernimmt Upstream-Treffer in den Index
+
+        Die neuen Schlüssel werden sortiert und in einem Durchgang mit den
+        vorhandenen zusammengeführt statt einzeln per list.insert.
+        """
+        with self._lock:
+            pairs = []
+            for record in records:
+                record_id = self._store(record)
+                if record_id is not None:
+                    pairs.extend((key, record_id) for key in self._keys_for(self._records[record_id]))
+            if not pairs:
+                return
+            pairs.sort()
+            keys, key_ids = [], []
+            previous = 0
+            for key, record_id in pairs:
+                # Neue IDs sind größer als alle vorhandenen, gleiche Schlüssel kommen also dahinter
+                position = bisect.bisect_right(self._keys, key, previous)
+                keys += self._keys[previous:position]
+                key_ids += self._key_ids[previous:position]
+                keys.append(key)
+                key_ids.append(record_id)
+                previous = position
+            keys += self._keys[previous:]
+            key_ids += self._key_ids[previous:]
+            self._keys, self._key_ids = keys, key_ids
+
+    def remember_miss(self, query: str):
+        """Merkt sich Anfragen, für die auch Upstream nichts gefunden hat"""
+        normalized = _normalize(query)
+        with self._lock:
+            self._misses[normalized] = time.time()
+
+    def is_known_miss(self, query: str) -> bool:
+        normalized = _normalize(query)
+        with self._lock:
+            missed_at = self._misses.get(normalized)
+        return missed_at is not None and time.time() - missed_at < self.MISS_TTL
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Präfixsuche auf Ticker/ISIN/WKN/Namenswörtern, ergänzt um Trigramm-Ähnlichkeit"""
+        self.maybe_refresh()
+        normalized = _normalize(query)
+        if not normalized:
+            return []
+
+        with self._lock:
+            # Alle Wörter der Anfrage müssen als Präfix eines Schlüssels vorkommen
+            ranks: Optional[Dict[int, float]] = None
+            for word in normalized.split(' '):
+                word_ranks: Dict[int, float] = {}
+                position = bisect.bisect_left(self._keys, word)
+                end = min(len(self._keys), position + self.MAX_PREFIX_CANDIDATES)
+                while position < end and self._keys[position].startswith(word):
+                    record_id = self._key_ids[position]
+                    record = self._records[record_id]
+                    if record['symbol'] == normalized:
+                        rank = 0.0
+                    elif self._keys[position] in (record['symbol'], record['isin'], record['wkn']):
+                        rank = 1.0
+                    else:
+                        rank = 2.0
+                    word_ranks[record_id] = min(rank, word_ranks.get(record_id, rank))
+                    position += 1
+                if ranks is None:
+                    ranks = word_ranks
+                else:
+                    ranks = {
+                        record_id: max(rank, word_ranks[record_id])
+                        for record_id, rank in ranks.items() if record_id in word_ranks
+                    }
+
+            if len(ranks) < limit and len(normalized) >= 3:
+                query_trigrams = _trigrams(normalized)
+                # Sehr häufige Trigramme (z.B. aus "INC") tragen kaum zur Auswahl bei
+                common = max(self.MIN_COMMON_TRIGRAM, len(self._records) // 20)
+                shared: Dict[int, int] = {}
+                for trigram in query_trigrams:
+                    record_ids = self._trigram_ids.get(trigram, ())
+                    if len(record_ids) > common:
+                        continue
+                    for record_id in record_ids:
+                        shared[record_id] = shared.get(record_id, 0) + 1
+                for record_id, count in shared.items():
+                    similarity = count / len(query_trigrams)
+                    if similarity >= self.MIN_TRIGRAM_SIMILARITY and record_id not in ranks:
+                        ranks[record_id] = 3.0 - similarity
+
+            best = sorted(ranks, key=lambda record_id: (ranks[record_id], len(self._records[record_id]['symbol'])))
+            return [dict(self._records[record_id]) for record_id in best[:limit]]
+
+# Gemeinsamer Index für alle Anfragen
+symbol_index = SymbolIndex()
@@ -0,0 +1,220 @@
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from flask import current_app, g, jsonify, request, session
+from sqlalchemy import select
+
+from src.models.user import db, User
+from src.models.cache_version import CacheVersion
+from src.models.portfolio import PortfolioEntry
+from src.models.portfolio_entry_meta import PortfolioEntryMeta
+from src.services.metrics_service import record_cache
+from src.services.read_model_service import LotRow, load_lots, lot_select
+
+USER_HEADER = 'X-User-Id'
+
+def current_user_id() -> Optional[int]:
+    """Benutzer der laufenden Anfrage; None steht für das gemeinsame Portfolio"""
+    return g.get('user_id')
+
+def portfolio_query(user_id: Optional[int] = None):
+    """PortfolioEntry-Abfrage, eingeschränkt auf die Einträge eines Benutzers
+
+    Ohne Argument gilt der Benutzer der laufenden Anfrage.
+    """
+    if user_id is None:
+        user_id = current_user_id()
+    return _owned_by(PortfolioEntry.query, user_id)
+
+def _owned_by(statement, user_id: Optional[int]):
+    """Schränkt eine ORM-Query oder ein Core-Select auf die Einträge eines Benutzers ein"""
+    statement = statement.outerjoin(PortfolioEntryMeta, PortfolioEntryMeta.entry_id == PortfolioEntry.id)
+    if user_id is None:
+        return statement.filter(PortfolioEntryMeta.user_id.is_(None))
+    return statement.filter(PortfolioEntryMeta.user_id == user_id)
+
+def user_entries():
+    return portfolio_query().all()
+
+def user_lots(user_id: Optional[int] = None) -> List[LotRow]:
+    """Wie user_entries, aber als schlanke Zeilen für Routen, die nur lesen"""
+    if user_id is None:
+        user_id = current_user_id()
+    return owner_lots(user_id)
+
+def owner_lots(user_id: Optional[int]) -> List[LotRow]:
+    """Lots genau eines Besitzers, unabhängig von der laufenden Anfrage (None = gemeinsames Portfolio)"""
+    return load_lots(_owned_by(lot_select(), user_id))
+
+def owner_select(user_id: Optional[int], *columns):
+    """Core-Select über Spalten von PortfolioEntry/PortfolioEntryMeta, beschränkt auf einen Besitzer"""
+    return _owned_by(select(*columns), user_id)
+
+def assign_owner(entry: PortfolioEntry, currency: Optional[str] = None):
+    """Ordnet einen neuen Eintrag dem aktuellen Benutzer zu und merkt sich die Kaufwährung (vor dem Commit aufrufen)"""
+    user_id = current_user_id()
+    if user_id is None and currency is None:
+        return
+    db.session.flush()  # vergibt entry.id
+    db.session.add(PortfolioEntryMeta(entry_id=entry.id, user_id=user_id, currency=currency))
+
+def delete_entries(entry_ids):
+    """Löscht Einträge samt Zusatzdaten (SQLite erzwingt ON DELETE CASCADE nicht)"""
+    entry_ids = list(entry_ids)
+    if not entry_ids:
+        return 0
+    PortfolioEntryMeta.query.filter(PortfolioEntryMeta.entry_id.in_(entry_ids)).delete(synchronize_session=False)
+    return PortfolioEntry.query.filter(PortfolioEntry.id.in_(entry_ids)).delete(synchronize_session=False)
+
+class UserResultCache:
+    """Ergebnis-Cache für Statistiken und Charts, getrennt pro Benutzer
+
+    Jede Änderung am Portfolio eines Benutzers erhöht dessen Version und
+    verwirft damit nur seine Einträge. Kurs- und Historien-Caches bleiben
+    benutzerübergreifend, damit gleiche Symbole nur einmal geladen werden.
+    Die Einträge liegen im Speicher des Workers; über die gemeinsame Version
+    in der Datenbank (CacheVersion) erfahren auch die anderen Worker davon.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries_per_user: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_user = max_entries_per_user
+        self._versions: Dict[Optional[int], int] = {}
+        self._shared: Dict[Optional[int], int] = {}
+        self._entries: Dict[Optional[int], OrderedDict] = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id: Optional[int], shared: int = 0) -> int:
+        """Lokale Version; ist die gemeinsame Version gestiegen, werden die Einträge verworfen"""
+        with self._lock:
+            if shared > self._shared.get(user_id, 0):
+                self._shared[user_id] = shared
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._entries.pop(user_id, None)
+            return self._versions.get(user_id, 0)
+
+    def get(self, user_id: Optional[int], key: Hashable, version: int):
+        with self._lock:
+            partition = self._entries.get(user_id)
+            entry = partition.get(key) if partition else None
+            if not entry:
+                return None
+            stored_version, stored_at, value = entry
+            if stored_version != version or time.time() - stored_at > self.ttl_seconds:
+                del partition[key]
+                return None
+            partition.move_to_end(key)
+            return value
+
+    def put(self, user_id: Optional[int], key: Hashable, version: int, value):
+        with self._lock:
+            # Ergebnis einer inzwischen überholten Version nicht speichern
+            if self._versions.get(user_id, 0) != version:
+                return
+            partition = self._entries.setdefault(user_id, OrderedDict())
+            partition[key] = (version, time.time(), value)
+            partition.move_to_end(key)
+            while len(partition) > self.max_entries_per_user:
+                partition.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int]):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+            self._shared.clear()
+            self._entries.clear()
+
+user_result_cache = UserResultCache()
+
+def _version_scope(user_id: Optional[int]) -> str:
+    return f"user:{'shared' if user_id is None else user_id}"
+
+def invalidate_user_cache(user_id: Optional[int] = None):
+    """Nach jeder Änderung am Portfolio aufrufen; ohne Argument für den aktuellen Benutzer"""
+    if user_id is None:
+        user_id = current_user_id()
+    user_result_cache.invalidate(user_id)
+    try:
+        CacheVersion.bump(_version_scope(user_id))
+    except Exception as e:
+        print(f"Fehler beim Erhöhen der Cache-Version für Benutzer {user_id}: {str(e)}")
+
+def _current_version() -> int:
+    user_id = current_user_id()
+    return user_result_cache.version(user_id, CacheVersion.current(_version_scope(user_id)))
+
+def _cache_key() -> Tuple:
+    return request.endpoint, tuple(sorted((request.view_args or {}).items())), \
+        tuple(sorted(request.args.items(multi=True)))
+
+def _cached_response(key, version):
+    cached = user_result_cache.get(current_user_id(), key, version)
+    record_cache('user_result', cached is not None)
+    if cached is None:
+        return None
+    return current_app.response_class(cached, mimetype='application/json')
+
+def _store_response(response, key, version):
+    # Nur erfolgreiche JSON-Antworten (keine Tupel mit Fehlerstatus) zwischenspeichern
+    if getattr(response, 'status_code', None) == 200 and response.mimetype == 'application/json':
+        user_result_cache.put(current_user_id(), key, version, response.get_data())
+    return response
+
+def user_cached(view):
+    """Cacht die JSON-Antwort einer Route pro Benutzer und Anfrageparametern"""
+    if inspect.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            key, version = _cache_key(), _current_version()
+            cached = _cached_response(key, version)
+            if cached is not None:
+                return cached
+            return _store_response(await view(*args, **kwargs), key, version)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key, version = _cache_key(), _current_version()
+        cached = _cached_response(key, version)
+        if cached is not None:
+            return cached
+        return _store_response(view(*args, **kwargs), key, version)
+    return wrapper
+
+def init_app(app):
+    """Bestimmt vor jeder API-Anfrage den Benutzer aus der Session oder X-User-Id
+
+    Die Session setzt POST /api/session (routes/user.py). Der Header wird nur mit TRUST_USER_HEADER ausgewertet, also hinter einem
+    authentifizierenden Proxy, der ihn setzt und von Clients mitgeschickte
+    Werte verwirft; ohne Session-Benutzer gilt das gemeinsame Portfolio.
+    """
+    @app.before_request
+    def resolve_user():
+        g.user_id = None
+        # Startseite und statische Dateien brauchen keinen Benutzer
+        if not request.path.startswith('/api/'):
+            return None
+        header = request.headers.get(USER_HEADER) if app.config.get('TRUST_USER_HEADER') else None
+        raw = header or session.get('user_id')
+        if raw in (None, ''):
+            return None
+        try:
+            user_id = int(raw)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': f'Ungültige Benutzer-ID: {raw}'}), 400
+        if db.session.get(User, user_id) is None:
+            if not header:
+                # Benutzer wurde gelöscht: Session fällt auf das gemeinsame Portfolio zurück
+                session.pop('user_id', None)
+                return None
+            return jsonify({'success': False, 'error': f'Benutzer {user_id} nicht gefunden'}), 404
+        g.user_id = user_id
+        return None
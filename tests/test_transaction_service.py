@@ -0,0 +1,113 @@
+"""Tests für die Ledger-Logik (FIFO, Durchschnittskosten, Splits, Verkäufe über den Bestand)
+
+Aufruf aus dem Projektverzeichnis: python -m pytest tests
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.transaction_service import EVENT_ORDER, Ledger
+
+def buy(entry_id, day, quantity, cost, symbol='AAA'):
+    return ((day, EVENT_ORDER['buy'], entry_id), 'buy', symbol, entry_id, day, quantity, cost)
+
+def transaction(transaction_id, kind, day, quantity=None, price=None, ratio=None, fees=0.0, symbol='AAA'):
+    return ((day, EVENT_ORDER[kind], transaction_id), kind, symbol, transaction_id, day, quantity, price, ratio, fees)
+
+def ledger(method, *events):
+    result = Ledger(method)
+    result.apply(sorted(events, key=lambda event: event[0]))
+    return result
+
+PURCHASES = (
+    buy(1, date(2024, 1, 2), 10, 1000.0),  # 100 je Stück
+    buy(2, date(2024, 2, 1), 10, 2000.0),  # 200 je Stück
+)
+
+def test_fifo_sells_oldest_lot_first():
+    result = ledger('fifo', *PURCHASES, transaction(1, 'sell', date(2024, 3, 1), quantity=15, price=300, fees=5))
+    book = result.books['AAA']
+
+    # 10 x 100 + 5 x 200 abgegangen, Erlös 15 x 300 - 5
+    assert book.realized == pytest.approx(4495.0 - 2000.0)
+    assert book.quantity == pytest.approx(5)
+    assert book.open_cost == pytest.approx(1000.0)
+    cost_fractions, quantity_factors = result.lot_factors([SimpleNamespace(id=1), SimpleNamespace(id=2)])
+    assert cost_fractions.tolist() == pytest.approx([0.0, 0.5])
+    assert quantity_factors.tolist() == pytest.approx([0.0, 0.5])
+
+def test_average_cost_spreads_sale_over_all_lots():
+    result = ledger('average', *PURCHASES, transaction(1, 'sell', date(2024, 3, 1), quantity=15, price=300, fees=5))
+    book = result.books['AAA']
+
+    # Durchschnittlicher Einstand 150 je Stück
+    assert book.realized == pytest.approx(4495.0 - 15 * 150.0)
+    assert book.quantity == pytest.approx(5)
+    assert book.open_cost == pytest.approx(750.0)
+
+def test_selling_whole_position_closes_book():
+    for method in ('fifo', 'average'):
+        result = ledger(method, *PURCHASES, transaction(1, 'sell', date(2024, 3, 1), quantity=20, price=150))
+        book = result.books['AAA']
+        assert book.quantity == 0
+        assert book.open_cost == 0
+        assert book.realized == pytest.approx(0.0)
+        assert result.open_quantities() == {}
+
+def test_split_multiplies_quantity_but_keeps_cost():
+    for method in ('fifo', 'average'):
+        result = ledger(method, *PURCHASES, transaction(1, 'split', date(2024, 3, 1), ratio=2.0))
+        book = result.books['AAA']
+        assert book.quantity == pytest.approx(40)
+        assert book.open_cost == pytest.approx(3000.0)
+
+def test_sale_after_split_uses_split_quantities():
+    result = ledger('fifo', *PURCHASES,
+                    transaction(1, 'split', date(2024, 3, 1), ratio=2.0),
+                    transaction(2, 'sell', date(2024, 4, 1), quantity=30, price=100))
+    book = result.books['AAA']
+
+    # 20 Stück aus dem ersten Lot (Einstand 1000) und 10 aus dem zweiten (Einstand 1000)
+    assert book.realized == pytest.approx(3000.0 - 2000.0)
+    assert book.quantity == pytest.approx(10)
+    assert book.open_cost == pytest.approx(1000.0)
+
+def test_split_on_purchase_day_applies_before_buy():
+    day = date(2024, 1, 2)
+    result = ledger('fifo', transaction(1, 'split', day, ratio=2.0), buy(1, day, 10, 1000.0))
+    assert result.books['AAA'].quantity == pytest.approx(10)
+
+def test_dividend_uses_holding_before_same_day_sale():
+    day = date(2024, 3, 1)
+    result = ledger('fifo', *PURCHASES,
+                    transaction(1, 'sell', day, quantity=20, price=150),
+                    transaction(2, 'dividend', day, price=1.5, fees=1.0))
+    assert result.books['AAA'].dividends == pytest.approx(20 * 1.5 - 1.0)
+
+@pytest.mark.parametrize('method', ['fifo', 'average'])
+def test_oversell_is_rejected(method):
+    with pytest.raises(ValueError, match='übersteigt'):
+        ledger(method, *PURCHASES, transaction(1, 'sell', date(2024, 3, 1), quantity=21, price=100))
+
+@pytest.mark.parametrize('method', ['fifo', 'average'])
+def test_sale_before_purchase_is_oversell(method):
+    with pytest.raises(ValueError):
+        ledger(method, transaction(1, 'sell', date(2024, 1, 1), quantity=1, price=100), *PURCHASES)
+
+def test_incremental_apply_matches_rebuild():
+    events = sorted([*PURCHASES,
+                     transaction(1, 'sell', date(2024, 3, 1), quantity=5, price=250),
+                     transaction(2, 'split', date(2024, 4, 1), ratio=3.0),
+                     transaction(3, 'sell', date(2024, 5, 1), quantity=12, price=90)],
+                    key=lambda event: event[0])
+    for method in ('fifo', 'average'):
+        incremental = Ledger(method)
+        for event in events:
+            incremental.apply([event])
+        rebuilt = ledger(method, *events)
+        assert incremental.open_quantities() == pytest.approx(rebuilt.open_quantities())
+        assert incremental.books['AAA'].open_cost == pytest.approx(rebuilt.books['AAA'].open_cost)
+        assert incremental.books['AAA'].realized == pytest.approx(rebuilt.books['AAA'].realized)
+        assert incremental.max_transaction_id == 3
+        assert incremental.transactions == 3
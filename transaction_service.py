@@ -0,0 +1,362 @@
+import threading
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from src.models.user import db
+from src.models.cache_version import CacheVersion
+from src.models.portfolio_transaction import PortfolioTransaction
+from src.services.fx_service import ConvertedLot
+
+METHODS = ('fifo', 'average')
+TRANSACTION_TYPES = ('sell', 'dividend', 'split')
+# Reihenfolge am selben Tag: Split vor Käufen, Dividende auf den Bestand vor den Verkäufen
+EVENT_ORDER = {'split': 0, 'buy': 1, 'dividend': 2, 'sell': 3}
+EPSILON = 1e-9
+# Unterhalb dieses Skalierungsfaktors werden die Lots umgerechnet, bevor units/cost überlaufen
+MIN_SCALE = 1e-200
+
+TRANSACTION_COLUMNS = ('id', 'symbol', 'type', 'trade_date', 'quantity', 'price', 'ratio', 'fees')
+
+class OpenLot:
+    """Kauf-Lot im Buch; units = Stück geteilt durch Split- und Skalierungsfaktor beim Kauf"""
+    __slots__ = ('entry_id', 'purchase_date', 'quantity', 'original_cost', 'factor', 'units', 'cost')
+
+    def __init__(self, entry_id, purchase_date, quantity, original_cost):
+        self.entry_id = entry_id
+        self.purchase_date = purchase_date
+        self.quantity = quantity
+        self.original_cost = original_cost
+        self.factor = 1.0
+        self.units = 0.0
+        self.cost = 0.0
+
+class PositionBook:
+    """Offene Lots und realisierte Ergebnisse eines Symbols
+
+    Splits ändern nur `factor` (Stück = units * scale * factor), beim
+    Durchschnittskosten-Verfahren verkleinert ein Verkauf alle Lots über `scale`;
+    beides kostet O(1) statt eines Durchlaufs über die Lots (`scale` wird erst
+    nahe dem Unterlauf in die Lots eingerechnet). Bei FIFO werden
+    Lots vorne aus der Deque verbraucht, jedes höchstens einmal (amortisiert O(1)).
+    """
+    __slots__ = ('symbol', 'method', 'lots', 'factor', 'scale', 'units', 'cost', 'realized', 'dividends',
+                 'proceeds', 'sales')
+
+    def __init__(self, symbol: str, method: str):
+        self.symbol = symbol
+        self.method = method
+        self.lots = deque()
+        self.factor = 1.0
+        self.scale = 1.0
+        self.units = 0.0
+        self.cost = 0.0
+        self.realized = 0.0
+        self.dividends = 0.0
+        self.proceeds = 0.0
+        self.sales: List[Tuple[date, float, float]] = []  # (Verkaufstag, units, abgegangener Einstand)
+
+    @property
+    def quantity(self) -> float:
+        return self.units * self.scale * self.factor
+
+    @property
+    def open_cost(self) -> float:
+        return self.cost * self.scale
+
+    def buy(self, lot: OpenLot):
+        lot.factor = self.factor
+        lot.units = lot.quantity / (self.factor * self.scale)
+        lot.cost = lot.original_cost / self.scale
+        self.units += lot.units
+        self.cost += lot.cost
+        self.lots.append(lot)
+
+    def _close_all(self):
+        for lot in self.lots:
+            lot.units = lot.cost = 0.0
+        self.lots.clear()
+        self.units = self.cost = 0.0
+        self.scale = 1.0
+
+    def _fold_scale(self):
+        """Rechnet den Skalierungsfaktor in die Lots ein; nur noch verschwindend kleine Lots fallen weg"""
+        kept = deque()
+        for lot in self.lots:
+            lot.units *= self.scale
+            lot.cost *= self.scale
+            if lot.units * self.factor > EPSILON:
+                kept.append(lot)
+            else:
+                lot.units = lot.cost = 0.0
+        self.lots = kept
+        self.units = sum(lot.units for lot in kept)
+        self.cost = sum(lot.cost for lot in kept)
+        self.scale = 1.0
+
+    def sell(self, day: date, quantity: float, price: float, fees: float) -> float:
+        """Verbucht einen Verkauf; gibt den realisierten Gewinn zurück"""
+        held = self.quantity
+        if quantity > held + EPSILON * max(1.0, held):
+            raise ValueError(f'Verkauf von {quantity:g} {self.symbol} am {day.isoformat()} übersteigt '
+                             f'den Bestand von {held:g}')
+        quantity = min(quantity, held)
+
+        if self.method == 'average':
+            fraction = quantity / held if held else 1.0
+            removed = self.open_cost * fraction
+            if 1 - fraction <= EPSILON:
+                self._close_all()
+            else:
+                self.scale *= 1 - fraction
+                if self.scale < MIN_SCALE:
+                    self._fold_scale()
+        else:
+            removed = 0.0
+            remaining = quantity / self.factor
+            while remaining > EPSILON and self.lots:
+                lot = self.lots[0]
+                if lot.units <= remaining + EPSILON:
+                    self.lots.popleft()
+                    removed += lot.cost
+                    remaining -= lot.units
+                    self.units -= lot.units
+                    self.cost -= lot.cost
+                    lot.units = lot.cost = 0.0
+                else:
+                    part = lot.cost * remaining / lot.units
+                    lot.units -= remaining
+                    lot.cost -= part
+                    self.units -= remaining
+                    self.cost -= part
+                    removed += part
+                    remaining = 0.0
+            if not self.lots:
+                self.units = self.cost = 0.0
+
+        proceeds = quantity * price - fees
+        self.sales.append((day, quantity / self.factor, removed))
+        self.proceeds += proceeds
+        self.realized += proceeds - removed
+        return proceeds - removed
+
+    def split(self, ratio: float):
+        self.factor *= ratio
+
+    def dividend(self, per_share: float, quantity: Optional[float], fees: float) -> float:
+        amount = per_share * (self.quantity if quantity is None else quantity) - fees
+        self.dividends += amount
+        return amount
+
+class Ledger:
+    """Bücher aller Symbole eines Portfolios in einer Währung, fortgeschrieben Buchung für Buchung"""
+
+    def __init__(self, method: str):
+        self.method = method
+        self.books: Dict[str, PositionBook] = {}
+        self.lots: Dict[int, Tuple[PositionBook, OpenLot]] = {}
+        self.last_key = None
+        self.max_entry_id = 0
+        self.max_transaction_id = 0
+        self.transactions = 0
+        self.version = 0
+
+    def _book(self, symbol: str) -> PositionBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = PositionBook(symbol, self.method)
+        return book
+
+    def apply(self, events: List[tuple]):
+        """Verbucht nach Schlüssel sortierte Ereignisse (siehe TransactionService._events)"""
+        for key, kind, symbol, source_id, *values in events:
+            if kind == 'buy':
+                purchase_date, quantity, cost = values
+                book = self._book(symbol)
+                lot = OpenLot(source_id, purchase_date, quantity, cost)
+                book.buy(lot)
+                self.lots[source_id] = (book, lot)
+                self.max_entry_id = max(self.max_entry_id, source_id)
+            else:
+                day, quantity, price, ratio, fees = values
+                book = self._book(symbol)
+                if kind == 'sell':
+                    book.sell(day, quantity, price, fees)
+                elif kind == 'dividend':
+                    book.dividend(price, quantity, fees)
+                elif kind == 'split':
+                    book.split(ratio)
+                self.transactions += 1
+                self.max_transaction_id = max(self.max_transaction_id, source_id)
+            self.last_key = key
+
+    @property
+    def entry_count(self) -> int:
+        return len(self.lots)
+
+    def lot_factors(self, entries) -> Tuple[np.ndarray, np.ndarray]:
+        """(verbleibender Anteil am Einstand, Stückfaktor inkl. späterer Splits) je Eintrag"""
+        cost_fractions = np.ones(len(entries))
+        quantity_factors = np.ones(len(entries))
+        if not self.transactions:
+            return cost_fractions, quantity_factors
+        for i, entry in enumerate(entries):
+            book, lot = self.lots[entry.id]
+            cost_fractions[i] = lot.cost * book.scale / lot.original_cost if lot.original_cost else 0.0
+            quantity_factors[i] = lot.units * book.scale * book.factor / lot.quantity if lot.quantity else 0.0
+        return cost_fractions, quantity_factors
+
+    def series_lots(self, converted_lots: list) -> list:
+        """Lots für build_portfolio_series: Käufe in Stück nach späteren Splits, Verkäufe als negative Lots
+
+        Ohne Transaktionen werden die umgerechneten Lots unverändert durchgereicht.
+        """
+        if not self.transactions:
+            return converted_lots
+        lots = []
+        for book, lot in self.lots.values():
+            lots.append(ConvertedLot(book.symbol, lot.purchase_date,
+                                     lot.quantity * book.factor / lot.factor, lot.original_cost))
+        for book in self.books.values():
+            for day, units, removed in book.sales:
+                lots.append(ConvertedLot(book.symbol, day, -units * book.factor, -removed))
+        return lots
+
+    def open_quantities(self) -> Dict[str, float]:
+        return {symbol: book.quantity for symbol, book in self.books.items() if book.quantity > EPSILON}
+
+    def summary(self) -> Dict:
+        """Realisierte Gewinne und Dividenden je Symbol und gesamt"""
+        symbols = {
+            symbol: {
+                'quantity': book.quantity,
+                'open_cost': book.open_cost,
+                'realized_profit_loss': book.realized,
+                'dividends': book.dividends,
+                'proceeds': book.proceeds
+            }
+            for symbol, book in sorted(self.books.items()) if book.sales or book.dividends or book.factor != 1.0
+        }
+        return {
+            'method': self.method,
+            'realized_profit_loss': sum(book.realized for book in self.books.values()),
+            'dividends': sum(book.dividends for book in self.books.values()),
+            'symbols': symbols
+        }
+
+def _ledger_scope(user_id: Optional[int]) -> str:
+    return f"ledger:{'shared' if user_id is None else user_id}"
+
+class TransactionService:
+    """Ledger je Benutzer, Berichtswährung und Verfahren, inkrementell fortgeschrieben
+
+    Neue Käufe und Transaktionen mit einem Datum ab der letzten Buchung werden
+    nur angehängt. Rückdatierte Buchungen und Löschungen bauen den Ledger
+    einmal neu auf. Löschungen erhöhen zusätzlich einen Versionszähler
+    (CacheVersion), damit auch die Ledger der anderen Worker neu aufgebaut werden.
+    """
+
+    def __init__(self, max_ledgers: int = 256):
+        self.max_ledgers = max_ledgers
+        self._ledgers: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {'rebuilds': 0, 'appended': 0}
+
+    def _transactions(self, user_id: Optional[int], after_id: int = 0) -> list:
+        statement = select(*(getattr(PortfolioTransaction, column) for column in TRANSACTION_COLUMNS)) \
+            .where(PortfolioTransaction.user_id.is_(None) if user_id is None
+                   else PortfolioTransaction.user_id == user_id) \
+            .where(PortfolioTransaction.id > after_id)
+        return db.session.execute(statement).all()
+
+    def _events(self, entries, transactions, converter) -> List[tuple]:
+        """Käufe (Einstand in Berichtswährung) und Transaktionen (zum Tageskurs umgerechnet), sortiert"""
+        events = []
+        if entries:
+            for entry, cost in zip(entries, converter.invested(entries).tolist()):
+                events.append(((entry.purchase_date, EVENT_ORDER['buy'], entry.id), 'buy', entry.symbol, entry.id,
+                               entry.purchase_date, entry.quantity, cost))
+        if transactions:
+            symbols = [row.symbol for row in transactions]
+            dates = [row.trade_date for row in transactions]
+            prices = converter.trade_values(symbols, [row.price or 0.0 for row in transactions], dates)
+            fees = converter.trade_values(symbols, [row.fees or 0.0 for row in transactions], dates)
+            for row, price, fee in zip(transactions, prices.tolist(), fees.tolist()):
+                events.append(((row.trade_date, EVENT_ORDER[row.type], row.id), row.type, row.symbol, row.id,
+                               row.trade_date, row.quantity, price, row.ratio, fee))
+        events.sort(key=lambda event: event[0])
+        return events
+
+    def ledger(self, user_id: Optional[int], entries, converter, method: str = 'fifo') -> Ledger:
+        """Aktueller Ledger eines Portfolios; ValueError bei Verkäufen über den Bestand"""
+        key = (user_id, converter.target, method)
+        version = CacheVersion.current(_ledger_scope(user_id))
+        with self._lock:
+            ledger = self._ledgers.pop(key, None)
+            if ledger is not None and ledger.version != version:
+                # In einem anderen Worker wurde gelöscht
+                ledger = None
+            new_entries = entries
+            if ledger is not None:
+                new_entries = [entry for entry in entries if entry.id > ledger.max_entry_id]
+                if ledger.entry_count + len(new_entries) != len(entries):
+                    ledger = None
+            transactions = self._transactions(user_id, ledger.max_transaction_id if ledger else 0)
+            events = self._events(new_entries if ledger else entries, transactions, converter)
+            if ledger is not None and events and events[0][0] < ledger.last_key:
+                # Rückdatierte Buchung: einmal vollständig neu aufbauen
+                ledger = None
+                events = self._events(entries, self._transactions(user_id), converter)
+
+            if ledger is None:
+                ledger = Ledger(method)
+                ledger.version = version
+                self.stats['rebuilds'] += 1
+            else:
+                self.stats['appended'] += len(events)
+            ledger.apply(events)  # bei ValueError bleibt der Ledger verworfen
+
+            self._ledgers[key] = ledger
+            while len(self._ledgers) > self.max_ledgers:
+                self._ledgers.popitem(last=False)
+            return ledger
+
+    def invalidate(self, user_id: Optional[int]):
+        """Verwirft die Ledger eines Portfolios in diesem Worker (z.B. nach einem Rollback)"""
+        with self._lock:
+            for key in [key for key in self._ledgers if key[0] == user_id]:
+                del self._ledgers[key]
+
+    def deleted(self, user_id: Optional[int]):
+        """Nach dem Commit von Löschungen aufrufen; alle Worker bauen den Ledger neu auf"""
+        self.invalidate(user_id)
+        CacheVersion.bump(_ledger_scope(user_id))
+
+    def clear(self, user_id: Optional[int]) -> int:
+        """Löscht alle Transaktionen eines Portfolios (vor dem Commit aufrufen, danach deleted())"""
+        self.invalidate(user_id)
+        return PortfolioTransaction.query.filter(
+            PortfolioTransaction.user_id.is_(None) if user_id is None else PortfolioTransaction.user_id == user_id
+        ).delete(synchronize_session=False)
+
+transaction_service = TransactionService()
+
+def cost_basis_method(from_request: bool = True) -> str:
+    """Verfahren aus ?method= oder COST_BASIS_METHOD (fifo oder average)
+
+    Gespeicherte Tagesstände verwenden immer das konfigurierte Verfahren (from_request=False).
+    """
+    from flask import current_app, has_request_context, request
+    requested = request.args.get('method') if from_request and has_request_context() else None
+    method = requested or current_app.config.get('COST_BASIS_METHOD') or 'fifo'
+    if method not in METHODS:
+        raise ValueError(f"Unbekanntes Verfahren '{method}'. Erlaubt: {', '.join(METHODS)}")
+    return method
+
+def ledger_for(entries, converter) -> Ledger:
+    """Ledger des aktuellen Benutzers in der Berichtswährung des Konverters"""
+    from src.services.tenant_service import current_user_id
+    return transaction_service.ledger(current_user_id(), entries, converter, cost_basis_method())
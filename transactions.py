@@ -0,0 +1,180 @@
+from datetime import datetime
+from flask import Blueprint, jsonify, request
+from src.models.user import db
+from src.models.portfolio_transaction import PortfolioTransaction
+from src.services.alert_service import alert_engine
+from src.services.fx_service import converter_for
+from src.services.snapshot_service import snapshot_service
+from src.services.tenant_service import current_user_id, invalidate_user_cache, user_entries
+from src.services.transaction_service import TRANSACTION_TYPES, ledger_for, transaction_service
+
+transactions_bp = Blueprint('transactions', __name__)
+
+def _user_transactions():
+    user_id = current_user_id()
+    return PortfolioTransaction.query.filter(
+        PortfolioTransaction.user_id.is_(None) if user_id is None else PortfolioTransaction.user_id == user_id
+    )
+
+def _parse(data):
+    """Baut eine Transaktion aus dem Request; gibt (Transaktion, Fehlermeldung) zurück"""
+    kind = data.get('type')
+    if kind not in TRANSACTION_TYPES:
+        return None, f"type muss einer von {', '.join(TRANSACTION_TYPES)} sein"
+    symbol = str(data.get('symbol') or '').strip().upper()
+    if not symbol:
+        return None, 'Symbol erforderlich'
+    try:
+        trade_date = datetime.strptime(data.get('trade_date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'Ungültiges Datumsformat. Verwenden Sie YYYY-MM-DD'
+
+    transaction = PortfolioTransaction(user_id=current_user_id(), symbol=symbol, type=kind, trade_date=trade_date,
+                                       fees=float(data.get('fees') or 0.0))
+    if transaction.fees < 0:
+        return None, 'Gebühren dürfen nicht negativ sein'
+    if kind == 'sell':
+        if data.get('quantity') is None or data.get('price') is None:
+            return None, 'Verkäufe benötigen quantity und price'
+        transaction.quantity = float(data['quantity'])
+        transaction.price = float(data['price'])
+        if transaction.quantity <= 0 or transaction.price < 0:
+            return None, 'quantity muss positiv und price darf nicht negativ sein'
+    elif kind == 'dividend':
+        if data.get('price') is None:
+            return None, 'Dividenden benötigen price (Betrag je Stück)'
+        transaction.price = float(data['price'])
+        # Ohne Stückzahl gilt der am Zahltag gehaltene Bestand
+        if data.get('quantity') is not None:
+            transaction.quantity = float(data['quantity'])
+            if transaction.quantity <= 0:
+                return None, 'quantity muss positiv sein'
+        if transaction.price <= 0:
+            return None, 'price muss positiv sein'
+    else:
+        if data.get('ratio') is None or float(data['ratio']) <= 0:
+            return None, 'Splits benötigen ein positives ratio (z.B. 4 bei 4:1, 0.1 bei 1:10)'
+        transaction.ratio = float(data['ratio'])
+    return transaction, None
+
+@transactions_bp.route('/transactions', methods=['GET'])
+def get_transactions():
+    """Gibt Käufe und Transaktionen des aktuellen Benutzers nach Datum sortiert zurück"""
+    try:
+        buys = [{
+            'id': entry.id,
+            'symbol': entry.symbol,
+            'type': 'buy',
+            'trade_date': entry.purchase_date.isoformat(),
+            'quantity': entry.quantity,
+            'price': entry.purchase_price,
+            'ratio': None,
+            'fees': 0.0,
+            'created_at': entry.created_at.isoformat() if entry.created_at else None
+        } for entry in user_entries()]
+        transactions = [transaction.to_dict() for transaction in _user_transactions().all()]
+        data = sorted(buys + transactions, key=lambda item: (item['trade_date'], item['type'] != 'buy'))
+        return jsonify({
+            'success': True,
+            'data': data,
+            'total_transactions': len(data)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@transactions_bp.route('/transactions', methods=['POST'])
+def create_transaction():
+    """Verbucht einen Verkauf, eine Dividende oder einen Aktiensplit"""
+    try:
+        transaction, error = _parse(request.json or {})
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        db.session.add(transaction)
+        db.session.flush()
+        # Verkäufe über den Bestand hinaus lehnt der Ledger ab
+        entries = user_entries()
+        try:
+            ledger_for(entries, converter_for(entries))
+        except ValueError as e:
+            db.session.rollback()
+            transaction_service.invalidate(current_user_id())
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        snapshot_service.invalidate_from(current_user_id(), transaction.trade_date)
+        db.session.commit()
+        invalidate_user_cache()
+        alert_engine.positions_changed(current_user_id())
+
+        return jsonify({
+            'success': True,
+            'data': transaction.to_dict(),
+            'message': 'Transaktion erfolgreich verbucht'
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        transaction_service.invalidate(current_user_id())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@transactions_bp.route('/transactions/<int:transaction_id>', methods=['DELETE'])
+def delete_transaction(transaction_id):
+    """Löscht eine Transaktion; der Ledger wird beim nächsten Abruf neu aufgebaut"""
+    try:
+        transaction = _user_transactions().filter(PortfolioTransaction.id == transaction_id).first_or_404()
+        db.session.delete(transaction)
+        snapshot_service.invalidate_from(current_user_id(), transaction.trade_date)
+        db.session.commit()
+        transaction_service.deleted(current_user_id())
+        invalidate_user_cache()
+        alert_engine.positions_changed(current_user_id())
+
+        return jsonify({
+            'success': True,
+            'message': 'Transaktion erfolgreich gelöscht'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@transactions_bp.route('/transactions/realized', methods=['GET'])
+def get_realized():
+    """Realisierte Gewinne und Dividenden je Symbol nach FIFO oder Durchschnittskosten (?method=)"""
+    try:
+        entries = user_entries()
+        converter = converter_for(entries)
+        try:
+            ledger = ledger_for(entries, converter)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        return jsonify({
+            'success': True,
+            'data': ledger.summary(),
+            'currency': converter.target
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -1,8 +1,34 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, session
 from src.models.user import User, db
+from src.models.portfolio import PortfolioEntry
+from src.models.alert_event import AlertEvent
+from src.models.alert_rule import AlertRule
+from src.services.alert_service import alert_engine
+from src.services.snapshot_service import snapshot_service
+from src.services.transaction_service import transaction_service
+from src.services.tenant_service import delete_entries, invalidate_user_cache, portfolio_query
 
 user_bp = Blueprint('user', __name__)
 
+@user_bp.route('/session', methods=['GET'])
+def get_session():
+    """Benutzer, dessen Portfolio die laufende Session verwendet (None = gemeinsames Portfolio)"""
+    return jsonify({'user_id': session.get('user_id')})
+
+@user_bp.route('/session', methods=['POST'])
+def start_session():
+    """Wählt das Portfolio eines Benutzers für diese Session aus (keine Anmeldung, siehe README)"""
+    data = request.json or {}
+    user = User.query.get_or_404(data.get('user_id'))
+    session['user_id'] = user.id
+    return jsonify({'user_id': user.id})
+
+@user_bp.route('/session', methods=['DELETE'])
+def end_session():
+    """Zurück zum gemeinsamen Portfolio"""
+    session.pop('user_id', None)
+    return '', 204
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
     users = User.query.all()
@@ -34,6 +60,17 @@ def update_user(user_id):
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
+    # Portfolio des Benutzers mitlöschen
+    delete_entries([entry_id for (entry_id,) in portfolio_query(user_id).with_entities(PortfolioEntry.id)])
+    snapshot_service.clear(user_id)
+    transaction_service.clear(user_id)
+    AlertRule.query.filter_by(user_id=user_id).delete()
+    AlertEvent.query.filter_by(user_id=user_id).delete()
     db.session.delete(user)
     db.session.commit()
+    transaction_service.deleted(user_id)
+    invalidate_user_cache(user_id)
+    alert_engine.remove_user(user_id)
+    if session.get('user_id') == user_id:
+        session.pop('user_id')
     return '', 204